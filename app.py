@@ -1,22 +1,50 @@
-from flask import Flask, render_template, request, redirect, url_for, session , flash
+from flask import Flask, render_template, request, redirect, url_for, session , flash, make_response, jsonify, g, has_app_context
+from flask import before_render_template, template_rendered, send_from_directory
+from markupsafe import Markup
 import json
 import os
-from markdown import markdown
 from werkzeug.security import generate_password_hash, check_password_hash
 from collections import defaultdict
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import hashlib
+import heapq
 from functools import wraps
 import secrets
 from dotenv import load_dotenv
 import hashlib
 import secrets
 import string
+from assets import (MANIFEST_FILE as ASSET_MANIFEST_FILE, brotli_supported, build_assets, post_image_paths,
+                    post_images_supported, rewrite_images)
+from compression import COMPRESSIBLE_TYPES, GzipTemplate, choose_encoding, compress
+from content_store import ContentStore, JSONFileSource
+from group_index import GroupIndex
+from id_allocator import IdAllocator, unique_slug
+from markdown_cache import MarkdownCache
+from post_files import PostFileSource, migrate_json_to_post_files
+from page_cache import PageCache, fill_stats, split_stats
+from persistence import file_lock, locked, read_json, update_json, write_json_atomic
+from ranking import parse_windows
+from request_metrics import PhaseTimer, TimingMiddleware, metrics, phase, request_timing, server_timing
+from rollups import GRANULARITIES, series
+from search_index import SearchIndex
+from static_export import EXPORT_ENVIRON_KEY, StaticExporter, fingerprint, tree_fingerprint
+from visit_queue import AsyncVisitRecorder
+from visit_tracking import create_visit_backend
+from storage import (SQLiteDatabase, SQLiteBlogSource, SQLiteGroupSource, SQLiteIdAllocator,
+                     SQLiteTempUserSource, migrate_json_to_sqlite)
+import atexit
+import click
+import mimetypes
+from werkzeug.http import is_resource_modified
+from werkzeug.local import LocalProxy
 
 # Load environment variables from .env file
 load_dotenv()
 
 app = Flask(__name__)
+# Times every request from before routing, so slug lookups are included
+app.wsgi_app = TimingMiddleware(app.wsgi_app)
 
 
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', secrets.token_hex(32))
@@ -25,6 +53,86 @@ app.config['SESSION_COOKIE_SECURE'] = True  # HTTPS only
 app.config['SESSION_COOKIE_HTTPONLY'] = True  # Prevent JavaScript access
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'  # CSRF protection
 
+# Content storage: 'json' keeps blogs, groups and temp users in the JSON files,
+# 'sqlite' keeps them (and visit counters) in SQLITE_DB_FILE, 'files' keeps
+# one file per post plus a small manifest in POSTS_DIR (groups and temp users
+# stay in their JSON files).
+# Run `flask migrate-to-sqlite` or `flask migrate-to-post-files` once before
+# switching an existing site over; `flask export-blogs` writes a blogs.json back.
+app.config['STORAGE_BACKEND'] = os.getenv('STORAGE_BACKEND', 'json')
+app.config['SQLITE_DB_FILE'] = os.getenv('SQLITE_DB_FILE', 'blog.db')
+app.config['POSTS_DIR'] = os.getenv('POSTS_DIR', 'posts')
+
+# Visitor analytics backend: 'buffer' merges per-worker increments into
+# visitors.json, 'eventlog' appends every visit to a daily log in VISIT_LOG_DIR
+# and compacts finished days into visitors.json in the background, 'sqlite'
+# merges the buffered increments into the SQLite database.
+app.config['VISITOR_BACKEND'] = os.getenv(
+    'VISITOR_BACKEND', 'sqlite' if app.config['STORAGE_BACKEND'] == 'sqlite' else 'buffer')
+
+# Visits are buffered per worker and merged into visitors.json every
+# VISIT_FLUSH_INTERVAL seconds or once VISIT_FLUSH_BATCH_SIZE visits are pending.
+# Set the batch size to 1 to write on every visit (e.g. on serverless hosts).
+app.config['VISIT_FLUSH_INTERVAL'] = float(os.getenv('VISIT_FLUSH_INTERVAL', 5))
+app.config['VISIT_FLUSH_BATCH_SIZE'] = int(os.getenv('VISIT_FLUSH_BATCH_SIZE', 50))
+
+app.config['VISIT_LOG_DIR'] = os.getenv('VISIT_LOG_DIR', 'visit_logs')
+app.config['VISIT_LOG_COMPACT_INTERVAL'] = float(os.getenv('VISIT_LOG_COMPACT_INTERVAL', 300))
+
+# Visits are handed to the backend by a background thread through a queue of
+# at most VISIT_QUEUE_SIZE entries; a full queue waits VISIT_QUEUE_TIMEOUT
+# seconds and then drops the visit. Set the size to 0 to record inline.
+app.config['VISIT_QUEUE_SIZE'] = int(os.getenv('VISIT_QUEUE_SIZE', 10000))
+app.config['VISIT_QUEUE_TIMEOUT'] = float(os.getenv('VISIT_QUEUE_TIMEOUT', 0))
+
+# Trending posts are ranked by visits decayed over each of these windows
+# (comma separated, units s/m/h/d/w); a visit's weight falls to 1/e after one window.
+app.config['TRENDING_WINDOWS'] = parse_windows(os.getenv('TRENDING_WINDOWS', '24h,7d'))
+
+# Browsers and proxies may reuse the Popular/Trending widget data this many seconds
+app.config['RANKINGS_MAX_AGE'] = int(os.getenv('RANKINGS_MAX_AGE', 60))
+
+# Most points the visitor stats charts get per series; longer ranges are
+# merged into wider buckets server-side.
+app.config['STATS_MAX_POINTS'] = int(os.getenv('STATS_MAX_POINTS', 120))
+
+# Rendered index and blog pages are cached per visibility class up to this many
+# bytes of HTML; set to 0 to render every request.
+app.config['PAGE_CACHE_MAX_BYTES'] = int(os.getenv('PAGE_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+
+# Rendered sidebars are kept per content version and visibility class up to
+# this many bytes of HTML (also used when whole-page caching is off); 0 disables.
+app.config['FRAGMENT_CACHE_MAX_BYTES'] = int(os.getenv('FRAGMENT_CACHE_MAX_BYTES', 2 * 1024 * 1024))
+
+# Rendered Markdown is kept (and saved to MARKDOWN_CACHE_FILE in the
+# background) up to this many bytes of HTML.
+app.config['MARKDOWN_CACHE_MAX_BYTES'] = int(os.getenv('MARKDOWN_CACHE_MAX_BYTES', 8 * 1024 * 1024))
+
+# Ungrouped posts shown per index page; group contents and subsection lists
+# are loaded on demand from the JSON API.
+app.config['INDEX_PAGE_SIZE'] = int(os.getenv('INDEX_PAGE_SIZE', 50))
+
+# `flask build-assets` writes content-hashed copies of static/ to this directory
+# (with .gz/.br variants, and WebP sizes of the images posts use); templates
+# then link to them under /assets/, cached by browsers for ASSET_MAX_AGE seconds.
+app.config['ASSET_BUILD_DIR'] = os.getenv('ASSET_BUILD_DIR', 'static_build')
+app.config['ASSET_MAX_AGE'] = int(os.getenv('ASSET_MAX_AGE', 365 * 24 * 3600))
+
+# HTML, JSON, CSS and JS responses of at least this many bytes are sent brotli
+# (with the brotli package) or gzip compressed, as the client prefers; cached
+# pages are gzipped from parts compressed once per version. 0 turns it off.
+app.config['COMPRESS_MIN_SIZE'] = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+
+# Every response carries a Server-Timing header with the milliseconds spent
+# loading data, tracking the visit, rendering Markdown and templates and
+# writing files; set to 0 to leave it out.
+app.config['SERVER_TIMING'] = os.getenv('SERVER_TIMING', '1') != '0'
+
+# /metrics (Prometheus text format) is served to a logged in admin. Set
+# METRICS_LOCALHOST to 1 to also serve it to requests made directly from this
+# machine; only do so if any proxy on it sets X-Forwarded-For.
+app.config['METRICS_LOCALHOST'] = os.getenv('METRICS_LOCALHOST', '0') == '1'
+
 # Admin credentials file
 ADMIN_FILE = 'admin_credentials.json'
 
@@ -32,99 +140,198 @@ BLOGS_FILE = 'blogs.json'
 GROUPS_FILE = 'groups.json'
 VISITORS_FILE = 'visitors.json'
 TEMP_USERS_FILE = 'temp_users.json'
+MARKDOWN_CACHE_FILE = 'markdown_cache.json'
+# Last blog/group ID handed out, so IDs of deleted items are never reused
+ID_COUNTERS_FILE = 'id_counters.json'
+# When the content version last changed, the index page's Last-Modified; kept
+# on disk so every worker agrees and deletions move it forward too
+CONTENT_CHANGES_FILE = 'content_changes.json'
 
-def load_blogs():
-    if os.path.exists(BLOGS_FILE):
-        try:
-            with open(BLOGS_FILE, 'r') as f:
-                blogs = json.load(f)
+def utc_now():
+    return datetime.now(timezone.utc).isoformat()
+
+def clean_blogs(blogs):
+    """Drop malformed blog entries and fill in missing fields"""
+    cleaned_blogs = {}
+    changed = False
+    for blog_id, blog_data in blogs.items():
+        if (isinstance(blog_data, dict) and 
+            blog_data.get('title') and 
+            isinstance(blog_data['title'], str) and 
+            blog_data['title'].strip() != ''):
             
-            # Clean up any malformed blog entries
-            cleaned_blogs = {}
-            for blog_id, blog_data in blogs.items():
-                if (isinstance(blog_data, dict) and 
-                    blog_data.get('title') and 
-                    isinstance(blog_data['title'], str) and 
-                    blog_data['title'].strip() != ''):
-                    
-                    # Ensure subsections exists and is a list
-                    if 'subsections' not in blog_data or not isinstance(blog_data['subsections'], list):
-                        blog_data['subsections'] = []
-                    
-                    # Ensure content exists
-                    if 'content' not in blog_data:
-                        blog_data['content'] = ''
-                    
-                    cleaned_blogs[blog_id] = blog_data
-                else:
-                    print(f"Warning: Skipping malformed blog entry {blog_id}: {blog_data}")
+            # Ensure subsections exists and is a list
+            if 'subsections' not in blog_data or not isinstance(blog_data['subsections'], list):
+                blog_data['subsections'] = []
             
-            # Save cleaned data back to file if we made changes
-            if len(cleaned_blogs) != len(blogs):
-                print(f"Cleaned blogs data: removed {len(blogs) - len(cleaned_blogs)} malformed entries")
-                save_blogs(cleaned_blogs)
+            # Ensure content exists
+            if 'content' not in blog_data:
+                blog_data['content'] = ''
             
-            return cleaned_blogs
-        except (json.JSONDecodeError, Exception) as e:
-            print(f"Error loading blogs: {e}")
-            return {}
-    return {}
+            # Posts saved before modification times were tracked start from now
+            if 'updated_at' not in blog_data:
+                blog_data['updated_at'] = utc_now()
+                changed = True
+            
+            cleaned_blogs[blog_id] = blog_data
+        else:
+            print(f"Warning: Skipping malformed blog entry {blog_id}: {blog_data}")
+    
+    # Save cleaned data back to file if we made changes
+    if len(cleaned_blogs) != len(blogs):
+        changed = True
+        print(f"Cleaned blogs data: removed {len(blogs) - len(cleaned_blogs)} malformed entries")
+    
+    return cleaned_blogs, changed
+
+database = None
+if app.config['STORAGE_BACKEND'] == 'sqlite' or app.config['VISITOR_BACKEND'] == 'sqlite':
+    database = SQLiteDatabase(app.config['SQLITE_DB_FILE'])
+
+# Parsed once per process and reloaded only when the source changes
+if app.config['STORAGE_BACKEND'] == 'sqlite':
+    blog_store = ContentStore(SQLiteBlogSource(database), normalize=clean_blogs)
+    group_store = ContentStore(SQLiteGroupSource(database))
+    temp_user_source = SQLiteTempUserSource(database)
+    id_allocator = SQLiteIdAllocator(database)
+elif app.config['STORAGE_BACKEND'] == 'files':
+    # Posts are cleaned on migration; normalizing here would load every body
+    blog_store = ContentStore(PostFileSource(app.config['POSTS_DIR']))
+    group_store = ContentStore(GROUPS_FILE)
+    temp_user_source = JSONFileSource(TEMP_USERS_FILE)
+    id_allocator = IdAllocator(ID_COUNTERS_FILE)
+else:
+    blog_store = ContentStore(BLOGS_FILE, normalize=clean_blogs)
+    group_store = ContentStore(GROUPS_FILE)
+    temp_user_source = JSONFileSource(TEMP_USERS_FILE)
+    id_allocator = IdAllocator(ID_COUNTERS_FILE)
+
+# Original static/ path -> built file name, reloaded after every build
+asset_manifest = ContentStore(os.path.join(app.config['ASSET_BUILD_DIR'], ASSET_MANIFEST_FILE))
+
+visit_backend = create_visit_backend(app.config['VISITOR_BACKEND'], VISITORS_FILE,
+                                     database=database,
+                                     flush_interval=app.config['VISIT_FLUSH_INTERVAL'],
+                                     batch_size=app.config['VISIT_FLUSH_BATCH_SIZE'],
+                                     log_dir=app.config['VISIT_LOG_DIR'],
+                                     compact_interval=app.config['VISIT_LOG_COMPACT_INTERVAL'],
+                                     trending_windows=app.config['TRENDING_WINDOWS'])
+
+# Built on the first search and then kept up to date post by post
+search_index = SearchIndex()
+
+# Group membership sets and the blog -> groups map, rebuilt when groups reload
+group_index = GroupIndex()
+
+page_cache = PageCache(app.config['PAGE_CACHE_MAX_BYTES'])
+fragment_cache = PageCache(app.config['FRAGMENT_CACHE_MAX_BYTES'])
+
+def content_version():
+    """Changes whenever blogs, groups or the built assets change, in this worker or another one"""
+    return request_cached('content_version',
+                          lambda: (blog_store.stamp(), group_store.stamp(), asset_manifest.stamp()))
+
+def stored_version():
+    """The content version on disk right now, read before a write for invalidate_pages()"""
+    forget_cached('content_version')
+    return content_version()
+
+def invalidate_pages(before, *tags):
+    """Drop cached pages and fragments showing content that was just saved.
+
+    before is stored_version() from just before the write. The caches move
+    on to the new version only if they were rendered from that one; if
+    another worker changed something in between, which the write may have
+    merged, dropping tags is not enough and they are emptied instead.
+    """
+    version = content_version()
+    page_cache.invalidate(tags, version=version, previous=before)
+    fragment_cache.invalidate(tags, version=version, previous=before)
+
+def cached_fragment(key, tag, render):
+    """HTML from render(), rendered once per content version and kept in fragment_cache"""
+    if not fragment_cache.max_bytes:
+        return Markup(render())
+    
+    version = content_version()
+    fragment_cache.sync(version)
+    body = fragment_cache.get(key)
+    if body is None:
+        body = render().encode()
+        fragment_cache.set(key, body, [tag], version)
+    return Markup(body.decode())
+
+def request_cached(name, compute):
+    """Compute a value at most once per request and keep it on flask.g"""
+    if not has_app_context():
+        return compute()
+    if name not in g:
+        setattr(g, name, compute())
+    return getattr(g, name)
+
+def forget_cached(*names):
+    """Drop request-cached values after the data behind them was saved"""
+    if has_app_context():
+        for name in names:
+            g.pop(name, None)
+
+def load_blogs():
+    return request_cached('blogs', blog_store.get)
 
 def save_blogs(blogs):
-    with open(BLOGS_FILE, 'w') as f:
-        json.dump(blogs, f, indent=4)
+    blog_store.save(blogs)
+    forget_cached('blogs', 'content_version')
+    search_index.invalidate()
+
+def save_blog(blog_id, blog):
+    """Save a single blog; the SQLite backend only writes its rows"""
+    blog['updated_at'] = utc_now()
+    before = stored_version()
+    blog_store.save_item(blog_id, blog)
+    forget_cached('blogs', 'content_version')
+    search_index.index_blog(blog_id, blog)
+    invalidate_pages(before, 'index', f'blog:{blog_id}')
+
+def remove_blog(blog_id):
+    before = stored_version()
+    blog_store.delete_item(blog_id)
+    forget_cached('blogs', 'content_version')
+    invalidate_pages(before, 'index', f'blog:{blog_id}')
+    # Drop the post from every group listing it
+    groups = load_groups()
+    for group_id in load_group_index().remove_blog(groups, blog_id):
+        save_group(group_id, groups[group_id])
+    search_index.remove_blog(blog_id)
 
 def load_groups():
-    if os.path.exists(GROUPS_FILE):
-        with open(GROUPS_FILE, 'r') as f:
-            return json.load(f)
-    return {}
+    return request_cached('groups', group_store.get)
+
+def load_group_index():
+    group_index.sync(load_groups(), group_store.stamp())
+    return group_index
 
 def save_groups(groups):
-    with open(GROUPS_FILE, 'w') as f:
-        json.dump(groups, f, indent=4)
+    group_store.save(groups)
+    forget_cached('groups', 'content_version')
 
-def load_visitors():
-    """Load visitor data with proper default structure and error handling"""
-    default_visitors = {
-        'total_visits': 0,
-        'unique_visitors': {},
-        'blog_visits': {},
-        'daily_visits': {},
-        'daily_unique_visitors': {}
-    }
-    
-    # If file doesn't exist, return default structure
-    if not os.path.exists(VISITORS_FILE):
-        return default_visitors.copy()
-    
-    try:
-        # Check if file is empty
-        if os.path.getsize(VISITORS_FILE) == 0:
-            return default_visitors.copy()
-            
-        with open(VISITORS_FILE, 'r') as f:
-            data = json.load(f)
-            
-        # Ensure all required keys exist with proper defaults
-        for key, default_value in default_visitors.items():
-            if key not in data:
-                data[key] = default_value
-        
-        return data
-        
-    except (json.JSONDecodeError, Exception) as e:
-        print(f"Error loading visitors file: {e}. Using default structure.")
-        # If there's any error reading the file, return default structure
-        return default_visitors.copy()
+def save_group(group_id, group):
+    """Save a single group; the SQLite backend only writes its rows"""
+    group['updated_at'] = utc_now()
+    before = stored_version()
+    group_store.save_item(group_id, group)
+    forget_cached('groups', 'content_version')
+    invalidate_pages(before, 'index')
 
-def save_visitors(visitors):
-    """Save visitor data with error handling"""
-    try:
-        with open(VISITORS_FILE, 'w') as f:
-            json.dump(visitors, f, indent=4)
-    except Exception as e:
-        print(f"Error saving visitors file: {e}")
+def remove_group(group_id):
+    before = stored_version()
+    group_store.delete_item(group_id)
+    group_index.remove_group(group_id)
+    forget_cached('groups', 'content_version')
+    invalidate_pages(before, 'index')
+
+def load_visitors():
+    """Load visitor data, including this worker's not yet flushed visits"""
+    return request_cached('visitors', visit_backend.visitors)
 
 def get_client_ip():
     """Get client IP address considering proxy headers"""
@@ -140,49 +347,43 @@ def hash_ip(ip_address):
     """Hash IP address for privacy while maintaining uniqueness"""
     return hashlib.sha256(ip_address.encode()).hexdigest()[:16]
 
+# Hashing and recording happen off the request thread
+visit_recorder = AsyncVisitRecorder(visit_backend, hash_ip,
+                                    max_size=app.config['VISIT_QUEUE_SIZE'],
+                                    put_timeout=app.config['VISIT_QUEUE_TIMEOUT'])
+
 def track_visit(blog_id=None):
-    visitors = load_visitors()
-    today = datetime.now().strftime('%Y-%m-%d')
-    client_ip = get_client_ip()
-    ip_hash = hash_ip(client_ip)
-    
-    # Update total visits
-    visitors['total_visits'] += 1
-    
-    # Update daily visits
-    if today not in visitors['daily_visits']:
-        visitors['daily_visits'][today] = 0
-    visitors['daily_visits'][today] += 1
-    
-    # Track unique visitors
-    is_new_visitor = ip_hash not in visitors['unique_visitors']
-    if is_new_visitor:
-        visitors['unique_visitors'][ip_hash] = 1
-    else:
-        visitors['unique_visitors'][ip_hash] += 1
-    
-    # Track daily unique visitors
-    if today not in visitors['daily_unique_visitors']:
-        visitors['daily_unique_visitors'][today] = 0
-    if is_new_visitor:
-        visitors['daily_unique_visitors'][today] += 1
-    
-    # Update blog-specific visits if blog_id provided
-    if blog_id:
-        if blog_id not in visitors['blog_visits']:
-            visitors['blog_visits'][blog_id] = 0
-        visitors['blog_visits'][blog_id] += 1
-    
-    save_visitors(visitors)
-    
-    # Return visitor stats for display
-    return {
-        'total_visits': visitors['total_visits'],
-        'unique_visitors': len(visitors['unique_visitors']),
-        'today_visits': visitors['daily_visits'].get(today, 0),
-        'today_unique_visitors': visitors['daily_unique_visitors'].get(today, 0),
-        'blog_visits': visitors['blog_visits'].get(blog_id, 0) if blog_id else 0
-    }
+    with phase('visits'):
+        today = datetime.now().strftime('%Y-%m-%d')
+        # Pages rendered for `flask export-static` are not visits
+        if not request.environ.get(EXPORT_ENVIRON_KEY):
+            visit_recorder.submit(get_client_ip(), today, blog_id)
+        
+        # Return visitor stats for display from the in-memory view; a visit still
+        # in the queue shows up on the next request
+        return visit_backend.stats(today, blog_id)
+
+def site_stats():
+    """Site-wide numbers from the backend's incrementally kept snapshot (O(1))"""
+    return visit_backend.summary(datetime.now().strftime('%Y-%m-%d'))
+
+def ranked_posts(entries, limit=None):
+    """Titles and links for (blog_id, score) entries, skipping posts the viewer can't see"""
+    blogs = load_blogs()
+    posts = []
+    for blog_id, score in entries:
+        blog = blogs.get(blog_id)
+        if not blog or not blog.get('title') or not is_visible(blog):
+            continue
+        posts.append({
+            'id': blog_id,
+            'title': blog['title'],
+            'url': url_for('blog_detail', blog_id=blog_id),
+            'score': score
+        })
+        if limit and len(posts) >= limit:
+            break
+    return posts
 
 def get_visitor_stats():
     """Get comprehensive visitor statistics"""
@@ -196,22 +397,43 @@ def get_visitor_stats():
     
     return {
         'total_visits': visitors.get('total_visits', 0),
-        'unique_visitors': len(visitors.get('unique_visitors', {})),
+        'unique_visitors': visitors.get('unique_visitors', 0),
         'today_visits': visitors.get('daily_visits', {}).get(today, 0),
         'today_unique_visitors': visitors.get('daily_unique_visitors', {}).get(today, 0),
         'most_popular_blog': most_popular_blog,
         'blog_visits': visitors.get('blog_visits', {}),
-        'daily_visits': visitors.get('daily_visits', {})
+        'blog_unique_visitors': visitors.get('blog_unique_visitors', {}),
+        'daily_visits': visitors.get('daily_visits', {}),
+        'daily_unique_visitors': visitors.get('daily_unique_visitors', {})
     }
 
+# Rendered HTML keyed by source hash, kept on disk so restarts start warm
+markdown_cache = MarkdownCache([
+    'fenced_code',
+    'tables',
+    'toc'
+], path=MARKDOWN_CACHE_FILE, max_bytes=app.config['MARKDOWN_CACHE_MAX_BYTES'])
+atexit.register(markdown_cache.persist)
+
 def safe_markdown(text):
     """Convert markdown to HTML with GitHub-like styling"""
-    html = markdown(text, extensions=[
-        'fenced_code',
-        'tables',
-        'toc'
-    ])
-    return html
+    with phase('markdown'):
+        html = markdown_cache.render(text)
+        manifest = asset_manifest.get()
+        if manifest and '<img' in html:
+            html = rewrite_images(html, manifest, lambda name: url_for('asset', filename=name))
+        return html
+
+def asset_url_for(endpoint, **values):
+    """url_for for templates: static files with a built copy link to that copy"""
+    if endpoint == 'static':
+        built = asset_manifest.get().get('files', {}).get(values.get('filename'))
+        if built:
+            endpoint = 'asset'
+            values['filename'] = built
+    return url_for(endpoint, **values)
+
+app.jinja_env.globals['url_for'] = asset_url_for
 
 def init_admin():
     """Initialize admin credentials if not exists"""
@@ -224,20 +446,36 @@ def init_admin():
             'failed_attempts': 0,
             'locked_until': None
         }
-        with open(ADMIN_FILE, 'w') as f:
-            json.dump(default_admin, f, indent=4)
+        with file_lock(ADMIN_FILE):
+            write_json_atomic(ADMIN_FILE, default_admin)
 
 def load_admin():
     """Load admin credentials"""
     if os.path.exists(ADMIN_FILE):
-        with open(ADMIN_FILE, 'r') as f:
-            return json.load(f)
+        return read_json(ADMIN_FILE)
     return None
 
-def save_admin(admin_data):
-    """Save admin credentials"""
-    with open(ADMIN_FILE, 'w') as f:
-        json.dump(admin_data, f, indent=4)
+def update_admin(change):
+    """Re-read the admin credentials under their lock, apply change(admin) and save them.
+
+    Only this read-modify-write holds the lock, so password hashing and
+    the login form never make other workers wait.
+    """
+    return update_json(ADMIN_FILE, change)
+
+def record_failed_login(admin):
+    """Count a failed login; the fifth in a row locks the account for 30 minutes"""
+    if admin.get('locked_until') and datetime.now() >= datetime.fromisoformat(admin['locked_until']):
+        # An expired lock starts a new count
+        admin['locked_until'] = None
+        admin['failed_attempts'] = 0
+    admin['failed_attempts'] = admin.get('failed_attempts', 0) + 1
+    if admin['failed_attempts'] >= 5 and not admin.get('locked_until'):
+        admin['locked_until'] = (datetime.now() + timedelta(minutes=30)).isoformat()
+
+def reset_failed_logins(admin):
+    admin['failed_attempts'] = 0
+    admin['locked_until'] = None
 
 def login_required(f):
     """Decorator to protect routes"""
@@ -252,13 +490,16 @@ def login_required(f):
 # Helper functions for temp users
 def load_temp_users():
     """Load temporary users data"""
+    return request_cached('temp_users', read_temp_users)
+
+def read_temp_users():
+    """Read temp users from storage, with codes overridden from the environment"""
     temp_users = {}
     
-    # First try to load from file (for local development)
-    if os.path.exists(TEMP_USERS_FILE):
+    # First try to load from storage (for local development)
+    if temp_user_source.stamp() is not None:
         try:
-            with open(TEMP_USERS_FILE, 'r') as f:
-                temp_users = json.load(f)
+            temp_users = temp_user_source.read()
         except (json.JSONDecodeError, Exception) as e:
             print(f"Error loading temp users: {e}")
     
@@ -273,8 +514,11 @@ def load_temp_users():
 
 def save_temp_users(temp_users):
     """Save temporary users data"""
-    with open(TEMP_USERS_FILE, 'w') as f:
-        json.dump(temp_users, f, indent=4)
+    temp_user_source.write(temp_users)
+    forget_cached('temp_users')
+
+# Held across a route's load-modify-save so concurrent workers don't drop edits
+temp_users_locked = locked(TEMP_USERS_FILE)
 
 def generate_access_code(length=8):
     """Generate a random access code"""
@@ -327,22 +571,269 @@ def temp_login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def subsection_titles(blog):
+    """Subsection titles, read from the manifest when posts are stored as files"""
+    titles = getattr(blog, 'subsection_titles', None)
+    if titles is None:
+        titles = [subsection.get('title', '') for subsection in blog.get('subsections', [])]
+    return titles
+
+def visibility_class():
+    """Who a page is rendered for: everything else about it is the same for all readers"""
+    if 'admin_logged_in' in session:
+        return 'admin'
+    if 'temp_user_logged_in' in session:
+        # The navbar shows the temp user's name
+        kind = 'temp-all' if session.get('temp_can_see_all_hidden', False) else 'temp'
+        return f"{kind}:{session.get('temp_username', '')}"
+    return 'anonymous'
+
+def can_see_hidden():
+    """Admins and temp users granted access to hidden content see hidden posts"""
+    return 'admin_logged_in' in session or session.get('temp_can_see_all_hidden', False)
+
+def is_visible(item):
+    """Whether the current viewer may see a blog or group"""
+    return not item.get('hidden', False) or can_see_hidden()
+
+def page_etag(*parts):
+    """Strong ETag for a page built from the content version and the viewer"""
+    return hashlib.sha1(repr(parts + (visibility_class(),)).encode()).hexdigest()
+
+# Slug -> blog ID, rebuilt only when the content changes
+blog_slugs = {'version': None, 'ids': {}}
+
+def slug_index():
+    version = content_version()
+    if blog_slugs['version'] != version:
+        blog_slugs['ids'] = {blog['slug']: blog_id for blog_id, blog in load_blogs().items() if blog.get('slug')}
+        blog_slugs['version'] = version
+    return blog_slugs['ids']
+
+def blog_id_for_slug(slug):
+    return slug_index().get(slug)
+
+def assign_slug(blog_id, blog, text):
+    """Give a blog a unique slug made from text, or drop its slug if text is empty"""
+    taken = {slug for slug, other_id in slug_index().items() if other_id != blog_id}
+    if text.strip():
+        blog['slug'] = unique_slug(text, taken)
+    else:
+        blog.pop('slug', None)
+
+@app.url_value_preprocessor
+def resolve_blog_slug(endpoint, values):
+    """Let /blog/<slug> reach blog_detail with the post's stable ID"""
+    if endpoint == 'blog_detail' and values and values.get('blog_id') not in load_blogs():
+        blog_id = blog_id_for_slug(values['blog_id'])
+        if blog_id is not None:
+            values['blog_id'] = blog_id
+
+@app.url_defaults
+def blog_slug_url(endpoint, values):
+    """Link to posts by slug when they have one"""
+    if endpoint == 'blog_detail' and 'blog_id' in values:
+        blog = load_blogs().get(values['blog_id'])
+        if blog and blog.get('slug'):
+            values['blog_id'] = blog['slug']
+
+def assets_built_at():
+    """When `flask build-assets` last wrote the manifest, or None without a build"""
+    stamp = asset_manifest.stamp()
+    return datetime.fromtimestamp(stamp[0] / 1e9, timezone.utc) if stamp else None
+
+def content_changed_at(version):
+    """When some worker first saw the content at version; deletions and reorders count too"""
+    key = repr(version)
+    try:
+        changes = read_json(CONTENT_CHANGES_FILE)
+    except (FileNotFoundError, ValueError):
+        changes = {}
+    if changes.get('version') != key:
+        def record(data):
+            # Another worker may have recorded this version while we waited for the lock
+            if data.get('version') != key:
+                data['version'] = key
+                data['changed_at'] = utc_now()
+        changes = update_json(CONTENT_CHANGES_FILE, record)
+    return datetime.fromisoformat(changes['changed_at'])
+
+# When the index content last changed, looked up only when the content version does
+index_last_modified = {'version': None, 'value': None}
+
+def index_validators():
+    version = content_version()
+    if index_last_modified['version'] != version:
+        index_last_modified['value'] = content_changed_at(version)
+        index_last_modified['version'] = version
+    return page_etag('index', version), index_last_modified['value']
+
+def blog_validators(blog_id):
+    blog = load_blogs().get(blog_id)
+    if not blog or not is_visible(blog):
+        # Let the view answer with its 404 or redirect
+        return None
+    updated_at = blog.get('updated_at')
+    # The page links the built assets too, so a new build is a new page
+    modified = [value for value in (datetime.fromisoformat(updated_at) if updated_at else None,
+                                    assets_built_at()) if value]
+    return page_etag('blog', blog_id, updated_at, asset_manifest.stamp()), max(modified, default=None)
+
+def group_validators(group_id):
+    group = load_groups().get(group_id)
+    if not group or not is_visible(group):
+        return None
+    # The listing also shows post titles, so any content change counts
+    return page_etag('group', group_id, content_version()), None
+
+def conditional_page(validators, track_visits=True):
+    """Decorator answering If-None-Match/If-Modified-Since with a 304 before rendering"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            found = validators(**kwargs)
+            if found is None:
+                return f(*args, **kwargs)
+
+            etag, last_modified = found
+            if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+                if track_visits:
+                    track_visit(kwargs.get('blog_id'))
+                response = make_response('', 304)
+            else:
+                response = make_response(f(*args, **kwargs))
+            if response.status_code in (200, 304):
+                response.set_etag(etag)
+                if last_modified:
+                    response.last_modified = last_modified
+                # Pages differ per session, so shared caches must revalidate per cookie
+                response.headers['Cache-Control'] = (
+                    'public, no-cache' if visibility_class() == 'anonymous' else 'private, no-cache')
+                response.vary.add('Cookie')
+            return response
+        return decorated_function
+    return decorator
+
+def cached_page(tag):
+    """Decorator serving a page from page_cache; tag may use the view's arguments"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not page_cache.max_bytes:
+                return f(*args, **kwargs)
+
+            version = content_version()
+            page_cache.sync(version)
+            key = (request.full_path, visibility_class())
+            body = page_cache.get(key)
+            if body is not None:
+                # The visit still counts, and the footer shows the fresh totals
+                visit_data = track_visit(kwargs.get('blog_id'))
+                if accepts_cached_gzip(body):
+                    return gzipped_page(key, body, [tag.format(**kwargs)], version, visit_data)
+                return make_response(fill_stats(body, visit_data))
+
+            response = make_response(f(*args, **kwargs))
+            if response.status_code == 200 and response.mimetype == 'text/html':
+                page_cache.set(key, response.get_data(), [tag.format(**kwargs)], version)
+            return response
+        return decorated_function
+    return decorator
+
+def accepts_cached_gzip(body):
+    """Whether a cached page goes out gzipped; brotli would cost a compression per request"""
+    min_size = app.config['COMPRESS_MIN_SIZE']
+    return bool(min_size) and len(body) >= min_size and request.accept_encodings['gzip'] > 0
+
+def gzipped_page(key, body, tags, version, stats):
+    """A cached page's gzip, kept next to it in page_cache, with the footer counters filled in"""
+    gzip_key = key + ('gzip',)
+    with phase('compress'):
+        entry = page_cache.get(gzip_key)
+        if entry is None:
+            parts, names = split_stats(body)
+            entry = (GzipTemplate(parts), names)
+            page_cache.set(gzip_key, entry, tags, version, size=entry[0].size)
+        template, names = entry
+        data = template.render([str(stats.get(name, '')).encode() for name in names])
+    response = make_response(data)
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+template_timer = PhaseTimer('template')
+
+def start_template_timer(sender, **extra):
+    template_timer.start()
+
+def stop_template_timer(sender, **extra):
+    template_timer.stop()
+
+before_render_template.connect(start_template_timer, app)
+template_rendered.connect(stop_template_timer, app)
+
+@app.after_request
+def record_request_timing(response):
+    """Add the Server-Timing header and count the request in the /metrics histograms"""
+    timing = request_timing()
+    if timing is not None:
+        total, phases = timing
+        metrics.observe(request.endpoint or 'unmatched', response.status_code, total, phases)
+        if app.config['SERVER_TIMING']:
+            response.headers['Server-Timing'] = server_timing(total, phases)
+    return response
+
+@app.after_request
+def compress_response(response):
+    """Compress text responses for clients that accept brotli or gzip (runs before the timing hook)"""
+    min_size = app.config['COMPRESS_MIN_SIZE']
+    if not min_size or response.mimetype not in COMPRESSIBLE_TYPES:
+        return response
+    response.vary.add('Accept-Encoding')
+    if 'Content-Encoding' not in response.headers:
+        if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+                or 'no-transform' in response.headers.get('Cache-Control', '')):
+            return response
+        data = response.get_data()
+        encoding = choose_encoding(request.accept_encodings)
+        if len(data) < min_size or encoding is None:
+            return response
+        with phase('compress'):
+            response.set_data(compress(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+    
+    # The compressed bytes differ from the uncompressed page the ETag was made for
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
 @app.context_processor
 def inject_data():
     is_temp_user = 'temp_user_logged_in' in session
     temp_username = session.get('temp_username', '')
     
     return {
-        'blogs': load_blogs(),
-        'groups': load_groups(),
-        'visitor_stats': get_visitor_stats(),
+        # Only loaded if the template actually reads them, and then shared
+        # with the view's own load_blogs()/load_groups() calls
+        'blogs': LocalProxy(load_blogs),
+        'groups': LocalProxy(load_groups),
+        'visitor_stats': LocalProxy(lambda: request_cached('visitor_stats', site_stats)),
         'is_temp_user': is_temp_user,
-        'temp_username': temp_username
+        'temp_username': temp_username,
+        'subsection_titles': subsection_titles
     }
 
 @app.route('/')
+@conditional_page(index_validators)
+@cached_page('index')
 def index():
     track_visit()
+    page = request.args.get('page', 1, type=int)
+    sidebar = cached_fragment(('index', page, visibility_class()), 'index', lambda: render_index_sidebar(page))
+    return render_template('index.html', sidebar=sidebar)
+
+def render_index_sidebar(page):
+    """Group list and one page of ungrouped posts, filtered for the current viewer"""
     blogs = load_blogs()
     groups = load_groups()
     
@@ -360,9 +851,76 @@ def index():
             groups = {group_id: group for group_id, group in groups.items() 
                      if not group.get('hidden', False)}
     
-    return render_template('index.html', blogs=blogs, groups=groups)
+    ungrouped_ids = ungrouped_blog_ids(blogs, groups)
+    page_size = app.config['INDEX_PAGE_SIZE']
+    page_count = max(1, -(-len(ungrouped_ids) // page_size))
+    page = min(max(page, 1), page_count)
+    ungrouped_ids = ungrouped_ids[(page - 1) * page_size:page * page_size]
+    
+    return render_template('index_sidebar.html', blogs=blogs, groups=groups, ungrouped_ids=ungrouped_ids,
+                           page=page, page_count=page_count)
+
+def ungrouped_blog_ids(blogs, groups):
+    """IDs of titled blogs that are in none of the given groups, in catalog order"""
+    index = load_group_index()
+    return [blog_id for blog_id, blog in blogs.items()
+            if blog and blog.get('title') and not index.is_grouped(blog_id, groups)]
+
+@app.route('/api/blogs/<blog_id>/subsections')
+@conditional_page(blog_validators, track_visits=False)
+def blog_subsections_api(blog_id):
+    """Subsection links of a post, loaded when it is expanded in the sidebar"""
+    blog = load_blogs().get(blog_id)
+    if not blog or not is_visible(blog):
+        return jsonify({'error': 'Blog not found'}), 404
+    
+    url = url_for('blog_detail', blog_id=blog_id)
+    return jsonify({
+        'blog_id': blog_id,
+        'subsections': [{'title': title, 'url': f'{url}#subsection-{index}'}
+                        for index, title in enumerate(subsection_titles(blog))]
+    })
+
+@app.route('/api/groups/<group_id>/blogs')
+@conditional_page(group_validators, track_visits=False)
+def group_blogs_api(group_id):
+    """Posts of a group, loaded when the group is expanded in the sidebar"""
+    group = load_groups().get(group_id)
+    if not group or not is_visible(group):
+        return jsonify({'error': 'Group not found'}), 404
+    
+    blogs = load_blogs()
+    items = []
+    for blog_id in group.get('blogs', []):
+        blog = blogs.get(blog_id)
+        if not blog or not blog.get('title') or not is_visible(blog):
+            continue
+        items.append({
+            'blog_id': blog_id,
+            'title': blog['title'],
+            'url': url_for('blog_detail', blog_id=blog_id),
+            'subsection_count': len(subsection_titles(blog)),
+            'subsections_url': url_for('blog_subsections_api', blog_id=blog_id)
+        })
+    return jsonify({'group_id': group_id, 'blogs': items})
+
+@app.route('/api/rankings')
+def rankings_api():
+    """Popular and trending posts for the index widget"""
+    rankings = visit_backend.rankings()
+    response = jsonify({
+        'popular': ranked_posts(rankings['popular']),
+        'trending': {name: ranked_posts(entries) for name, entries in rankings['trending'].items()}
+    })
+    # Counts move with every visit; a short max-age keeps the widget cheap
+    response.headers['Cache-Control'] = '%s, max-age=%d' % (
+        'public' if visibility_class() == 'anonymous' else 'private', app.config['RANKINGS_MAX_AGE'])
+    response.vary.add('Cookie')
+    return response
 
 @app.route('/blog/<blog_id>')
+@conditional_page(blog_validators)
+@cached_page('blog:{blog_id}')
 def blog_detail(blog_id):
     visit_data = track_visit(blog_id)
     blogs = load_blogs()
@@ -386,12 +944,31 @@ def blog_detail(blog_id):
             flash('This blog post is not available', 'error')
             return redirect(url_for('index'))
     
-    # Convert markdown to HTML
+    # Convert markdown to HTML on copies so the shared store data stays untouched
+    blog = dict(blog)
     blog['content_html'] = safe_markdown(blog['content'])
-    for subsection in blog.get('subsections', []):
-        subsection['content_html'] = safe_markdown(subsection['content'])
+    blog['subsections'] = [
+        dict(subsection, content_html=safe_markdown(subsection['content']))
+        for subsection in blog.get('subsections', [])
+    ]
     
-    return render_template('blog_detail.html', blog=blog, blog_id=blog_id, visit_data=visit_data)
+    # The navigation only depends on the post, so it is kept across requests
+    sidebar = cached_fragment(('blog', blog_id, blog.get('updated_at')), f'blog:{blog_id}',
+                              lambda: render_template('blog_sidebar.html', blog=blog, blog_id=blog_id))
+    
+    return render_template('blog_detail.html', blog=blog, blog_id=blog_id, visit_data=visit_data,
+                           sidebar=sidebar)
+
+@app.route('/search')
+def search():
+    """Full-text search over post titles, bodies and code blocks"""
+    query = request.args.get('q', '').strip()
+    results = []
+    if query:
+        see_hidden = can_see_hidden()
+        results = search_index.search(query, load_blogs(),
+                                      visible=lambda blog: see_hidden or not blog.get('hidden', False))
+    return render_template('search.html', query=query, results=results)
 
 #Authentication System
 @app.route('/login', methods=['GET', 'POST'])
@@ -410,19 +987,13 @@ def login():
             flash('Admin account not found. Please contact system administrator.', 'error')
             return render_template('login.html')
         
-        # Check if account is locked
+        # Check if account is locked (an expired lock is cleared by the next save)
         if admin.get('locked_until'):
-            from datetime import datetime
             locked_until = datetime.fromisoformat(admin['locked_until'])
             if datetime.now() < locked_until:
                 remaining = (locked_until - datetime.now()).seconds // 60
                 flash(f'Account locked. Try again in {remaining} minutes.', 'error')
                 return render_template('login.html')
-            else:
-                # Unlock account
-                admin['locked_until'] = None
-                admin['failed_attempts'] = 0
-                save_admin(admin)
         
         # Validate credentials
         if username == admin['username'] and check_password_hash(admin['password'], password):
@@ -432,24 +1003,19 @@ def login():
             session['username'] = username
             
             # Reset failed attempts
-            admin['failed_attempts'] = 0
-            admin['locked_until'] = None
-            save_admin(admin)
+            if admin.get('failed_attempts') or admin.get('locked_until'):
+                update_admin(reset_failed_logins)
             
             flash('Login successful!', 'success')
             return redirect(url_for('admin'))
         else:
-            # Failed login
-            admin['failed_attempts'] = admin.get('failed_attempts', 0) + 1
+            # Failed login; counted on the stored record, so attempts in other workers add up
+            admin = update_admin(record_failed_login)
             
             # Lock account after 5 failed attempts
-            if admin['failed_attempts'] >= 5:
-                from datetime import datetime, timedelta
-                admin['locked_until'] = (datetime.now() + timedelta(minutes=30)).isoformat()
-                save_admin(admin)
+            if admin.get('locked_until'):
                 flash('Too many failed attempts. Account locked for 30 minutes.', 'error')
             else:
-                save_admin(admin)
                 remaining = 5 - admin['failed_attempts']
                 flash(f'Invalid credentials. {remaining} attempts remaining.', 'error')
             
@@ -489,9 +1055,9 @@ def change_password():
             flash('Passwords do not match', 'error')
             return render_template('change_password.html')
         
-        # Update password
-        admin['password'] = generate_password_hash(new_password, method='pbkdf2:sha256')
-        save_admin(admin)
+        # Update password, hashed before taking the lock
+        password_hash = generate_password_hash(new_password, method='pbkdf2:sha256')
+        update_admin(lambda stored: stored.__setitem__('password', password_hash))
         
         flash('Password changed successfully', 'success')
         return redirect(url_for('admin'))
@@ -505,9 +1071,16 @@ def change_password():
 def admin():
     blogs = load_blogs()
     groups = load_groups()
-    visitor_stats = get_visitor_stats()
+    visitor_stats = site_stats()
     return render_template('admin.html', blogs=blogs, groups=groups, visitor_stats=visitor_stats)
 
+def stats_day(value):
+    """value as a zero-padded YYYY-MM-DD day, which the visit data compares as text.
+
+    Raises ValueError if it is not a date.
+    """
+    return datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
+
 @app.route('/visitor_stats')
 @login_required
 def visitor_stats():
@@ -515,47 +1088,132 @@ def visitor_stats():
     stats = get_visitor_stats()
     blogs = load_blogs()
     
-    # Add blog titles to stats
-    blog_stats = []
-    for blog_id, visits in stats['blog_visits'].items():
-        blog_title = blogs.get(blog_id, {}).get('title', 'Unknown Blog') if blog_id else 'Homepage'
-        blog_stats.append({
-            'id': blog_id,
-            'title': blog_title,
-            'visits': visits
-        })
-    
-    # Sort by visits descending
-    blog_stats.sort(key=lambda x: x['visits'], reverse=True)
-    
-    # Limit to top 6 posts only
-    blog_stats = blog_stats[:6]
-    
-    return render_template('visitor_stats.html', 
-                         stats=stats, 
-                         blog_stats=blog_stats,
-                         blogs=blogs)
-    """Detailed visitor statistics page"""
-    stats = get_visitor_stats()
-    blogs = load_blogs()
+    # Optional date range (YYYY-MM-DD, inclusive) for the daily and per-post
+    # numbers; a bound that is not a date is left out
+    date_from = request.args.get('from', '')
+    date_to = request.args.get('to', '')
+    try:
+        date_from = stats_day(date_from) if date_from else ''
+    except ValueError:
+        date_from = ''
+    try:
+        date_to = stats_day(date_to) if date_to else ''
+    except ValueError:
+        date_to = ''
+    blog_visits = stats['blog_visits']
+    if date_from or date_to:
+        range_stats = visit_backend.range_stats(date_from or '0000-00-00', date_to or '9999-99-99')
+        stats['daily_visits'] = range_stats['daily_visits']
+        if range_stats['blog_visits'] is not None:
+            blog_visits = range_stats['blog_visits']
+    
+    rankings = visit_backend.rankings()
+    if date_from or date_to:
+        top_visits = heapq.nlargest(6, blog_visits.items(), key=lambda x: x[1])
+    else:
+        # The backend keeps the all-time top posts ranked already
+        top_visits = rankings['popular'][:6]
     
-    # Add blog titles to stats
+    # Add blog titles to the top 6 posts only
     blog_stats = []
-    for blog_id, visits in stats['blog_visits'].items():
+    for blog_id, visits in top_visits:
         blog_title = blogs.get(blog_id, {}).get('title', 'Unknown Blog') if blog_id else 'Homepage'
         blog_stats.append({
             'id': blog_id,
             'title': blog_title,
-            'visits': visits
+            'visits': visits,
+            'unique_visitors': stats['blog_unique_visitors'].get(blog_id, 0)
         })
     
-    # Sort by visits descending
-    blog_stats.sort(key=lambda x: x['visits'], reverse=True)
+    trending = {name: ranked_posts(entries, limit=6) for name, entries in rankings['trending'].items()}
+    
+    # Up to 7 most recent days with visits in the range (default: the last week);
+    # the charts fetch their own data from visitor_stats_data
+    week_ago = (datetime.now() - timedelta(days=6)).strftime('%Y-%m-%d')
+    days = series(load_visitors(), 'day', date_from or (None if date_to else week_ago), date_to or None)['points']
+    recent_days = [day for day in reversed(days) if day['visits']][:7]
+    max_day_visits = max([day['visits'] for day in recent_days] + [1])
     
     return render_template('visitor_stats.html', 
                          stats=stats, 
                          blog_stats=blog_stats,
-                         blogs=blogs)
+                         trending=trending,
+                         recent_days=recent_days,
+                         max_day_visits=max_day_visits,
+                         granularities=GRANULARITIES,
+                         blogs=blogs,
+                         date_from=date_from,
+                         date_to=date_to)
+
+@app.route('/visitor_stats/data')
+@login_required
+def visitor_stats_data():
+    """Visits per hour/day/week/month for the charts, at most STATS_MAX_POINTS points"""
+    granularity = request.args.get('granularity', 'day')
+    date_from = request.args.get('from') or None
+    date_to = request.args.get('to') or None
+    if granularity not in GRANULARITIES:
+        return jsonify({'error': f'granularity must be one of {", ".join(GRANULARITIES)}'}), 400
+    try:
+        date_from = stats_day(date_from) if date_from else None
+        date_to = stats_day(date_to) if date_to else None
+    except ValueError:
+        return jsonify({'error': 'from and to must be YYYY-MM-DD dates'}), 400
+    
+    max_points = min(request.args.get('max_points', app.config['STATS_MAX_POINTS'], type=int),
+                     app.config['STATS_MAX_POINTS'])
+    return jsonify(series(load_visitors(), granularity, date_from, date_to, max_points))
+
+def is_local_request():
+    """Made from this machine, not forwarded by a proxy running on it"""
+    return (request.remote_addr in ('127.0.0.1', '::1')
+            and not request.headers.get('X-Forwarded-For') and not request.headers.get('X-Real-IP'))
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Request timing histograms, cache hit ratios and write counts for Prometheus"""
+    if 'admin_logged_in' not in session and not (app.config['METRICS_LOCALHOST'] and is_local_request()):
+        return "Forbidden", 403
+    
+    queue = visit_recorder.stats()
+    body = metrics.render(
+        caches={
+            'page': page_cache.stats(),
+            'fragment': fragment_cache.stats(),
+            'markdown': markdown_cache.stats()
+        },
+        gauges={
+            'visit_queue_depth': ('Visits waiting for the background recorder', 'gauge', queue['queued']),
+            'visits_recorded_total': ('Visits handed to the analytics backend', 'counter', queue['recorded']),
+            'visits_dropped_total': ('Visits dropped because the queue was full', 'counter', queue['dropped']),
+            'visits_failed_total': ('Visits the analytics backend failed to record', 'counter', queue['failed'])
+        },
+        worker=os.getpid())
+    response = make_response(body)
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/assets/<path:filename>')
+def asset(filename):
+    """A file from `flask build-assets`; its name changes with its content, so it is cached for good"""
+    if filename == ASSET_MANIFEST_FILE:
+        return "Not found", 404
+    build_dir = os.path.abspath(app.config['ASSET_BUILD_DIR'])
+    served, encoding = filename, None
+    for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if candidate in request.accept_encodings and os.path.isfile(os.path.join(build_dir, filename + suffix)):
+            served, encoding = filename + suffix, candidate
+            break
+
+    response = send_from_directory(build_dir, served, mimetype=mimetypes.guess_type(filename)[0],
+                                   max_age=app.config['ASSET_MAX_AGE'])
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
 
 # New route for groups management
 @app.route('/manage_groups')
@@ -571,7 +1229,7 @@ def manage_groups():
 def create_group():
     groups = load_groups()
     
-    group_id = str(len(groups) + 1)
+    group_id = id_allocator.allocate('groups', groups)
     group_name = request.form['group_name']
     group_description = request.form.get('group_description', '')
     
@@ -582,7 +1240,7 @@ def create_group():
         'hidden': False  # Default to visible
     }
     
-    save_groups(groups)
+    save_group(group_id, groups[group_id])
     flash(f'Group "{group_name}" created successfully', 'success')
     return redirect(url_for('manage_groups'))
 
@@ -592,9 +1250,8 @@ def add_blog_to_group():
     group_id = request.form['group_id']
     blog_id = request.form['blog_id']
     
-    if group_id in groups and blog_id not in groups[group_id]['blogs']:
-        groups[group_id]['blogs'].append(blog_id)
-        save_groups(groups)
+    if group_id in groups and load_group_index().add(groups, group_id, [blog_id]):
+        save_group(group_id, groups[group_id])
     
     return redirect(url_for('manage_groups'))
 
@@ -604,9 +1261,8 @@ def remove_blog_from_group():
     group_id = request.form['group_id']
     blog_id = request.form['blog_id']
     
-    if group_id in groups and blog_id in groups[group_id]['blogs']:
-        groups[group_id]['blogs'].remove(blog_id)
-        save_groups(groups)
+    if group_id in groups and load_group_index().remove(groups, group_id, blog_id):
+        save_group(group_id, groups[group_id])
     
     return redirect(url_for('manage_groups'))
 
@@ -615,8 +1271,7 @@ def delete_group(group_id):
     groups = load_groups()
     
     if group_id in groups:
-        del groups[group_id]
-        save_groups(groups)
+        remove_group(group_id)
     
     return redirect(url_for('manage_groups'))
 
@@ -626,7 +1281,7 @@ def delete_group(group_id):
 def create_blog():
     blogs = load_blogs()
     
-    blog_id = str(len(blogs) + 1)
+    blog_id = id_allocator.allocate('blogs', blogs)
     title = request.form['title']
     content = request.form['content']
     
@@ -636,8 +1291,10 @@ def create_blog():
         'subsections': [],
         'hidden': False  # Default to visible
     }
+    assign_slug(blog_id, blogs[blog_id], request.form.get('slug') or title)
     
-    save_blogs(blogs)
+    save_blog(blog_id, blogs[blog_id])
+    markdown_cache.warm_blog(blogs[blog_id])
     flash(f'Blog "{title}" created successfully', 'success')
     return redirect(url_for('admin'))
 
@@ -658,7 +1315,10 @@ def update_blog(blog_id):
     if blog_id in blogs:
         blogs[blog_id]['title'] = request.form['title']
         blogs[blog_id]['content'] = request.form['content']
-        save_blogs(blogs)
+        if 'slug' in request.form and request.form['slug'] != blogs[blog_id].get('slug', ''):
+            assign_slug(blog_id, blogs[blog_id], request.form['slug'])
+        save_blog(blog_id, blogs[blog_id])
+        markdown_cache.warm_blog(blogs[blog_id])
     
     return redirect(url_for('admin'))
 
@@ -668,8 +1328,7 @@ def delete_blog(blog_id):
     blogs = load_blogs()
     
     if blog_id in blogs:
-        del blogs[blog_id]
-        save_blogs(blogs)
+        remove_blog(blog_id)
     
     return redirect(url_for('admin'))
 
@@ -687,7 +1346,8 @@ def add_subsection(blog_id):
         }
         
         blogs[blog_id]['subsections'].append(subsection)
-        save_blogs(blogs)
+        save_blog(blog_id, blogs[blog_id])
+        markdown_cache.warm_blog(blogs[blog_id])
     
     return redirect(url_for('edit_blog', blog_id=blog_id))
 
@@ -698,7 +1358,8 @@ def edit_subsection(blog_id, subsection_index):
     if blog_id in blogs and 0 <= subsection_index < len(blogs[blog_id]['subsections']):
         blogs[blog_id]['subsections'][subsection_index]['title'] = request.form['subsection_title']
         blogs[blog_id]['subsections'][subsection_index]['content'] = request.form['subsection_content']
-        save_blogs(blogs)
+        save_blog(blog_id, blogs[blog_id])
+        markdown_cache.warm_blog(blogs[blog_id])
     
     return redirect(url_for('edit_blog', blog_id=blog_id))
 
@@ -708,7 +1369,7 @@ def delete_subsection(blog_id, subsection_index):
     
     if blog_id in blogs and 0 <= subsection_index < len(blogs[blog_id]['subsections']):
         blogs[blog_id]['subsections'].pop(subsection_index)
-        save_blogs(blogs)
+        save_blog(blog_id, blogs[blog_id])
     
     return redirect(url_for('edit_blog', blog_id=blog_id))
 
@@ -720,29 +1381,31 @@ def add_multiple_blogs_to_group():
     blog_ids = request.form.getlist('blog_ids')  # Get all blog_ids
     
     if group_id in groups:
-        added_blogs = []
-        already_in_group = []
+        # Only existing blogs; set lookups keep large selections linear
+        existing = [blog_id for blog_id in blog_ids if blog_id in blogs]
+        added_blogs = load_group_index().add(groups, group_id, existing)
+        already_in_group = len(existing) - len(added_blogs)
         
-        for blog_id in blog_ids:
-            # Check if blog exists
-            if blog_id in blogs:
-                if blog_id not in groups[group_id]['blogs']:
-                    groups[group_id]['blogs'].append(blog_id)
-                    added_blogs.append(blog_id)
-                else:
-                    already_in_group.append(blog_id)
-        
-        save_groups(groups)
+        if added_blogs:
+            save_group(group_id, groups[group_id])
         
         # Optional: You can add flash messages here to show results
-        print(f"Added {len(added_blogs)} blogs to group. {len(already_in_group)} were already in the group.")
+        print(f"Added {len(added_blogs)} blogs to group. {already_in_group} were already in the group.")
     
     return redirect(url_for('manage_groups'))
 
 @app.route('/cleanup_blogs')
 def cleanup_blogs():
-    """Clean up malformed blog entries"""
+    """Clean up malformed blog entries and group entries pointing at deleted blogs"""
     blogs = load_blogs()  # This will now clean the data
+    groups = load_groups()
+    index = load_group_index()
+    dangling = [blog_id for blog_id in list(index.blog_groups) if blog_id not in blogs]
+    changed = set()
+    for blog_id in dangling:
+        changed.update(index.remove_blog(groups, blog_id))
+    for group_id in sorted(changed):
+        save_group(group_id, groups[group_id])
     return redirect(url_for('admin'))
 
 # Toggle Blog Visibility (Hide/Show)
@@ -756,7 +1419,7 @@ def toggle_blog_visibility(blog_id):
         # Toggle the hidden status
         current_status = blogs[blog_id].get('hidden', False)
         blogs[blog_id]['hidden'] = not current_status
-        save_blogs(blogs)
+        save_blog(blog_id, blogs[blog_id])
         
         status = "hidden" if not current_status else "visible"
         flash(f'Blog "{blogs[blog_id]["title"]}" is now {status}', 'success')
@@ -774,7 +1437,7 @@ def toggle_group_visibility(group_id):
         # Toggle the hidden status
         current_status = groups[group_id].get('hidden', False)
         groups[group_id]['hidden'] = not current_status
-        save_groups(groups)
+        save_group(group_id, groups[group_id])
         
         status = "hidden" if not current_status else "visible"
         flash(f'Group "{groups[group_id]["name"]}" is now {status}', 'success')
@@ -782,6 +1445,114 @@ def toggle_group_visibility(group_id):
     return redirect(request.referrer or url_for('manage_groups'))
 
 
+@app.cli.command('migrate-to-sqlite')
+def migrate_to_sqlite_command():
+    """Copy blogs, groups, temp users and visits from the JSON files into SQLite"""
+    db = SQLiteDatabase(app.config['SQLITE_DB_FILE'])
+    migrate_json_to_sqlite(db,
+                           blogs=ContentStore(BLOGS_FILE, normalize=clean_blogs).get(),
+                           groups=ContentStore(GROUPS_FILE).get(),
+                           temp_users=ContentStore(TEMP_USERS_FILE).get(),
+                           visitors=ContentStore(VISITORS_FILE).get())
+    print(f'Migrated JSON data into {db.path}')
+
+@app.cli.command('migrate-to-post-files')
+def migrate_to_post_files_command():
+    """Split blogs.json into one file per post plus a manifest in POSTS_DIR"""
+    blogs = ContentStore(BLOGS_FILE, normalize=clean_blogs).get()
+    migrate_json_to_post_files(blogs, app.config['POSTS_DIR'])
+    print(f"Migrated {len(blogs)} post(s) into {app.config['POSTS_DIR']}")
+
+@app.cli.command('export-blogs')
+@click.argument('path', default=BLOGS_FILE)
+def export_blogs_command(path):
+    """Write all posts from the configured storage to a blogs.json-style file"""
+    blogs = {blog_id: dict(blog) for blog_id, blog in load_blogs().items()}
+    JSONFileSource(path).write(blogs)
+    print(f'Exported {len(blogs)} post(s) to {path}')
+
+def static_export_pages():
+    """(url, fingerprint) of every page an anonymous reader can see.
+
+    Each fingerprint covers exactly what the page shows: a post page only
+    its own post, the index pages the visible groups and ungrouped posts,
+    the JSON that fills in the sidebar the posts of a group or the
+    subsections of a post.
+    """
+    blogs = {blog_id: blog for blog_id, blog in load_blogs().items() if not blog.get('hidden', False)}
+    groups = {group_id: group for group_id, group in load_groups().items() if not group.get('hidden', False)}
+    all_blogs = load_blogs()
+    pages = []
+    
+    ungrouped_ids = ungrouped_blog_ids(blogs, groups)
+    navigation = fingerprint(
+        [(group_id, group.get('name'), bool(group.get('blogs'))) for group_id, group in groups.items()],
+        [(blog_id, blogs[blog_id]['title'], blogs[blog_id].get('slug'), bool(subsection_titles(blogs[blog_id])))
+         for blog_id in ungrouped_ids])
+    page_count = max(1, -(-len(ungrouped_ids) // app.config['INDEX_PAGE_SIZE']))
+    pages.append((url_for('index'), navigation))
+    pages.extend((url_for('index', page=page), navigation) for page in range(1, page_count + 1))
+    
+    for group_id, group in groups.items():
+        if group.get('blogs'):
+            members = [(blog_id, blog.get('title'), blog.get('slug'), blog.get('hidden', False),
+                        len(subsection_titles(blog)))
+                       for blog_id, blog in ((blog_id, all_blogs.get(blog_id)) for blog_id in group['blogs'])
+                       if blog]
+            pages.append((url_for('group_blogs_api', group_id=group_id), fingerprint(members)))
+    
+    for blog_id, blog in blogs.items():
+        if not blog.get('title'):
+            continue
+        pages.append((url_for('blog_detail', blog_id=blog_id),
+                      fingerprint({key: value for key, value in blog.items() if key != 'updated_at'})))
+        if subsection_titles(blog):
+            pages.append((url_for('blog_subsections_api', blog_id=blog_id),
+                          fingerprint(subsection_titles(blog), blog.get('slug'))))
+    return pages
+
+@app.cli.command('export-static')
+@click.argument('out_dir', default='static_export')
+@click.option('--jobs', type=int, default=None, help='Rendering processes (default: one per CPU)')
+@click.option('--force', is_flag=True, help='Render every page, even unchanged ones')
+def export_static_command(out_dir, jobs, force):
+    """Write the public pages, their sidebar JSON and static files to OUT_DIR for nginx"""
+    with app.test_request_context():
+        pages = static_export_pages()
+    # Any change to templates, assets or code renders every page again
+    site = fingerprint(tree_fingerprint(os.path.join(app.root_path, app.template_folder),
+                                        app.static_folder, os.path.abspath(__file__)),
+                       app.config['INDEX_PAGE_SIZE'], asset_manifest.get())
+    trees = {}
+    if asset_manifest.get():
+        with app.test_request_context():
+            trees[url_for('asset', filename='').strip('/')] = app.config['ASSET_BUILD_DIR']
+    counts = StaticExporter(app, out_dir, jobs).export(pages, site, force, trees)
+    print(f"Exported to {out_dir}: {counts['rendered']} page(s) rendered, {counts['unchanged']} unchanged, "
+          f"{counts['removed']} removed, {counts['failed']} failed, "
+          f"{counts['static_files_copied']} static file(s) copied")
+
+@app.cli.command('build-assets')
+@click.option('--clean', is_flag=True, help='Remove earlier builds first')
+def build_assets_command(clean):
+    """Write fingerprinted, precompressed static files and WebP post images"""
+    images = post_image_paths(load_blogs().values())
+    counts = build_assets(app.static_folder, app.config['ASSET_BUILD_DIR'], images, clean=clean)
+    print(f"Built {counts['files']} asset(s) in {app.config['ASSET_BUILD_DIR']}: {counts['written']} new, "
+          f"{counts['compressed']} compressed variant(s), {counts['webp']} WebP image(s) written")
+    if images and not post_images_supported():
+        print("Install Pillow to make WebP copies of post images")
+    if not brotli_supported():
+        print("Install brotli to also write .br variants")
+
+@app.cli.command('compact-visits')
+def compact_visits_command():
+    """Roll finished visit logs into visitors.json (eventlog backend)"""
+    if not hasattr(visit_backend, 'compact'):
+        print('The configured visitor backend does not keep an event log')
+        return
+    print(f'Compacted {visit_backend.compact()} visit log(s)')
+
 # ============================================
 # TEMP USER ROUTES
 # ============================================
@@ -837,6 +1608,7 @@ def manage_temp_users():
 
 @app.route('/create_temp_user', methods=['POST'])
 @login_required
+@temp_users_locked
 def create_temp_user():
     """Create a new temporary user"""
     temp_users = load_temp_users()
@@ -876,6 +1648,7 @@ def create_temp_user():
 
 @app.route('/extend_temp_user/<username>', methods=['POST'])
 @login_required
+@temp_users_locked
 def extend_temp_user(username):
     """Extend temporary user expiration"""
     temp_users = load_temp_users()
@@ -905,6 +1678,7 @@ def extend_temp_user(username):
 
 @app.route('/toggle_temp_user_permission/<username>')
 @login_required
+@temp_users_locked
 def toggle_temp_user_permission(username):
     """Toggle temp user permission to see all hidden content"""
     temp_users = load_temp_users()
@@ -924,6 +1698,7 @@ def toggle_temp_user_permission(username):
 
 @app.route('/delete_temp_user/<username>')
 @login_required
+@temp_users_locked
 def delete_temp_user(username):
     """Delete a temporary user"""
     temp_users = load_temp_users()
@@ -937,6 +1712,7 @@ def delete_temp_user(username):
 
 @app.route('/regenerate_temp_code/<username>')
 @login_required
+@temp_users_locked
 def regenerate_temp_code(username):
     """Regenerate access code for temp user"""
     temp_users = load_temp_users()
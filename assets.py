@@ -0,0 +1,180 @@
+import gzip
+import hashlib
+import html
+import os
+import re
+import shutil
+
+from persistence import write_atomic, write_json_atomic
+
+try:
+    import brotli
+except ImportError:  # Only gzip variants are written
+    brotli = None
+
+try:
+    from PIL import Image
+except ImportError:  # No WebP derivatives
+    Image = None
+
+MANIFEST_FILE = 'manifest.json'
+
+# Hex digits of the content hash kept in built file names
+HASH_LENGTH = 10
+
+# Text assets that get .gz (and .br) variants next to them
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.txt', '.map', '.xml', '.html'}
+
+# WebP widths made for images used in posts (never wider than the original)
+IMAGE_WIDTHS = (480, 960, 1600)
+WEBP_QUALITY = 80
+
+# How wide images are shown in a post, for the browser to pick a WebP width
+IMAGE_SIZES = '(max-width: 960px) 100vw, 960px'
+
+# /static/ image URLs in post Markdown or HTML
+POST_IMAGE_RE = re.compile(r'/static/([^"\'\s()<>]+\.(?:png|jpe?g|gif|webp))', re.IGNORECASE)
+IMG_TAG_RE = re.compile(r'<img\b[^>]*>', re.IGNORECASE)
+IMG_SRC_RE = re.compile(r'\bsrc=(["\'])/static/([^"\']+)\1', re.IGNORECASE)
+
+
+def brotli_supported():
+    return brotli is not None
+
+
+def post_images_supported():
+    return Image is not None
+
+
+def hashed_name(relative, digest, suffix=''):
+    """css/style.css -> css/style.<hash>.css (or css/style.<hash><suffix> when given)"""
+    stem, ext = os.path.splitext(relative)
+    return f'{stem}.{digest[:HASH_LENGTH]}{suffix or ext}'
+
+
+def post_image_paths(blogs):
+    """static/-relative paths of the images the posts link to"""
+    paths = set()
+    for blog in blogs:
+        texts = [blog.get('content', '')] + [s.get('content', '') for s in blog.get('subsections', [])]
+        for text in texts:
+            paths.update(POST_IMAGE_RE.findall(text))
+    return sorted(paths)
+
+
+def _write_new(path, data):
+    """Write a built file unless it already exists (names are content hashes)"""
+    if os.path.exists(path):
+        return False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    write_atomic(path, data)
+    return True
+
+
+def _compressed_variants(path, data):
+    written = 0
+    variants = [('.gz', lambda: gzip.compress(data, 9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', lambda: brotli.compress(data, quality=11)))
+    for suffix, compress in variants:
+        if os.path.exists(path + suffix):
+            continue
+        compressed = compress()
+        # Tiny files can grow; serve those as they are
+        if len(compressed) < len(data):
+            write_atomic(path + suffix, compressed)
+            written += 1
+    return written
+
+
+def _webp_derivatives(source, build_dir, relative, digest, widths):
+    """([[width, built path], ...] of WebP copies of an image, narrowest first; number written)"""
+    built, written = [], 0
+    with Image.open(source) as image:
+        width, height = image.size
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+        for target in sorted({w for w in widths if w < width} | {width}):
+            name = hashed_name(relative, digest, f'.w{target}.webp')
+            path = os.path.join(build_dir, name)
+            if not os.path.exists(path):
+                resized = image if target == width else image.resize(
+                    (target, max(1, round(height * target / width))), Image.LANCZOS)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f'{path}.tmp'
+                resized.save(tmp_path, 'WEBP', quality=WEBP_QUALITY, method=6)
+                os.replace(tmp_path, path)
+                written += 1
+            built.append([target, name])
+    return built, written
+
+
+def build_assets(source_dir, build_dir, images=(), widths=IMAGE_WIDTHS, clean=False):
+    """Write content-hashed copies of every file under source_dir to build_dir.
+
+    Text assets also get gzip (and, with the brotli package, brotli)
+    variants for servers that send precompressed files; images listed in
+    images (static/-relative paths) get WebP copies in several widths when
+    Pillow is installed. Built files are never overwritten, so pages still
+    linking to an older build keep working; clean removes earlier builds
+    first. The manifest mapping original to built names is written last.
+    """
+    if clean and os.path.isdir(build_dir):
+        shutil.rmtree(build_dir)
+    os.makedirs(build_dir, exist_ok=True)
+
+    manifest = {'files': {}, 'images': {}}
+    counts = {'files': 0, 'written': 0, 'compressed': 0, 'webp': 0}
+    wanted_images = set(images)
+    for directory, _, names in os.walk(source_dir):
+        for name in sorted(names):
+            source = os.path.join(directory, name)
+            relative = os.path.relpath(source, source_dir).replace(os.sep, '/')
+            with open(source, 'rb') as f:
+                data = f.read()
+            digest = hashlib.sha256(data).hexdigest()
+            built = hashed_name(relative, digest)
+            path = os.path.join(build_dir, built)
+            manifest['files'][relative] = built
+            counts['files'] += 1
+            counts['written'] += _write_new(path, data)
+            if os.path.splitext(name)[1].lower() in COMPRESSIBLE:
+                counts['compressed'] += _compressed_variants(path, data)
+            if relative in wanted_images and Image is not None:
+                try:
+                    manifest['images'][relative], written = _webp_derivatives(
+                        source, build_dir, relative, digest, widths)
+                    counts['webp'] += written
+                except OSError as e:
+                    print(f"Error making WebP copies of {relative}: {e}")
+
+    write_json_atomic(os.path.join(build_dir, MANIFEST_FILE), manifest)
+    return counts
+
+
+def rewrite_images(page_html, manifest, asset_url):
+    """Point /static/ images in rendered post HTML at their built copies.
+
+    Images with WebP derivatives are wrapped in a <picture> offering them
+    by width, with the hashed original as the fallback; all get lazy
+    loading. asset_url(built_name) returns the URL of a built file.
+    """
+    files = manifest.get('files', {})
+    derivatives = manifest.get('images', {})
+
+    def replace(match):
+        tag = match.group(0)
+        src = IMG_SRC_RE.search(tag)
+        if not src or src.group(2) not in files:
+            return tag
+        relative = src.group(2)
+        tag = tag[:src.start()] + f'src="{html.escape(asset_url(files[relative]))}"' + tag[src.end():]
+        if 'loading=' not in tag.lower():
+            tag = tag[:4] + ' loading="lazy" decoding="async"' + tag[4:]
+        if relative not in derivatives:
+            return tag
+        srcset = ', '.join(f'{html.escape(asset_url(name))} {width}w' for width, name in derivatives[relative])
+        return (f'<picture><source type="image/webp" srcset="{srcset}" sizes="{IMAGE_SIZES}">'
+                f'{tag}</picture>')
+
+    return IMG_TAG_RE.sub(replace, page_html)
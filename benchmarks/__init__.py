@@ -0,0 +1,8 @@
+"""Latency, throughput and memory benchmarks for the blog routes.
+
+    python -m benchmarks.corpus --posts 1000 --out /tmp/corpus
+    python -m benchmarks.run --posts 10,100,1000 --mode client
+    python -m benchmarks.run --posts 1000 --mode gunicorn --save-baseline
+
+See benchmarks/run.py for every option.
+"""
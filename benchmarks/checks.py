@@ -0,0 +1,236 @@
+"""Regression checks for caching, compression and search speed on a generated corpus.
+
+    python -m benchmarks.checks
+    python -m benchmarks.checks --posts 5000 --keep
+
+The app is imported in this process from a fixture directory, like the
+client benchmark driver. Checks run in order against the same app and
+may change its content; each prints OK or what went wrong, and the run
+exits 1 if any failed.
+"""
+import argparse
+import atexit
+import gzip
+import json
+import os
+import random
+import shutil
+import struct
+import sys
+import tempfile
+import time
+import zlib
+
+from benchmarks.corpus import write_corpus
+from compression import GzipTemplate, crc32_combine, crc32_shift
+from benchmarks.drivers import ClientDriver, login
+from benchmarks.scenarios import SEARCH_TERMS
+
+BASE_URL = 'https://localhost'
+
+# Slowest a search index query may take (median of SEARCH_REPEAT runs per term)
+SEARCH_TARGET_MS = 10.0
+SEARCH_REPEAT = 15
+EXTRA_SEARCH_TERMS = ('component render state', 'fetch', 'import')
+
+
+def _get(driver, path, headers=None):
+    return driver.client.get(path, headers=headers or {}, base_url=BASE_URL)
+
+
+def _load(fixture_dir, name):
+    with open(os.path.join(fixture_dir, name)) as f:
+        return json.load(f)
+
+
+def _visible_blog_ids(fixture_dir):
+    blogs = _load(fixture_dir, 'blogs.json')
+    return sorted((blog_id for blog_id, blog in blogs.items() if not blog.get('hidden')), key=int)
+
+
+def check_asset_build_revalidates(driver, fixture_dir):
+    """A post page cached before `flask build-assets` is sent again after it"""
+    path = f'/blog/{_visible_blog_ids(fixture_dir)[0]}'
+    response = _get(driver, path)
+    etag, last_modified = response.headers['ETag'], response.headers.get('Last-Modified')
+    status = _get(driver, path, {'If-None-Match': etag}).status_code
+    if status != 304:
+        return f"{path} answered {status} to its own ETag before the build"
+
+    # Last-Modified has one second resolution
+    time.sleep(1.1)
+    result = driver.app.test_cli_runner().invoke(args=['build-assets'])
+    if result.exit_code != 0:
+        return f"build-assets failed: {result.output}"
+    for name, value in (('If-None-Match', etag), ('If-Modified-Since', last_modified)):
+        if value is None:
+            continue
+        status = _get(driver, path, {name: value}).status_code
+        if status != 200:
+            return f"{path} answered {status} to {name} from before the build"
+    return None
+
+
+def check_delete_moves_index_last_modified(driver, fixture_dir):
+    """Deleting a post listed on the index makes If-Modified-Since from before it miss"""
+    grouped = {blog_id for group in _load(fixture_dir, 'groups.json').values() for blog_id in group.get('blogs', [])}
+    ungrouped = [blog_id for blog_id in _visible_blog_ids(fixture_dir) if blog_id not in grouped]
+    if not ungrouped:
+        return "the corpus has no ungrouped posts"
+    last_modified = _get(driver, '/').headers.get('Last-Modified')
+    if last_modified is None:
+        return "/ sent no Last-Modified"
+
+    time.sleep(1.1)
+    cookie = login(driver)
+    status = driver.client.get(f'/delete_blog/{ungrouped[0]}', headers={'Cookie': cookie},
+                               base_url=BASE_URL).status_code
+    if status != 302:
+        return f"deleting post {ungrouped[0]} answered {status}"
+    status = _get(driver, '/', {'If-Modified-Since': last_modified}).status_code
+    if status != 200:
+        return f"/ answered {status} to If-Modified-Since from before the delete"
+    return None
+
+
+def check_edit_keeps_other_workers_changes(driver, fixture_dir):
+    """A post cached before another worker edited it is not served again after this worker saves"""
+    blog_app = driver.app_module
+    stale, saved = _visible_blog_ids(fixture_dir)[-2:]
+    path = f'/blog/{stale}'
+    _get(driver, path)
+
+    # Another worker's edit, through its own store on the same file
+    other = blog_app.ContentStore(os.path.join(fixture_dir, 'blogs.json'))
+    blog = dict(other.get()[stale], title='Edited by another worker')
+    other.save_item(stale, blog)
+    with driver.app.test_request_context():
+        blog_app.save_blog(saved, dict(blog_app.load_blogs()[saved]))
+
+    if 'Edited by another worker' not in _get(driver, path).get_data(as_text=True):
+        return f"{path} still shows the post from before the other worker's edit"
+    return None
+
+
+def check_stats_date_range(driver, fixture_dir):
+    """The visitor stats page and its chart data read 2026-9-1 as 2026-09-01 and turn away non-dates"""
+    cookie = login(driver)
+    days = sorted(_load(fixture_dir, 'visitors.json')['daily_visits'])
+    if not days:
+        return "the corpus has no visits"
+    year, month, day = (int(part) for part in days[len(days) // 2].split('-'))
+    padded, loose = f'{year}-{month:02d}-{day:02d}', f'{year}-{month}-{day}'
+
+    for path in ('/visitor_stats', '/visitor_stats/data'):
+        responses = [_get(driver, f'{path}?from={day}', {'Cookie': cookie}) for day in (padded, loose)]
+        statuses = [response.status_code for response in responses]
+        if statuses != [200, 200]:
+            return f"{path} answered {statuses} to from={padded} and from={loose}"
+        if responses[0].get_data() != responses[1].get_data():
+            return f"{path} shows other numbers for from={loose} than for from={padded}"
+    for path, want in (('/visitor_stats?from=yesterday', 200), ('/visitor_stats/data?to=2025-13-01', 400)):
+        status = _get(driver, path, {'Cookie': cookie}).status_code
+        if status != want:
+            return f"{path} answered {status}, not {want}"
+    return None
+
+
+def check_gzip_template(driver, fixture_dir):
+    """Spliced gzip bodies and combined checksums match gzip and zlib, for empty and large parts"""
+    rng = random.Random(1)
+    noise = lambda size: bytes(rng.getrandbits(8) for _ in range(size))
+    text = lambda size: (b'<p>Cached page text</p>\n' * (size // 24 + 1))[:size]
+    samples = [b'', b'a', noise(1), noise(1000), text(70000), noise(70000), text(3 * 1024 * 1024)]
+
+    for first in samples:
+        for second in samples:
+            combined = crc32_combine(zlib.crc32(first), zlib.crc32(second), crc32_shift(len(second)))
+            if combined != zlib.crc32(first + second):
+                return f"crc32_combine is wrong for parts of {len(first)} and {len(second)} bytes"
+
+    values = [b'', b'1', noise(300), text(65535)]
+    layouts = [[b''], [samples[6]], [b'', b''], [b'', samples[5], b''],
+               [samples[4], samples[6], b'', samples[3], samples[2]]]
+    for parts in layouts:
+        template = GzipTemplate(parts)
+        for value in values:
+            filled = [value] * (len(parts) - 1)
+            expected = parts[0] + b''.join(v + part for v, part in zip(filled, parts[1:]))
+            body = template.render(filled)
+            try:
+                data = gzip.decompress(body)
+            except (OSError, EOFError, zlib.error) as e:
+                return f"{len(parts)} parts with {len(value)} byte values do not decompress: {e}"
+            crc, size = struct.unpack('<II', body[-8:])
+            if data != expected or crc != zlib.crc32(expected) or size != len(expected) & 0xffffffff:
+                return f"{len(parts)} parts with {len(value)} byte values do not give the joined body"
+    return None
+
+
+def check_search_latency(driver, fixture_dir):
+    """Every benchmark search term is answered within SEARCH_TARGET_MS by the index"""
+    blog_app = driver.app_module
+    with driver.app.test_request_context():
+        blogs = blog_app.load_blogs()
+    visible = lambda blog: not blog.get('hidden', False)
+    # The first query indexes every post
+    blog_app.search_index.search('warm up', blogs, visible=visible)
+
+    slow = []
+    for term in SEARCH_TERMS + EXTRA_SEARCH_TERMS:
+        timings = []
+        for _ in range(SEARCH_REPEAT):
+            started = time.perf_counter()
+            blog_app.search_index.search(term, blogs, visible=visible)
+            timings.append((time.perf_counter() - started) * 1000)
+        median = sorted(timings)[len(timings) // 2]
+        if median > SEARCH_TARGET_MS:
+            slow.append(f"'{term}' {median:.1f} ms")
+    if slow:
+        return f"slower than {SEARCH_TARGET_MS:.0f} ms on {len(blogs)} posts: {', '.join(slow)}"
+    return None
+
+
+CHECKS = [
+    check_asset_build_revalidates,
+    check_delete_moves_index_last_modified,
+    check_edit_keeps_other_workers_changes,
+    check_stats_date_range,
+    check_gzip_template,
+    check_search_latency,
+]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--posts', type=int, default=2000, help='Corpus size (default: 2000)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--keep', action='store_true', help='Keep the fixture directory')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    fixture_dir = tempfile.mkdtemp(prefix='blog-checks-')
+    if args.keep:
+        print(f"Fixture kept in {fixture_dir}")
+    else:
+        # Registered before the app is imported, so it runs after the app's own
+        # exit handlers have saved their caches into the fixture
+        atexit.register(shutil.rmtree, fixture_dir, ignore_errors=True)
+
+    write_corpus(fixture_dir, args.posts, visits_per_post=2, seed=args.seed)
+    driver = ClientDriver(fixture_dir, {})
+    failed = False
+    try:
+        for check in CHECKS:
+            error = check(driver, fixture_dir)
+            print(f"{'FAIL' if error else 'OK':<5}{check.__name__}" + (f": {error}" if error else ''))
+            failed = failed or bool(error)
+    finally:
+        driver.close()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
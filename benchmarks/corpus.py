@@ -0,0 +1,212 @@
+"""Synthetic blogs.json / groups.json / visitors.json fixtures at any scale.
+
+Posts look like the real ones: a short intro and a handful of subsections
+that are mostly fenced code (jsx, html/css, python, bash) with some prose,
+headings and lists in between, a few KB each. Everything is derived from
+a seeded random generator, so the same arguments always write the same
+files.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import time
+from datetime import date, timedelta
+
+from werkzeug.security import generate_password_hash
+
+from visit_tracking import VisitCounts, default_visitors
+
+# Credentials written into every fixture directory for the admin routes
+ADMIN_USERNAME = 'admin'
+ADMIN_PASSWORD = 'benchmark'
+
+WORDS = ('state', 'render', 'component', 'effect', 'router', 'query', 'index', 'cache',
+         'form', 'input', 'theme', 'layout', 'sidebar', 'token', 'user', 'image', 'model',
+         'array', 'object', 'promise', 'fetch', 'server', 'client', 'database', 'schema',
+         'filter', 'search', 'event', 'handler', 'context', 'provider', 'hook', 'style')
+
+TOPICS = ('React', 'Firebase', 'Express', 'MongoDB', 'OpenCV', 'Flask', 'CSS', 'Regex',
+          'Node.js', 'Git', 'Python', 'Tailwind', 'Docker', 'SQL', 'TypeScript')
+
+
+def _words(rng, count):
+    return ' '.join(rng.choice(WORDS) for _ in range(count))
+
+
+def _name(rng):
+    return rng.choice(WORDS) + rng.choice(WORDS).capitalize()
+
+
+def _jsx(rng):
+    name = _name(rng).capitalize()
+    state = _name(rng)
+    lines = ["import { useState, useEffect } from 'react';", '',
+             f'export default function {name}() {{',
+             f'  const [{state}, set{state[0].upper()}{state[1:]}] = useState([]);', '',
+             '  useEffect(() => {',
+             f"    fetch('/api/{rng.choice(WORDS)}')",
+             '      .then((res) => res.json())',
+             f'      .then((data) => set{state[0].upper()}{state[1:]}(data));',
+             '  }, []);', '',
+             '  return (',
+             f'    <div className="{rng.choice(WORDS)}-{rng.choice(WORDS)}">']
+    for _ in range(rng.randint(3, 12)):
+        lines.append(f'      <p className="{rng.choice(WORDS)}">{{{state}.length}} {_words(rng, 3)}</p>')
+    lines += ['    </div>', '  );', '}']
+    return 'jsx', lines
+
+
+def _css(rng):
+    lines = []
+    for _ in range(rng.randint(4, 14)):
+        lines.append(f'.{rng.choice(WORDS)}-{rng.choice(WORDS)} {{')
+        for _ in range(rng.randint(2, 6)):
+            prop = rng.choice(('margin', 'padding', 'color', 'background', 'border-radius',
+                               'font-size', 'gap', 'display'))
+            lines.append(f'  {prop}: {rng.randint(0, 32)}px;')
+        lines += ['}', '']
+    return 'css', lines
+
+
+def _python(rng):
+    func = '_'.join(rng.sample(WORDS, 2))
+    lines = ['import cv2', 'import numpy as np', '', f'def {func}(path, size={rng.randint(64, 512)}):',
+             '    image = cv2.imread(path)',
+             '    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)']
+    for _ in range(rng.randint(3, 15)):
+        lines.append(f'    {rng.choice(WORDS)} = np.{rng.choice(("mean", "max", "clip", "sum"))}'
+                     f'(gray, axis={rng.randint(0, 1)})  # {_words(rng, 3)}')
+    lines += ['    return cv2.resize(gray, (size, size))']
+    return 'python', lines
+
+
+def _bash(rng):
+    lines = []
+    for _ in range(rng.randint(2, 6)):
+        lines.append(rng.choice(('npm install ', 'pip install ', 'git add ', 'npx create ')) +
+                     '-'.join(rng.sample(WORDS, 2)))
+    return 'bash', lines
+
+
+SNIPPETS = (_jsx, _jsx, _css, _python, _bash)
+
+
+def make_markdown(rng, blocks):
+    """Prose, headings, lists and fenced code blocks"""
+    parts = []
+    for _ in range(blocks):
+        choice = rng.random()
+        if choice < 0.15:
+            parts.append(f'## {_words(rng, 4).capitalize()}')
+        elif choice < 0.3:
+            parts.append('\n'.join(f'{n}. **{rng.choice(WORDS)}**: {_words(rng, 8)}'
+                                   for n in range(1, rng.randint(3, 6))))
+        elif choice < 0.45:
+            parts.append(f'{_words(rng, rng.randint(15, 60)).capitalize()}. '
+                         f'Use `{_name(rng)}()` with [{rng.choice(WORDS)}]'
+                         f'(https://example.com/{rng.choice(WORDS)}).')
+        else:
+            language, lines = rng.choice(SNIPPETS)(rng)
+            parts.append(f'```{language}\n' + '\n'.join(lines) + '\n```')
+    # The real posts were written in a browser textarea
+    return '\n\n'.join(parts).replace('\n', '\r\n')
+
+
+def make_blogs(rng, posts, max_subsections=6, hidden_ratio=0.05):
+    blogs = {}
+    for number in range(1, posts + 1):
+        topic = rng.choice(TOPICS)
+        blogs[str(number)] = {
+            'title': f'{topic} {_words(rng, rng.randint(1, 4))} #{number}',
+            'content': make_markdown(rng, rng.randint(1, 4)),
+            'subsections': [
+                {'title': f'{n + 1}. {_words(rng, rng.randint(2, 6)).capitalize()}',
+                 'content': make_markdown(rng, rng.randint(2, 10))}
+                for n in range(rng.randint(0, max_subsections))
+            ],
+            'hidden': rng.random() < hidden_ratio
+        }
+    return blogs
+
+
+def make_groups(rng, blog_ids, group_size=8, grouped_ratio=0.6):
+    """About grouped_ratio of the posts, split into groups of ~group_size"""
+    ids = list(blog_ids)
+    rng.shuffle(ids)
+    grouped = ids[:int(len(ids) * grouped_ratio)]
+    groups = {}
+    for start in range(0, len(grouped), group_size):
+        group_id = str(len(groups) + 1)
+        groups[group_id] = {
+            'name': f'{rng.choice(TOPICS)} {_words(rng, 2)}',
+            'description': _words(rng, rng.randint(0, 8)),
+            'blogs': grouped[start:start + group_size],
+            'hidden': False
+        }
+    return groups
+
+
+def make_visitors(rng, blog_ids, visits, days=90, clients=5000, now=None):
+    """visitors.json with visits spread over the last days, skewed towards a few posts"""
+    now = time.time() if now is None else now
+    ids = list(blog_ids)
+    # Zipf-like popularity so the rankings have a head and a long tail
+    weights = [1.0 / (rank + 1) for rank in range(len(ids))]
+    picks = rng.choices(ids, weights, k=visits) if ids else [None] * visits
+    # Visits are recorded by hashed client address, as track_visit does
+    hashes = [hashlib.sha256(f'client-{n}'.encode()).hexdigest() for n in range(clients)]
+    counts = VisitCounts()
+    today = date.fromtimestamp(now)
+    for blog_id in picks:
+        age = rng.random() * days * 86400
+        timestamp = now - age
+        day = (today - timedelta(days=int(age // 86400))).isoformat()
+        # Some visits are to the index page rather than a post
+        counts.add(rng.choice(hashes), day, blog_id if rng.random() < 0.8 else None, timestamp)
+    visitors = default_visitors()
+    counts.merge_into(visitors)
+    return visitors
+
+
+def write_corpus(out_dir, posts, visits_per_post=20, days=90, seed=1):
+    """Write blogs.json, groups.json, visitors.json and admin credentials to out_dir"""
+    rng = random.Random(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    blogs = make_blogs(rng, posts)
+    files = {
+        'blogs.json': blogs,
+        'groups.json': make_groups(rng, blogs),
+        'visitors.json': make_visitors(rng, blogs, posts * visits_per_post, days),
+        'temp_users.json': {},
+        'admin_credentials.json': {
+            'username': ADMIN_USERNAME,
+            'password': generate_password_hash(ADMIN_PASSWORD, method='pbkdf2:sha256'),
+            'email': 'admin@example.com',
+            'failed_attempts': 0,
+            'locked_until': None
+        }
+    }
+    for name, data in files.items():
+        with open(os.path.join(out_dir, name), 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=4)
+    return blogs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--posts', type=int, default=100)
+    parser.add_argument('--visits-per-post', type=int, default=20)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--out', required=True, help='Directory to write the JSON files to')
+    args = parser.parse_args(argv)
+
+    blogs = write_corpus(args.out, args.posts, args.visits_per_post, args.days, args.seed)
+    size = os.path.getsize(os.path.join(args.out, 'blogs.json'))
+    print(f"Wrote {len(blogs)} posts ({size / 1024:.0f} KB of blogs.json) to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
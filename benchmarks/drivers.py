@@ -0,0 +1,236 @@
+"""Run the scenarios against the app and time every request.
+
+ClientDriver imports app.py in this process and goes through Flask's test
+client, so it measures the app alone; ServerDriver starts gunicorn on a
+local port and sends real HTTP requests, so it also covers the WSGI server,
+worker processes and sockets. Either way the app runs inside a fixture
+directory written by benchmarks.corpus, since it keeps its data files in
+the working directory.
+
+Each measurement runs in its own process (python -m benchmarks.drivers),
+which is what makes peak RSS meaningful per corpus size.
+"""
+import http.client
+import json
+import os
+import re
+import resource
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from benchmarks.report import summarize
+from benchmarks.scenarios import LOGIN_FORM, Context, select
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SESSION_COOKIE_RE = re.compile(r'(session=[^;]*)')
+
+# Fixed so every gunicorn worker accepts the session cookie of the others
+SECRET_KEY = 'benchmark-secret-key'
+
+
+def _session_cookie(set_cookie_headers):
+    for header in set_cookie_headers:
+        match = SESSION_COOKIE_RE.search(header)
+        if match:
+            return match.group(1)
+    return None
+
+
+def _own_peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class ClientDriver:
+    """Requests through Flask's test client, with the app imported in-process"""
+
+    name = 'client'
+
+    def __init__(self, fixture_dir, env):
+        os.environ.update(env)
+        os.chdir(fixture_dir)
+        sys.path.insert(0, REPO_ROOT)
+        import app as blog_app
+        self.app_module = blog_app
+        self.app = blog_app.app
+        # Cookies are sent by hand: the session cookie is marked Secure, and
+        # flashes from mutations should not pile up in it between requests
+        self.client = self.app.test_client(use_cookies=False)
+
+    def request(self, method, path, data=None, cookie=None):
+        headers = {'Cookie': cookie} if cookie else {}
+        response = self.client.open(path, method=method, data=data, headers=headers,
+                                    base_url='https://localhost')
+        response.close()
+        return response.status_code, response.headers.getlist('Set-Cookie')
+
+    def peak_rss_mb(self):
+        return _own_peak_rss_mb()
+
+    def close(self):
+        # Let queued visits reach the backend before the process exits
+        self.app_module.visit_recorder.wait()
+
+
+class ServerDriver:
+    """Real HTTP requests to a gunicorn server started on a free local port"""
+
+    name = 'gunicorn'
+
+    def __init__(self, fixture_dir, env, workers=2, startup_timeout=30):
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            self.port = probe.getsockname()[1]
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--workers', str(workers),
+             '--bind', f'127.0.0.1:{self.port}', '--chdir', fixture_dir,
+             '--pythonpath', REPO_ROOT, '--log-level', 'warning', 'app:app'],
+            env=dict(os.environ, **env))
+        self._wait_until_ready(startup_timeout)
+
+    def _wait_until_ready(self, timeout):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"gunicorn exited with status {self.process.returncode}")
+            try:
+                self.request('GET', '/login')
+                return
+            except OSError:
+                time.sleep(0.1)
+        self.close()
+        raise RuntimeError(f"gunicorn did not start within {timeout} seconds")
+
+    def request(self, method, path, data=None, cookie=None):
+        connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+        try:
+            headers = {'Cookie': cookie} if cookie else {}
+            body = None
+            if data is not None:
+                body = urlencode(data)
+                headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            return response.status, response.headers.get_all('Set-Cookie') or []
+        finally:
+            connection.close()
+
+    def _pids(self):
+        pids = [self.process.pid]
+        try:
+            with open(f'/proc/{self.process.pid}/task/{self.process.pid}/children') as f:
+                pids += [int(pid) for pid in f.read().split()]
+        except OSError:
+            pass
+        return pids
+
+    def peak_rss_mb(self):
+        """Summed peak RSS of the gunicorn master and its workers (Linux only)"""
+        total = 0
+        for pid in self._pids():
+            try:
+                with open(f'/proc/{pid}/status') as f:
+                    for line in f:
+                        if line.startswith('VmHWM:'):
+                            total += int(line.split()[1])
+            except OSError:
+                return None
+        return total / 1024 if total else None
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(30)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+def login(driver):
+    """Session cookie of a logged in admin"""
+    status, cookies = driver.request('POST', '/login', LOGIN_FORM)
+    cookie = _session_cookie(cookies)
+    if status != 302 or cookie is None:
+        raise RuntimeError(f"Admin login failed with status {status}")
+    return cookie
+
+
+def measure(driver, scenarios, ctx, iterations, warmup=5, concurrency=1):
+    """{scenario name: summary}, running each scenario warmup + iterations times"""
+    cookie = login(driver)
+    results = {}
+    for scenario in scenarios:
+        lock = threading.Lock()
+        timings = []
+        errors = []
+
+        def run(i, record=True):
+            path, data = scenario.build(i, ctx)
+            started = time.perf_counter()
+            try:
+                status = driver.request(scenario.method, path, data, cookie if scenario.admin else None)[0]
+            except Exception as e:
+                status = f'{type(e).__name__}: {e}'
+            elapsed = time.perf_counter() - started
+            if status == scenario.expect and scenario.after is not None:
+                scenario.after(i, ctx)
+            if record:
+                with lock:
+                    timings.append(elapsed)
+                    if status != scenario.expect:
+                        errors.append(f'{scenario.method} {path} -> {status}')
+
+        for i in range(warmup):
+            run(i, record=False)
+        started = time.perf_counter()
+        if concurrency > 1:
+            with ThreadPoolExecutor(concurrency) as pool:
+                list(pool.map(run, range(warmup, warmup + iterations)))
+        else:
+            for i in range(warmup, warmup + iterations):
+                run(i)
+        wall = time.perf_counter() - started
+
+        results[scenario.name] = summarize(timings, wall, errors, driver.peak_rss_mb())
+    return results
+
+
+def main(argv=None):
+    """python -m benchmarks.drivers <config.json> <result.json>"""
+    config_path, result_path = (argv or sys.argv[1:])[:2]
+    with open(config_path) as f:
+        config = json.load(f)
+
+    fixture_dir = config['fixture_dir']
+    with open(os.path.join(fixture_dir, 'blogs.json')) as f:
+        blogs = json.load(f)
+    with open(os.path.join(fixture_dir, 'groups.json')) as f:
+        groups = json.load(f)
+    ctx = Context(blogs, groups)
+    env = dict(config.get('env', {}), SECRET_KEY=SECRET_KEY)
+
+    if config['mode'] == 'gunicorn':
+        driver = ServerDriver(fixture_dir, env, workers=config.get('workers', 2))
+    else:
+        driver = ClientDriver(fixture_dir, env)
+    try:
+        results = measure(driver, select(config.get('scenarios')), ctx, config['iterations'],
+                          config.get('warmup', 5), config.get('concurrency', 1))
+        peak = driver.peak_rss_mb()
+    finally:
+        driver.close()
+
+    with open(result_path, 'w') as f:
+        json.dump({'routes': results, 'peak_rss_mb': peak}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""Latency summaries, result tables and baseline comparison."""
+import json
+import os
+import platform
+import sys
+from datetime import datetime, timezone
+
+# Latencies are compared at these percentiles
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(timings, wall, errors, peak_rss_mb):
+    """Summary of one scenario's request timings (seconds)"""
+    ms = sorted(t * 1000 for t in timings)
+    summary = {f'p{p}_ms': percentile(ms, p) for p in PERCENTILES}
+    summary.update({
+        'requests': len(ms),
+        'mean_ms': sum(ms) / len(ms) if ms else None,
+        'rps': len(ms) / wall if wall > 0 else None,
+        'errors': len(errors),
+        'peak_rss_mb': peak_rss_mb
+    })
+    if errors:
+        summary['first_error'] = errors[0]
+    return summary
+
+
+def run_key(mode, posts):
+    return f'{mode}/{posts}'
+
+
+def format_table(key, result):
+    header = f"{'route':<24}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}{'errors':>8}{'RSS MB':>9}"
+    lines = [f'== {key} (peak RSS {_number(result.get("peak_rss_mb"))} MB)', header]
+    for name, summary in result['routes'].items():
+        lines.append(f"{name:<24}{_number(summary['p50_ms'], 2):>9}{_number(summary['p95_ms'], 2):>9}"
+                     f"{_number(summary['p99_ms'], 2):>9}{_number(summary['rps'], 1):>9}"
+                     f"{summary['errors']:>8}{_number(summary['peak_rss_mb']):>9}")
+        if summary.get('first_error'):
+            lines.append(f"    first error: {summary['first_error']}")
+    return '\n'.join(lines)
+
+
+def _number(value, digits=0):
+    return '-' if value is None else f'{value:.{digits}f}'
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(path, results, existing=None):
+    """Write results into the baseline file, keeping runs it already has for other sizes"""
+    baseline = existing or {'runs': {}}
+    baseline['runs'].update(results)
+    baseline['saved_at'] = datetime.now(timezone.utc).isoformat()
+    baseline['python'] = sys.version.split()[0]
+    baseline['machine'] = f'{platform.system()} {platform.machine()}'
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+
+
+def _worse(old, new, threshold, slack=0.0, higher_is_better=False):
+    if old is None or new is None:
+        return False
+    if higher_is_better:
+        # Throughput: compare the time per request instead
+        if old <= 0 or new <= 0:
+            return new < old
+        old, new = 1000 / old, 1000 / new
+    return new > old * (1 + threshold) and new - old > slack
+
+
+def compare(baseline, results, threshold=0.25, min_delta_ms=1.0):
+    """Regressions of results against a baseline, as readable messages.
+
+    A latency percentile regresses when it is more than threshold (a
+    fraction) above the baseline and at least min_delta_ms slower, so
+    sub-millisecond jitter never fails a run. Throughput is held to the same
+    rule through its time per request, peak RSS to the same fraction. Runs
+    and routes missing from either side are skipped.
+    """
+    regressions = []
+    for key, result in results.items():
+        old_run = baseline.get('runs', {}).get(key)
+        if old_run is None:
+            continue
+        if _worse(old_run.get('peak_rss_mb'), result.get('peak_rss_mb'), threshold):
+            regressions.append(f"{key}: peak RSS {old_run['peak_rss_mb']:.0f} -> {result['peak_rss_mb']:.0f} MB")
+        for name, summary in result['routes'].items():
+            old = old_run['routes'].get(name)
+            if old is None:
+                continue
+            for p in PERCENTILES:
+                field = f'p{p}_ms'
+                if _worse(old.get(field), summary.get(field), threshold, min_delta_ms):
+                    regressions.append(f"{key} {name}: p{p} {old[field]:.2f} -> {summary[field]:.2f} ms")
+            if _worse(old.get('rps'), summary.get('rps'), threshold, min_delta_ms, higher_is_better=True):
+                regressions.append(f"{key} {name}: {old['rps']:.1f} -> {summary['rps']:.1f} req/s")
+    return regressions
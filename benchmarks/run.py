@@ -0,0 +1,168 @@
+"""Benchmark the routes at several corpus sizes and check for regressions.
+
+    python -m benchmarks.run --posts 10,100,1000 --mode client,gunicorn
+    python -m benchmarks.run --posts 1000 --save-baseline
+    python -m benchmarks.run --posts 1000 --threshold 0.2   # exits 1 on regression
+
+For every size a corpus is generated once; every mode then gets its own
+copy (mutations and visits change the files) and runs in a fresh process.
+Results are compared with the baseline file when it exists, and the run
+fails if any latency percentile, throughput or peak RSS got worse than
+--threshold, or if any request returned an unexpected status.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.corpus import write_corpus
+from benchmarks.drivers import REPO_ROOT
+from benchmarks.report import compare, format_table, load_baseline, run_key, save_baseline
+from benchmarks.scenarios import SCENARIOS
+
+MODES = ('client', 'gunicorn')
+DEFAULT_BASELINE = os.path.join(REPO_ROOT, 'benchmarks', 'baseline.json')
+
+
+def _list(text):
+    return [part.strip() for part in text.split(',') if part.strip()]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--posts', default='10,100,1000',
+                        help='Comma separated corpus sizes (default: 10,100,1000)')
+    parser.add_argument('--mode', default='client',
+                        help='client (Flask test client), gunicorn, or both comma separated')
+    parser.add_argument('--routes', default='',
+                        help='Comma separated scenario names (default: all of %s)'
+                             % ', '.join(s.name for s in SCENARIOS))
+    parser.add_argument('--iterations', type=int, default=100, help='Timed requests per route')
+    parser.add_argument('--warmup', type=int, default=5, help='Untimed requests per route first')
+    parser.add_argument('--concurrency', type=int, default=1, help='Requests in flight at once')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+    parser.add_argument('--visits-per-post', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help='App setting for the run, e.g. PAGE_CACHE_MAX_BYTES=0 (repeatable)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline file to compare with')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='Store these results as the new baseline instead of comparing')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Allowed slowdown as a fraction of the baseline (default: 0.25)')
+    parser.add_argument('--min-delta-ms', type=float, default=1.0,
+                        help='Latency changes smaller than this never count as regressions')
+    parser.add_argument('--json', help='Also write the results to this file')
+    parser.add_argument('--keep', action='store_true', help='Keep the fixture directories')
+    args = parser.parse_args(argv)
+
+    args.posts = [int(size) for size in _list(args.posts)]
+    args.mode = _list(args.mode)
+    for mode in args.mode:
+        if mode not in MODES:
+            parser.error(f"Unknown mode: {mode}")
+    args.routes = _list(args.routes)
+    known = {scenario.name for scenario in SCENARIOS}
+    for name in args.routes:
+        if name not in known:
+            parser.error(f"Unknown route: {name}")
+    env = {}
+    for item in args.env:
+        key, sep, value = item.partition('=')
+        if not sep:
+            parser.error(f"--env expects KEY=VALUE, got {item}")
+        env[key] = value
+    args.env = env
+    return args
+
+
+def run_once(args, mode, fixture_dir, work_dir):
+    """Measure one mode against one fixture directory in a separate process"""
+    config_path = os.path.join(work_dir, f'{mode}-config.json')
+    result_path = os.path.join(work_dir, f'{mode}-result.json')
+    config = {
+        'mode': mode,
+        'fixture_dir': fixture_dir,
+        'scenarios': args.routes,
+        'iterations': args.iterations,
+        'warmup': args.warmup,
+        'concurrency': args.concurrency,
+        'workers': args.workers,
+        'env': args.env
+    }
+    with open(config_path, 'w') as f:
+        json.dump(config, f)
+    completed = subprocess.run([sys.executable, '-m', 'benchmarks.drivers', config_path, result_path],
+                               cwd=REPO_ROOT, stdout=subprocess.DEVNULL)
+    if completed.returncode != 0:
+        raise RuntimeError(f"{mode} benchmark exited with status {completed.returncode}")
+    with open(result_path) as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if 'gunicorn' in args.mode and importlib.util.find_spec('gunicorn') is None:
+        print("gunicorn is not installed; run `pip install gunicorn` or use --mode client")
+        return 2
+
+    results = {}
+    failed = False
+    work_root = tempfile.mkdtemp(prefix='blog-bench-')
+    try:
+        for posts in args.posts:
+            corpus_dir = os.path.join(work_root, f'corpus-{posts}')
+            write_corpus(corpus_dir, posts, args.visits_per_post, seed=args.seed)
+            for mode in args.mode:
+                key = run_key(mode, posts)
+                fixture_dir = os.path.join(work_root, f'{mode}-{posts}')
+                shutil.copytree(corpus_dir, fixture_dir)
+                try:
+                    results[key] = run_once(args, mode, fixture_dir, work_root)
+                except RuntimeError as e:
+                    print(f"Error benchmarking {key}: {e}")
+                    failed = True
+                    continue
+                print(format_table(key, results[key]))
+                print()
+                if any(summary['errors'] for summary in results[key]['routes'].values()):
+                    failed = True
+    finally:
+        if args.keep:
+            print(f"Fixtures kept in {work_root}")
+        else:
+            shutil.rmtree(work_root, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    baseline = load_baseline(args.baseline)
+    if args.save_baseline and failed:
+        print("Baseline not saved because the run failed")
+    elif args.save_baseline:
+        save_baseline(args.baseline, results, baseline)
+        print(f"Baseline saved to {args.baseline}")
+    elif baseline is None:
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+    else:
+        regressions = compare(baseline, results, args.threshold, args.min_delta_ms)
+        if regressions:
+            print(f"Regressions against {args.baseline} (threshold {args.threshold:.0%}):")
+            for message in regressions:
+                print(f"  {message}")
+            failed = True
+        else:
+            print(f"No regressions against {args.baseline}")
+
+    if failed:
+        print("Benchmark failed")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""The requests each benchmark run makes, in the order they run.
+
+Every scenario builds the request for iteration i from the run context
+(the corpus post and group IDs, plus the IDs of the posts the benchmark
+created itself). Mutations only touch the posts create_blog made and
+delete_blog removes them again, so the read scenarios of the next run see
+the same corpus.
+"""
+import threading
+from urllib.parse import urlencode
+
+from benchmarks.corpus import ADMIN_PASSWORD, ADMIN_USERNAME
+
+
+class Context:
+    def __init__(self, blogs, groups):
+        # Reads go to visible posts only; anonymous requests for hidden ones redirect
+        self.blog_ids = sorted((blog_id for blog_id, blog in blogs.items() if not blog.get('hidden')), key=int)
+        self.group_ids = sorted(groups, key=int)
+        # IDs are handed out after the highest one in the corpus
+        self.next_id = max(map(int, blogs), default=0) + 1
+        self.created = []
+        self._lock = threading.Lock()
+
+    def blog(self, i):
+        return self.blog_ids[i % len(self.blog_ids)]
+
+    def group(self, i):
+        return self.group_ids[i % len(self.group_ids)]
+
+    def own(self, i):
+        """One of the posts the benchmark created, or a corpus post if there are none"""
+        return self.created[i % len(self.created)] if self.created else self.blog(i)
+
+
+class Scenario:
+    def __init__(self, name, method, build, admin=False, expect=200, after=None):
+        self.name = name
+        self.method = method
+        self.build = build  # (i, context) -> (path, form data or None)
+        self.admin = admin
+        self.expect = expect
+        self.after = after  # (i, context) called once the request succeeded
+
+
+def _created(i, ctx):
+    with ctx._lock:
+        ctx.created.append(str(ctx.next_id))
+        ctx.next_id += 1
+
+
+SEARCH_TERMS = ('state', 'useEffect', 'cv2', 'router fetch', 'border-radius', 'npm install')
+
+SCENARIOS = [
+    # Public pages and the JSON they load
+    Scenario('index', 'GET', lambda i, ctx: ('/', None)),
+    Scenario('blog_detail', 'GET', lambda i, ctx: (f'/blog/{ctx.blog(i)}', None)),
+    Scenario('search', 'GET', lambda i, ctx: ('/search?' + urlencode({'q': SEARCH_TERMS[i % len(SEARCH_TERMS)]}), None)),
+    Scenario('rankings_api', 'GET', lambda i, ctx: ('/api/rankings', None)),
+    Scenario('group_blogs_api', 'GET', lambda i, ctx: (f'/api/groups/{ctx.group(i)}/blogs', None)),
+    Scenario('blog_subsections_api', 'GET', lambda i, ctx: (f'/api/blogs/{ctx.blog(i)}/subsections', None)),
+
+    # Admin pages
+    Scenario('admin', 'GET', lambda i, ctx: ('/admin', None), admin=True),
+    Scenario('visitor_stats', 'GET', lambda i, ctx: ('/visitor_stats', None), admin=True),
+    Scenario('visitor_stats_data', 'GET',
+             lambda i, ctx: ('/visitor_stats/data?granularity=' + ('day', 'week', 'month', 'hour')[i % 4], None),
+             admin=True),
+    Scenario('manage_groups', 'GET', lambda i, ctx: ('/manage_groups', None), admin=True),
+    Scenario('edit_blog', 'GET', lambda i, ctx: (f'/edit_blog/{ctx.blog(i)}', None), admin=True),
+
+    # Mutations, on the benchmark's own posts
+    Scenario('create_blog', 'POST',
+             lambda i, ctx: ('/create_blog', {'title': f'Benchmark post {i}',
+                                              'content': f'# Benchmark {i}\n\n```python\nprint({i})\n```'}),
+             admin=True, expect=302, after=_created),
+    Scenario('update_blog', 'POST',
+             lambda i, ctx: (f'/update_blog/{ctx.own(i)}', {'title': f'Benchmark post {i} (edited)',
+                                                            'content': f'Edited **{i}** times'}),
+             admin=True, expect=302),
+    Scenario('add_subsection', 'POST',
+             lambda i, ctx: (f'/add_subsection/{ctx.own(i)}', {'subsection_title': f'Part {i}',
+                                                               'subsection_content': f'```js\nconsole.log({i});\n```'}),
+             admin=True, expect=302),
+    Scenario('add_blog_to_group', 'POST',
+             lambda i, ctx: ('/add_blog_to_group', {'group_id': ctx.group(i), 'blog_id': ctx.own(i)}),
+             admin=True, expect=302),
+    Scenario('remove_blog_from_group', 'POST',
+             lambda i, ctx: ('/remove_blog_from_group', {'group_id': ctx.group(i), 'blog_id': ctx.own(i)}),
+             admin=True, expect=302),
+    Scenario('toggle_blog_visibility', 'GET',
+             lambda i, ctx: (f'/toggle_blog_visibility/{ctx.own(i)}', None), admin=True, expect=302),
+    # Runs as many times as create_blog, so iteration i deletes the i-th post created
+    Scenario('delete_blog', 'GET',
+             lambda i, ctx: (f'/delete_blog/{ctx.own(i)}', None), admin=True, expect=302),
+]
+
+LOGIN_FORM = {'username': ADMIN_USERNAME, 'password': ADMIN_PASSWORD}
+
+
+def select(names=None):
+    """Scenarios named in names (all of them by default), in run order"""
+    if not names:
+        return list(SCENARIOS)
+    known = {scenario.name for scenario in SCENARIOS}
+    unknown = [name for name in names if name not in known]
+    if unknown:
+        raise ValueError(f"Unknown scenario: {', '.join(unknown)}")
+    return [scenario for scenario in SCENARIOS if scenario.name in names]
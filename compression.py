@@ -0,0 +1,122 @@
+import gzip
+import struct
+import zlib
+
+try:
+    import brotli
+except ImportError:  # Responses are gzipped only
+    brotli = None
+
+# Response types worth compressing; images and fonts already are
+COMPRESSIBLE_TYPES = {'text/html', 'text/css', 'text/plain', 'text/xml', 'text/javascript',
+                      'application/json', 'application/javascript', 'application/xml', 'image/svg+xml'}
+
+# Per-request compression trades some ratio for speed; cached pages are
+# compressed once, so they get the best gzip has
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+CACHED_GZIP_LEVEL = 9
+
+# Fixed gzip header (no name, no mtime) and the empty final deflate block
+GZIP_HEADER = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'
+FINAL_BLOCK = zlib.compressobj(CACHED_GZIP_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS).flush()
+
+# Reversed CRC-32 polynomial, for combining checksums as zlib's crc32_combine does
+CRC_POLY = 0xedb88320
+
+
+def _multmodp(a, b):
+    """a * b modulo the CRC polynomial (bit-reversed, as in zlib's crc32.c)"""
+    m = 1 << 31
+    product = 0
+    while True:
+        if a & m:
+            product ^= b
+            if not a & (m - 1):
+                return product
+        m >>= 1
+        b = (b >> 1) ^ CRC_POLY if b & 1 else b >> 1
+
+
+# x^(2^k) modulo the polynomial
+_X2N = [1 << 30]
+for _ in range(31):
+    _X2N.append(_multmodp(_X2N[-1], _X2N[-1]))
+
+
+def crc32_shift(length):
+    """The factor that moves a CRC-32 past length more bytes, for crc32_combine()"""
+    factor, k = 1 << 31, 3
+    while length:
+        if length & 1:
+            factor = _multmodp(_X2N[k & 31], factor)
+        length >>= 1
+        k += 1
+    return factor
+
+
+def crc32_combine(crc1, crc2, shift):
+    """CRC-32 of A + B from crc32(A), crc32(B) and crc32_shift(len(B))"""
+    return _multmodp(shift, crc1) ^ crc2
+
+
+def choose_encoding(accept_encodings):
+    """'br', 'gzip' or None for a request's werkzeug Accept-Encoding object, brotli winning ties"""
+    candidates = ['br', 'gzip'] if brotli is not None else ['gzip']
+    best, best_quality = None, 0
+    for encoding in candidates:
+        quality = accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, GZIP_LEVEL, mtime=0)
+
+
+def deflate_part(data, level=CACHED_GZIP_LEVEL):
+    """Raw deflate blocks for data, ending on a full flush so other parts can follow"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush(zlib.Z_FULL_FLUSH)
+
+
+def stored_block(data):
+    """data as an uncompressed deflate block (up to 64 KB), for short values between parts"""
+    return b'\x00' + struct.pack('<HH', len(data), len(data) ^ 0xffff) + data
+
+
+class GzipTemplate:
+    """Gzip a body whose static parts were compressed once, with short values put in between per request.
+
+    Every part is deflated on its own and ends on a full flush, which
+    leaves no references to earlier data, so the compressed parts and the
+    freshly deflated values can be joined into one valid gzip stream (the
+    way pigz joins blocks compressed in parallel). Per request the values
+    are only stored and checksummed, and combined with the parts' saved
+    checksums, so the uncompressed parts are not kept.
+    """
+
+    def __init__(self, parts):
+        self.compressed = [deflate_part(part) for part in parts]
+        self.checksums = [(zlib.crc32(part), len(part), crc32_shift(len(part))) for part in parts]
+        self.size = sum(len(part) for part in self.compressed)
+
+    def render(self, values):
+        """The gzipped parts with values (bytes, one fewer than the parts) between them"""
+        chunks = [GZIP_HEADER]
+        crc, length = 0, 0
+        for index, (part_crc, part_length, shift) in enumerate(self.checksums):
+            if index:
+                value = values[index - 1]
+                chunks.append(stored_block(value))
+                crc = zlib.crc32(value, crc)
+                length += len(value)
+            chunks.append(self.compressed[index])
+            crc = crc32_combine(crc, part_crc, shift)
+            length += part_length
+        chunks.append(FINAL_BLOCK)
+        chunks.append(struct.pack('<II', crc, length & 0xffffffff))
+        return b''.join(chunks)
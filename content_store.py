@@ -0,0 +1,148 @@
+import json
+import os
+import threading
+
+from persistence import file_lock, read_json, update_json, write_json_atomic
+from request_metrics import phase
+
+
+class JSONFileSource:
+    """Reads and writes a whole JSON file; the stamp is its (mtime, size).
+
+    Writes go through a temp file and rename under the file's lock, so
+    readers in other workers never see a half-written file. Single-item
+    writes re-read the file under the lock first and return the merged
+    data, so they keep entries other workers saved in the meantime.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def stamp(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def read(self):
+        return read_json(self.path)
+
+    def write(self, data):
+        with file_lock(self.path):
+            write_json_atomic(self.path, data)
+
+    def write_item(self, key, value, data):
+        return update_json(self.path, lambda current: current.__setitem__(key, value))
+
+    def delete_item(self, key, data):
+        return update_json(self.path, lambda current: current.pop(key, None))
+
+
+class ContentStore:
+    """Keeps parsed content in memory and reloads it only when the source changes.
+
+    The source is re-read when its stamp differs from the one seen at the
+    last load (for a JSON file, its mtime and size), so edits made by another
+    worker or by hand are still picked up. Writes should go through save(),
+    save_item() or delete_item() so the in-memory copy stays in sync without
+    a re-parse.
+
+    The object returned by get() is shared between requests: views that only
+    read can use it directly, views that mutate it must save afterwards.
+    """
+
+    def __init__(self, source, normalize=None):
+        if isinstance(source, str):
+            source = JSONFileSource(source)
+        self.source = source
+        self.normalize = normalize
+        self._data = None
+        self._stamp = None
+        self._lock = threading.RLock()
+
+    @property
+    def path(self):
+        return getattr(self.source, 'path', None)
+
+    def get(self):
+        """Return the cached data, reloading it first if the source changed"""
+        stamp = self.source.stamp()
+        if self._data is not None and stamp == self._stamp:
+            return self._data
+
+        with self._lock:
+            stamp = self.source.stamp()
+            if self._data is not None and stamp == self._stamp:
+                return self._data
+            with phase('load'):
+                self._data = self._read(stamp)
+            return self._data
+
+    def stamp(self):
+        """Stamp of the data get() returns, changing whenever the content does"""
+        with self._lock:
+            self.get()
+            return self._stamp
+
+    def _empty(self):
+        return self.normalize({})[0] if self.normalize else {}
+
+    def _read(self, stamp):
+        if stamp is None:
+            self._stamp = None
+            return self._empty()
+
+        try:
+            data = self.source.read()
+        except (json.JSONDecodeError, Exception) as e:
+            print(f"Error loading {self.path or self.source}: {e}")
+            # Don't remember the stamp so the next call tries again, and keep
+            # serving the last good copy rather than an empty one
+            self._stamp = None
+            return self._data if self._data is not None else self._empty()
+
+        self._stamp = stamp
+        if self.normalize:
+            data, changed = self.normalize(data)
+            if changed:
+                self.source.write(data)
+                self._stamp = self.source.stamp()
+        return data
+
+    def _write(self, write, data):
+        with self._lock:
+            try:
+                with phase('write'):
+                    merged = write()
+            except Exception:
+                # The cache may now hold changes that never reached the source
+                self.invalidate()
+                raise
+            # Sources that merge with what is on disk hand back the result
+            self._data = merged if merged is not None else data
+            self._stamp = self.source.stamp()
+
+    def save(self, data):
+        """Write all data and make it the cached copy"""
+        self._write(lambda: self.source.write(data), data)
+
+    def save_item(self, key, value):
+        """Store a single top-level entry, writing only what the source needs"""
+        with self._lock:
+            data = self.get()
+            data[key] = value
+            self._write(lambda: self.source.write_item(key, value, data), data)
+
+    def delete_item(self, key):
+        """Remove a single top-level entry"""
+        with self._lock:
+            data = self.get()
+            data.pop(key, None)
+            self._write(lambda: self.source.delete_item(key, data), data)
+
+    def invalidate(self):
+        """Drop the cached copy so the next get() reads the source again"""
+        with self._lock:
+            self._data = None
+            self._stamp = None
@@ -0,0 +1,102 @@
+import threading
+
+
+class GroupIndex:
+    """Group membership as ordered sets, plus a reverse map from blog to groups.
+
+    Groups keep their members as plain lists (that is what groups.json and
+    the SQLite group_blogs rows hold); this index mirrors them as
+    insertion-ordered dicts so membership tests, bulk adds and removals are
+    O(1) per post, and maps every post to the groups it is in so deleting a
+    post can clean up exactly the groups that list it. sync() rebuilds the
+    index whenever it is handed a different groups dict or version (the
+    store reloaded or saved); the mutators keep both the index and the group
+    lists in step until then.
+    """
+
+    def __init__(self):
+        self.members = {}  # group_id -> {blog_id: None}, in group order
+        self.blog_groups = {}  # blog_id -> {group_id, ...}
+        self._synced = None
+        self._version = None
+        self._lock = threading.RLock()
+
+    def sync(self, groups, version=None):
+        """Rebuild the index unless it was built from this groups dict and version"""
+        if groups is self._synced and version == self._version:
+            return
+        with self._lock:
+            self._version = version
+            self.members = {}
+            self.blog_groups = {}
+            for group_id, group in groups.items():
+                members = self.members[group_id] = dict.fromkeys(group.get('blogs', []))
+                for blog_id in members:
+                    self.blog_groups.setdefault(blog_id, set()).add(group_id)
+            self._synced = groups
+
+    def groups_of(self, blog_id):
+        """IDs of the groups a post is in"""
+        return frozenset(self.blog_groups.get(blog_id, ()))
+
+    def is_grouped(self, blog_id, group_ids=None):
+        """Whether a post is in any group, or in any of group_ids if given"""
+        found = self.blog_groups.get(blog_id)
+        if not found:
+            return False
+        if group_ids is None:
+            return True
+        return any(group_id in group_ids for group_id in found)
+
+    def contains(self, group_id, blog_id):
+        return blog_id in self.members.get(group_id, {})
+
+    def add(self, groups, group_id, blog_ids):
+        """Append posts not yet in the group, in order; returns the IDs added"""
+        with self._lock:
+            self.sync(groups, self._version)
+            members = self.members.setdefault(group_id, {})
+            added = []
+            for blog_id in blog_ids:
+                if blog_id not in members:
+                    members[blog_id] = None
+                    self.blog_groups.setdefault(blog_id, set()).add(group_id)
+                    added.append(blog_id)
+            if added:
+                groups[group_id]['blogs'] = list(members)
+            return added
+
+    def remove(self, groups, group_id, blog_id):
+        """Take a post out of one group; returns whether it was in it"""
+        with self._lock:
+            self.sync(groups, self._version)
+            members = self.members.get(group_id, {})
+            if blog_id not in members:
+                return False
+            del members[blog_id]
+            self._forget(blog_id, group_id)
+            groups[group_id]['blogs'] = list(members)
+            return True
+
+    def remove_blog(self, groups, blog_id):
+        """Take a post out of every group; returns the IDs of the groups changed"""
+        with self._lock:
+            self.sync(groups, self._version)
+            changed = sorted(self.blog_groups.pop(blog_id, ()))
+            for group_id in changed:
+                members = self.members[group_id]
+                members.pop(blog_id, None)
+                groups[group_id]['blogs'] = list(members)
+            return changed
+
+    def remove_group(self, group_id):
+        with self._lock:
+            for blog_id in self.members.pop(group_id, {}):
+                self._forget(blog_id, group_id)
+
+    def _forget(self, blog_id, group_id):
+        found = self.blog_groups.get(blog_id)
+        if found is not None:
+            found.discard(group_id)
+            if not found:
+                del self.blog_groups[blog_id]
@@ -0,0 +1,91 @@
+import base64
+import math
+
+
+class HyperLogLog:
+    """Fixed-size probabilistic counter of distinct items.
+
+    Uses 2**p one-byte registers, so memory does not grow with the number of
+    items added. The relative standard error of count() is 1.04 / sqrt(2**p):
+    about 1.6% for p=12 and 3.3% for p=10. Two sketches with the same p can be
+    merged losslessly, which is how counts from several workers or days are
+    combined.
+
+    Items are 64-bit hashes given as hex strings, e.g. the output of hash_ip().
+    """
+
+    def __init__(self, p=12, registers=None):
+        if not 4 <= p <= 16:
+            raise ValueError("p must be between 4 and 16")
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.m)
+        # Kept up to date on every change so count() is O(1)
+        self._sum = math.fsum(2.0 ** -r for r in self.registers)
+        self._zeros = self.registers.count(0)
+
+    @property
+    def error_bound(self):
+        """Relative standard error of count()"""
+        return 1.04 / math.sqrt(self.m)
+
+    def _set(self, index, rank):
+        old = self.registers[index]
+        if rank <= old:
+            return False
+        self.registers[index] = rank
+        self._sum += 2.0 ** -rank - 2.0 ** -old
+        if old == 0:
+            self._zeros -= 1
+        return True
+
+    def add(self, item_hash):
+        """Add a hex-encoded 64-bit hash; returns True if the sketch changed"""
+        x = int(item_hash[:16], 16)
+        bits = 64 - self.p
+        index = x >> bits
+        w = x & ((1 << bits) - 1)
+        rank = bits - w.bit_length() + 1
+        return self._set(index, rank)
+
+    def merge(self, other):
+        """Fold another sketch with the same precision into this one"""
+        if other.p != self.p:
+            raise ValueError("Cannot merge sketches with different precision")
+        mine = self.registers
+        for index, rank in enumerate(other.registers):
+            if rank > mine[index]:
+                self._set(index, rank)
+
+    def copy(self):
+        return HyperLogLog(self.p, self.registers)
+
+    def count(self):
+        """Estimated number of distinct items added"""
+        m = self.m
+        alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+        estimate = alpha * m * m / self._sum
+        if estimate <= 2.5 * m and self._zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = m * math.log(m / self._zeros)
+        return int(round(estimate))
+
+    def serialize(self):
+        """Compact text form: sparse (index, rank) pairs or the dense registers"""
+        nonzero = [(i, r) for i, r in enumerate(self.registers) if r]
+        if len(nonzero) * 3 < self.m:
+            raw = b''.join(i.to_bytes(2, 'big') + bytes([r]) for i, r in nonzero)
+            return f'{self.p}s:' + base64.b64encode(raw).decode()
+        return f'{self.p}d:' + base64.b64encode(bytes(self.registers)).decode()
+
+    @classmethod
+    def deserialize(cls, text):
+        header, _, payload = text.partition(':')
+        p, kind = int(header[:-1]), header[-1]
+        raw = base64.b64decode(payload)
+        if kind == 'd':
+            return cls(p, raw)
+        sketch = cls(p)
+        for offset in range(0, len(raw), 3):
+            sketch._set(int.from_bytes(raw[offset:offset + 2], 'big'), raw[offset + 2])
+        return sketch
@@ -0,0 +1,60 @@
+import re
+import unicodedata
+
+from persistence import update_json
+
+SLUG_RE = re.compile(r'[^a-z0-9]+')
+SLUG_MAX_LENGTH = 80
+
+
+def slugify(text):
+    """Lowercase ASCII words joined by dashes, e.g. 'Héllo, World!' -> 'hello-world'"""
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode()
+    slug = SLUG_RE.sub('-', text.lower()).strip('-')
+    return slug[:SLUG_MAX_LENGTH].rstrip('-')
+
+
+def unique_slug(text, taken):
+    """slugify(text), with -2, -3, ... appended while it is in taken"""
+    base = slugify(text) or 'post'
+    slug = base
+    suffix = 2
+    while slug in taken or slug.isdigit():
+        slug = f'{base}-{suffix}'
+        suffix += 1
+    return slug
+
+
+def highest_id(ids):
+    """Largest numeric ID among ids, 0 if there is none"""
+    return max((int(key) for key in ids if str(key).isdigit()), default=0)
+
+
+class IdAllocator:
+    """Hands out increasing numeric IDs that are never reused.
+
+    The last ID given out per kind ('blogs', 'groups') lives in a small JSON
+    file, updated under its file lock so concurrent workers never get the
+    same ID. The first allocation of a kind starts after the highest
+    numeric ID already in use, so existing content keeps its IDs; deleting
+    an item never makes its ID available again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def allocate(self, kind, existing=()):
+        allocated = []
+
+        def change(counters):
+            last = counters.get(kind)
+            if last is None:
+                last = highest_id(existing)
+            new_id = last + 1
+            while str(new_id) in existing:
+                new_id += 1
+            counters[kind] = new_id
+            allocated.append(str(new_id))
+
+        update_json(self.path, change)
+        return allocated[0]
@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from markdown import markdown
+
+from persistence import read_json, write_json_atomic
+
+
+class MarkdownCache:
+    """Caches rendered Markdown HTML keyed by a hash of the source text.
+
+    The key also covers the extension list, so changing the extensions can
+    never serve HTML rendered with the old set. Entries are evicted least
+    recently used first once their HTML exceeds max_bytes in total.
+
+    When a path is given the cache is loaded from it on first use and written
+    back by persist(), so a restarted worker does not have to render every
+    post again. A change is written persist_delay seconds later from a
+    background thread, so a burst of renders costs one write and no request
+    waits for it.
+    """
+
+    def __init__(self, extensions, path=None, max_bytes=8 * 1024 * 1024, persist_delay=30.0):
+        self.extensions = list(extensions)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.persist_delay = persist_delay
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (HTML, size in UTF-8 bytes)
+        self._size = 0
+        self._loaded = False
+        self._dirty = False
+        self._timer = None
+        self._lock = threading.Lock()
+        self._prefix = ('\0'.join(self.extensions) + '\0\0').encode()
+
+    def key(self, text):
+        return hashlib.sha256(self._prefix + text.encode()).hexdigest()
+
+    def render(self, text):
+        """Return the HTML for text, rendering it only on a cache miss"""
+        self._load()
+        key = self.key(text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        html = markdown(text, extensions=self.extensions)
+        self._store(key, html)
+        return html
+
+    def _store(self, key, html):
+        with self._lock:
+            self._add(key, html)
+            self._dirty = True
+            self._start_timer()
+
+    def _add(self, key, html):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._size -= old[1]
+        size = len(html.encode())
+        self._entries[key] = (html, size)
+        self._size += size
+        while self._size > self.max_bytes:
+            _, (_, old_size) = self._entries.popitem(last=False)
+            self._size -= old_size
+
+    def _start_timer(self):
+        if self._timer is None and self.path and self.persist_delay > 0:
+            self._timer = threading.Timer(self.persist_delay, self._on_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _on_timer(self):
+        with self._lock:
+            self._timer = None
+        self.persist()
+
+    def warm_blog(self, blog):
+        """Render a blog's main content and subsections into the cache"""
+        self.render(blog.get('content', ''))
+        for subsection in blog.get('subsections', []):
+            self.render(subsection.get('content', ''))
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+            'entries': len(self._entries),
+            'bytes': self._size
+        }
+
+    def _load(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            if not self.path or not os.path.exists(self.path):
+                return
+            try:
+                data = read_json(self.path)
+                if data.get('extensions') == self.extensions:
+                    for key, html in data.get('entries', {}).items():
+                        self._add(key, html)
+            except (json.JSONDecodeError, Exception) as e:
+                print(f"Error loading markdown cache: {e}")
+
+    def persist(self):
+        """Write the cache to disk if it changed since the last write (also run at exit)"""
+        if not self.path or not self._dirty:
+            return
+        with self._lock:
+            entries = {key: html for key, (html, _) in self._entries.items()}
+            data = {'extensions': self.extensions, 'entries': entries}
+            self._dirty = False
+        try:
+            write_json_atomic(self.path, data, indent=None)
+        except Exception as e:
+            print(f"Error saving markdown cache: {e}")
@@ -0,0 +1,116 @@
+import re
+import threading
+from collections import OrderedDict
+
+# Footer counters are refreshed on every hit, everything else is served as is
+STAT_RE = re.compile(rb'(<span data-stat="(\w+)">)[^<]*(</span>)')
+
+
+class PageCache:
+    """LRU cache of rendered pages (as UTF-8 bytes) bounded by their total size.
+
+    Every entry carries a set of tags (e.g. 'index' or 'blog:3'); a content
+    change drops just the entries with the affected tags via invalidate().
+    The cache also remembers the content version its entries were rendered
+    from, so a change made by another worker (a different version seen by
+    sync()) empties it instead of serving stale pages.
+    """
+
+    def __init__(self, max_bytes=16 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.version = None
+        self._entries = OrderedDict()  # key -> (body, size, tags)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def sync(self, version):
+        """Drop every entry if the content changed outside this process"""
+        with self._lock:
+            if version != self.version:
+                self._clear()
+                self.version = version
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, body, tags, version, size=None):
+        """Store a page rendered from the given content version; size defaults to len(body)"""
+        size = len(body) if size is None else size
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if version != self.version:
+                # Content changed while the page was being rendered
+                return
+            self._discard(key)
+            self._entries[key] = (body, size, frozenset(tags))
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, old_size, _) = self._entries.popitem(last=False)
+                self._size -= old_size
+
+    def invalidate(self, tags, version=None, previous=None):
+        """Drop entries carrying any of tags, then adopt version if given.
+
+        With previous, the content version just before the change, the tags
+        are only trusted if the cache was at that version; otherwise it may
+        hold pages of other changes merged by the same write, so it is emptied.
+        """
+        tags = set(tags)
+        with self._lock:
+            if previous is not None and previous != self.version:
+                self._clear()
+            else:
+                for key in [key for key, entry in self._entries.items() if entry[2] & tags]:
+                    self._discard(key)
+            if version is not None:
+                self.version = version
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def _clear(self):
+        self._entries.clear()
+        self._size = 0
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry[1]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'entries': len(self._entries),
+            'bytes': self._size
+        }
+
+
+def fill_stats(body, stats):
+    """Replace the data-stat counters in a cached page with current values"""
+    return STAT_RE.sub(lambda m: m.group(1) + str(stats.get(m.group(2).decode(), '')).encode() + m.group(3), body)
+
+
+def split_stats(body):
+    """Split a cached page around its counters into (parts, stat names);
+    joining the parts with the stats' values gives what fill_stats() returns"""
+    parts, names, start = [], [], 0
+    for match in STAT_RE.finditer(body):
+        parts.append(body[start:match.end(1)])
+        names.append(match.group(2).decode())
+        start = match.start(3)
+    parts.append(body[start:])
+    return parts, names
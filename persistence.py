@@ -0,0 +1,134 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from request_metrics import metrics, phase
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to the per-process lock only
+    fcntl = None
+
+# Transient errors (a reader holding the file open on Windows, a file swapped
+# in by a non-atomic writer) are retried this many times, backing off from
+# RETRY_DELAY up to RETRY_MAX_DELAY seconds between attempts.
+RETRY_ATTEMPTS = 5
+RETRY_DELAY = 0.01
+RETRY_MAX_DELAY = 0.25
+
+
+def retry(func, exceptions=(OSError,), attempts=RETRY_ATTEMPTS):
+    """Call func, retrying on the given exceptions with bounded exponential backoff"""
+    delay = RETRY_DELAY
+    for attempt in range(attempts):
+        try:
+            return func()
+        except FileNotFoundError:
+            raise
+        except exceptions:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(delay)
+            delay = min(delay * 2, RETRY_MAX_DELAY)
+
+
+_held_locks = threading.local()
+
+
+@contextmanager
+def file_lock(path):
+    """Hold an exclusive advisory lock on path + '.lock' across processes.
+
+    Re-entrant within a thread, so a locked read-modify-write can call
+    helpers that lock the same file again.
+    """
+    held = _held_locks.__dict__.setdefault('paths', set())
+    lock_path = os.path.abspath(f'{path}.lock')
+    if lock_path in held:
+        yield
+        return
+
+    with open(lock_path, 'a') as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        held.add(lock_path)
+        try:
+            yield
+        finally:
+            held.discard(lock_path)
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def locked(path):
+    """Decorator running a whole read-modify-write function under file_lock(path)"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            with file_lock(path):
+                return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+
+def write_atomic(path, text):
+    """Replace path with text (str or bytes) via a fsynced temp file in the same directory"""
+    metrics.count_file_write()
+    with phase('write'):
+        _write_atomic(path, text)
+
+
+def _write_atomic(path, text):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        # mkstemp creates the file as 0600; keep the permissions of the file being replaced
+        try:
+            mode = os.stat(path).st_mode & 0o777
+        except FileNotFoundError:
+            mode = 0o644
+        os.chmod(tmp_path, mode)
+        with os.fdopen(fd, 'wb' if isinstance(text, bytes) else 'w') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        retry(lambda: os.replace(tmp_path, path))
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def write_json_atomic(path, data, indent=4):
+    write_atomic(path, json.dumps(data, indent=indent))
+
+
+def read_json(path):
+    """Load a JSON file, retrying briefly if it is caught mid-write"""
+    def load():
+        with open(path, 'r') as f:
+            return json.load(f)
+    with phase('load'):
+        return retry(load, exceptions=(OSError, json.JSONDecodeError))
+
+
+def update_json(path, change, default=None):
+    """Read-modify-write a JSON file under its lock and return the new data.
+
+    change(data) edits the data in place; it runs while the lock is held, so
+    concurrent workers updating the same file never drop each other's edits.
+    """
+    with file_lock(path):
+        try:
+            data = read_json(path)
+        except FileNotFoundError:
+            data = default() if callable(default) else {}
+        change(data)
+        write_json_atomic(path, data)
+        return data
@@ -0,0 +1,201 @@
+import copy
+import hashlib
+import json
+import os
+import re
+import threading
+from collections.abc import MutableMapping
+
+from persistence import file_lock, read_json, write_atomic, write_json_atomic
+
+MANIFEST_NAME = 'manifest.json'
+SAFE_ID_RE = re.compile(r'[A-Za-z0-9_-]+')
+
+
+class LazyPost(MutableMapping):
+    """A post whose manifest fields are in memory and whose body is read on first use.
+
+    Title, slug, hidden flag, updated_at and the subsection titles come from the
+    manifest, so listing posts never opens a post file. Any other key (the
+    content, the subsections) loads the whole post first. Lookups of keys the
+    post does not have raise KeyError without touching the disk.
+    """
+
+    MANIFEST_FIELDS = ('title', 'slug', 'hidden', 'updated_at')
+
+    def __init__(self, source, blog_id, entry):
+        self._source = source
+        self._blog_id = blog_id
+        self._entry = entry
+        self._fields = {key: entry[key] for key in self.MANIFEST_FIELDS if key in entry}
+        self._keys = list(entry.get('keys', self._fields))
+        self._loaded = False
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    @property
+    def subsection_titles(self):
+        if self._loaded:
+            return [subsection.get('title', '') for subsection in self._fields.get('subsections', [])]
+        return self._entry.get('subsections', [])
+
+    def manifest_entry(self):
+        return self._entry
+
+    def _load(self):
+        if not self._loaded:
+            body = self._source.read_post(self._blog_id, self._entry['version'])
+            for key, value in body.items():
+                self._fields.setdefault(key, value)
+            self._keys = list(dict.fromkeys(self._keys + list(body)))
+            self._loaded = True
+
+    def __getitem__(self, key):
+        if key not in self._fields:
+            if key not in self._keys:
+                raise KeyError(key)
+            self._load()
+        return self._fields[key]
+
+    def __setitem__(self, key, value):
+        self._load()
+        self._fields[key] = value
+        if key not in self._keys:
+            self._keys.append(key)
+
+    def __delitem__(self, key):
+        self._load()
+        del self._fields[key]
+        self._keys.remove(key)
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __iter__(self):
+        self._load()
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __repr__(self):
+        return f'LazyPost({self._blog_id!r}, loaded={self._loaded})'
+
+
+class PostFileSource:
+    """Blogs stored as one JSON file per post plus a small manifest.
+
+    The manifest (id, title, slug, hidden flag, updated_at, subsection titles and a
+    content version per post) is all that read() parses; post bodies are
+    loaded lazily through LazyPost. Saving a single post rewrites only its own
+    file and the manifest, each through a temp file and rename, with the
+    manifest update done under a file lock so concurrent workers do not drop
+    each other's entries. The stamp is the manifest's (mtime, size).
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, MANIFEST_NAME)
+        self._bodies = {}  # blog_id -> (version, parsed post), shared by manifest reloads
+        self._lock = threading.Lock()
+
+    def _post_path(self, blog_id):
+        name = blog_id if SAFE_ID_RE.fullmatch(blog_id) else hashlib.sha1(blog_id.encode()).hexdigest()
+        return os.path.join(self.directory, 'posts', f'{name}.json')
+
+    def stamp(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _read_manifest(self):
+        try:
+            return read_json(self.path).get('posts', {})
+        except FileNotFoundError:
+            return {}
+
+    def read(self):
+        return {blog_id: LazyPost(self, blog_id, entry)
+                for blog_id, entry in self._read_manifest().items()}
+
+    def read_post(self, blog_id, version):
+        """Parsed post body; callers get their own copy to mutate"""
+        with self._lock:
+            cached = self._bodies.get(blog_id)
+            if cached is None or cached[0] != version:
+                cached = self._bodies[blog_id] = (version, read_json(self._post_path(blog_id)))
+            return copy.deepcopy(cached[1])
+
+    def _write_post(self, blog_id, blog):
+        """Write one post file and return its manifest entry"""
+        if isinstance(blog, LazyPost) and not blog.loaded and blog._source is self:
+            # Untouched since it was read: the file on disk is already current
+            return blog.manifest_entry()
+
+        post = dict(blog)
+        text = json.dumps(post, indent=4)
+        version = hashlib.sha1(text.encode()).hexdigest()
+        path = self._post_path(blog_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_atomic(path, text)
+
+        entry = {key: post[key] for key in LazyPost.MANIFEST_FIELDS if key in post}
+        entry['keys'] = list(post)
+        entry['subsections'] = [subsection.get('title', '') for subsection in post.get('subsections', [])]
+        entry['version'] = version
+        with self._lock:
+            self._bodies[blog_id] = (version, copy.deepcopy(post))
+        return entry
+
+    def _write_manifest(self, posts):
+        write_json_atomic(self.path, {'format': 1, 'posts': posts}, indent=None)
+
+    def write(self, data):
+        os.makedirs(self.directory, exist_ok=True)
+        with file_lock(self.path):
+            old_ids = set(self._read_manifest())
+            posts = {blog_id: self._write_post(blog_id, blog) for blog_id, blog in data.items()}
+            self._write_manifest(posts)
+            for blog_id in old_ids - set(posts):
+                self._remove_post(blog_id)
+
+    def write_item(self, key, value, data):
+        os.makedirs(self.directory, exist_ok=True)
+        with file_lock(self.path):
+            # Re-read so entries saved meanwhile by other workers are kept
+            posts = self._read_manifest()
+            posts[key] = self._write_post(key, value)
+            self._write_manifest(posts)
+        return self._merged(posts, key, value)
+
+    def delete_item(self, key, data):
+        with file_lock(self.path):
+            posts = self._read_manifest()
+            posts.pop(key, None)
+            self._write_manifest(posts)
+            self._remove_post(key)
+        return self._merged(posts)
+
+    def _merged(self, posts, key=None, value=None):
+        """Posts as now on disk, with the just saved post as given"""
+        merged = {blog_id: LazyPost(self, blog_id, entry) for blog_id, entry in posts.items()}
+        if key is not None:
+            merged[key] = value
+        return merged
+
+    def _remove_post(self, blog_id):
+        with self._lock:
+            self._bodies.pop(blog_id, None)
+        try:
+            os.remove(self._post_path(blog_id))
+        except FileNotFoundError:
+            pass
+
+
+def migrate_json_to_post_files(blogs, directory):
+    """Write every post of a blogs.json-style dict into a post files directory"""
+    PostFileSource(directory).write(blogs)
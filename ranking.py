@@ -0,0 +1,123 @@
+import heapq
+import math
+import re
+import time
+
+# Trending windows: name -> decay time constant in seconds. A visit's weight
+# falls to 1/e after one window, so '24h' ranks by roughly the last day.
+DEFAULT_WINDOWS = {'24h': 24 * 3600, '7d': 7 * 24 * 3600}
+
+# Posts whose decayed score drops below this many visits are forgotten
+MIN_SCORE = 0.01
+
+WINDOW_RE = re.compile(r'(\d+)([smhdw])')
+UNIT_SECONDS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 7 * 86400}
+
+
+def parse_windows(text):
+    """Parse a window list such as '24h,7d' into {name: seconds}"""
+    windows = {}
+    for name in filter(None, (part.strip() for part in text.split(','))):
+        match = WINDOW_RE.fullmatch(name)
+        if not match:
+            raise ValueError(f"Invalid trending window: {name}")
+        windows[name] = int(match.group(1)) * UNIT_SECONDS[match.group(2)]
+    return windows
+
+
+# Scores use forward decay: a visit at time t adds e^(t / window) and the
+# score at time now is that sum times e^(-now / window). The sum only ever
+# grows, so rankings can be kept incrementally and scores from several
+# workers combine by addition. Sums are stored as logarithms to stay finite.
+
+def log_add(a, b):
+    """log(e^a + e^b), where None stands for an empty sum"""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    high, low = max(a, b), min(a, b)
+    return high + math.log1p(math.exp(low - high))
+
+
+def visit_score(timestamp, window):
+    """Log-score contributed by one visit at timestamp"""
+    return timestamp / window
+
+
+def decayed(log_score, window, now=None):
+    """Score in decayed visits as of now"""
+    now = time.time() if now is None else now
+    return math.exp(log_score - now / window)
+
+
+def prune_cutoff(window, now=None):
+    """Log-scores below this are worth less than MIN_SCORE visits now"""
+    now = time.time() if now is None else now
+    return now / window + math.log(MIN_SCORE)
+
+
+def merge_scores(scores, other, window=None, now=None):
+    """Add other's log-scores into scores; with a window, drop faded entries"""
+    for key, score in other.items():
+        scores[key] = log_add(scores.get(key), score)
+    if window is not None:
+        cutoff = prune_cutoff(window, now)
+        for key in [key for key, score in scores.items() if score < cutoff]:
+            del scores[key]
+
+
+class TopK:
+    """The k highest scoring keys, for scores that only ever increase.
+
+    Members live in a dict next to a min-heap of (score, key); the heap root
+    is the entry a newcomer has to beat. Raising a member's score pushes a
+    new heap entry and leaves the old one to be skipped lazily, so update()
+    is O(log k) and items() is O(k log k) regardless of how many keys exist.
+    """
+
+    def __init__(self, k, scores=None):
+        self.k = k
+        self._members = {}
+        self._heap = []
+        if scores:
+            for key, score in heapq.nlargest(k, scores.items(), key=lambda item: item[1]):
+                self._members[key] = score
+            self._rebuild()
+
+    def _rebuild(self):
+        self._heap = [(score, key) for key, score in self._members.items()]
+        heapq.heapify(self._heap)
+
+    def _floor(self):
+        while self._heap:
+            score, key = self._heap[0]
+            if self._members.get(key) == score:
+                return score, key
+            heapq.heappop(self._heap)
+        return None
+
+    def update(self, key, score):
+        """Record a key's new (higher) score"""
+        if key in self._members:
+            self._members[key] = score
+            heapq.heappush(self._heap, (score, key))
+            if len(self._heap) > 4 * self.k + 16:
+                self._rebuild()
+            return
+
+        if len(self._members) < self.k:
+            self._members[key] = score
+            heapq.heappush(self._heap, (score, key))
+            return
+
+        floor = self._floor()
+        if floor is not None and score > floor[0]:
+            heapq.heappop(self._heap)
+            del self._members[floor[1]]
+            self._members[key] = score
+            heapq.heappush(self._heap, (score, key))
+
+    def items(self):
+        """[(key, score)], highest first"""
+        return sorted(self._members.items(), key=lambda item: item[1], reverse=True)
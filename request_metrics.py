@@ -0,0 +1,220 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Phase name -> seconds spent in it, for the request running in this context
+_phases = ContextVar('request_phases', default=None)
+_started = ContextVar('request_started', default=None)
+_active = ContextVar('active_phases', default=frozenset())
+# PhaseTimer name -> start times of the timers still running
+_open = ContextVar('open_timers', default=None)
+
+
+def begin_request():
+    """Start timing a request; phases entered from now on are added to it"""
+    _phases.set({})
+    _started.set(time.perf_counter())
+    _active.set(frozenset())
+    _open.set({})
+
+
+def end_request():
+    """(elapsed seconds, {phase: seconds}) of the current request, and stop timing it"""
+    phases, started = _phases.get(), _started.get()
+    _phases.set(None)
+    _started.set(None)
+    _open.set(None)
+    if phases is None or started is None:
+        return None
+    return time.perf_counter() - started, phases
+
+
+def request_timing():
+    """(elapsed seconds, {phase: seconds}) so far, or None outside a timed request"""
+    phases, started = _phases.get(), _started.get()
+    if phases is None or started is None:
+        return None
+    return time.perf_counter() - started, dict(phases)
+
+
+@contextmanager
+def phase(name):
+    """Add the time spent in the block to the current request's phase.
+
+    A no-op outside a timed request (background threads, CLI commands).
+    Re-entering a phase that is already running is not counted twice, but
+    different phases may overlap, e.g. a template that loads data.
+    """
+    phases = _phases.get()
+    active = _active.get()
+    if phases is None or name in active:
+        yield
+        return
+    token = _active.set(active | {name})
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases[name] = phases.get(name, 0.0) + time.perf_counter() - started
+        _active.reset(token)
+
+
+class PhaseTimer:
+    """Phase timing for code with separate start and end callbacks (signals)"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def start(self):
+        running = _open.get()
+        if running is not None:
+            running.setdefault(self.name, []).append(time.perf_counter())
+
+    def stop(self):
+        running, phases = _open.get(), _phases.get()
+        starts = running.get(self.name) if running is not None else None
+        if not starts:
+            return
+        started = starts.pop()
+        # Only the outermost one counts, nested ones are part of it
+        if not starts and phases is not None:
+            phases[self.name] = phases.get(self.name, 0.0) + time.perf_counter() - started
+
+
+def server_timing(total, phases):
+    """Server-Timing header value, durations in milliseconds"""
+    entries = [f'{name};dur={seconds * 1000:.2f}' for name, seconds in sorted(phases.items())]
+    entries.append(f'total;dur={total * 1000:.2f}')
+    return ', '.join(entries)
+
+
+class TimingMiddleware:
+    """WSGI middleware timing each request from before Flask routes it"""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        begin_request()
+        try:
+            return self.wsgi_app(environ, start_response)
+        finally:
+            end_request()
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count, as Prometheus histograms keep them"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            yield bound, total
+
+
+class RequestMetrics:
+    """Per-endpoint request and phase histograms, kept per worker process.
+
+    Every gunicorn worker has its own copy, so a scrape of /metrics shows
+    the worker that answered it (its pid is the 'worker' label).
+    """
+
+    def __init__(self, prefix='blog'):
+        self.prefix = prefix
+        self.histograms = {}  # (endpoint, phase) -> Histogram
+        self.responses = {}  # (endpoint, status) -> count
+        self.file_writes = 0
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint, status, total, phases):
+        with self._lock:
+            self.responses[(endpoint, status)] = self.responses.get((endpoint, status), 0) + 1
+            for name, seconds in list(phases.items()) + [('total', total)]:
+                histogram = self.histograms.get((endpoint, name))
+                if histogram is None:
+                    histogram = self.histograms[(endpoint, name)] = Histogram()
+                histogram.observe(seconds)
+
+    def count_file_write(self):
+        with self._lock:
+            self.file_writes += 1
+
+    def render(self, caches=None, gauges=None, worker=None):
+        """Prometheus text exposition of the metrics.
+
+        caches maps a cache name to its stats() dict (hits, misses, hit_ratio,
+        entries and optionally bytes); gauges maps extra metric names to
+        (help, type, value).
+        """
+        p = self.prefix
+        labels = f'worker="{worker}",' if worker is not None else ''
+        lines = []
+
+        def header(name, help_text, kind):
+            lines.append(f'# HELP {p}_{name} {help_text}')
+            lines.append(f'# TYPE {p}_{name} {kind}')
+
+        with self._lock:
+            header('request_duration_seconds', 'Time spent per request and phase', 'histogram')
+            for (endpoint, name), histogram in sorted(self.histograms.items()):
+                series = f'{labels}endpoint="{_escape(endpoint)}",phase="{name}"'
+                for bound, count in histogram.cumulative():
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{p}_request_duration_seconds_bucket{{{series},le="{le}"}} {count}')
+                lines.append(f'{p}_request_duration_seconds_sum{{{series}}} {histogram.sum:.6f}')
+                lines.append(f'{p}_request_duration_seconds_count{{{series}}} {histogram.count}')
+
+            header('responses_total', 'Responses sent per endpoint and status', 'counter')
+            for (endpoint, status), count in sorted(self.responses.items()):
+                lines.append(f'{p}_responses_total{{{labels}endpoint="{_escape(endpoint)}",status="{status}"}} {count}')
+
+            header('file_writes_total', 'Data files replaced on disk', 'counter')
+            lines.append(f'{p}_file_writes_total{_braces(labels)} {self.file_writes}')
+
+        if caches:
+            for name, kind, field in (('cache_hits_total', 'counter', 'hits'),
+                                      ('cache_misses_total', 'counter', 'misses'),
+                                      ('cache_hit_ratio', 'gauge', 'hit_ratio'),
+                                      ('cache_entries', 'gauge', 'entries'),
+                                      ('cache_bytes', 'gauge', 'bytes')):
+                values = [(cache, stats[field]) for cache, stats in caches.items() if field in stats]
+                if not values:
+                    continue
+                header(name, f'Cache {field.replace("_", " ")}', kind)
+                for cache, value in values:
+                    lines.append(f'{p}_{name}{{{labels}cache="{cache}"}} {value}')
+
+        for name, (help_text, kind, value) in (gauges or {}).items():
+            header(name, help_text, kind)
+            lines.append(f'{p}_{name}{_braces(labels)} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def _braces(labels):
+    labels = labels.rstrip(',')
+    return f'{{{labels}}}' if labels else ''
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+# Shared by the app and the persistence layer, which counts its writes here
+metrics = RequestMetrics()
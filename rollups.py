@@ -0,0 +1,162 @@
+import bisect
+import time
+from datetime import date, datetime, timedelta
+
+from hyperloglog import HyperLogLog
+
+GRANULARITIES = ('hour', 'day', 'week', 'month')
+
+# Hourly buckets are dropped after this many days; days, weeks and months are kept
+HOURLY_RETENTION_DAYS = 90
+
+# Charts never get more points than this; longer series are merged into wider buckets
+MAX_POINTS = 120
+
+
+def hour_key(timestamp):
+    return time.strftime('%Y-%m-%dT%H', time.localtime(timestamp))
+
+
+def week_key(day):
+    """Monday of the ISO week containing a YYYY-MM-DD day"""
+    d = date.fromisoformat(day)
+    return (d - timedelta(days=d.weekday())).isoformat()
+
+
+def month_key(day):
+    return day[:7]
+
+
+def bucket_keys(day, timestamp):
+    """Rollup buckets a visit falls into, besides its day"""
+    return {'hour': hour_key(timestamp), 'week': week_key(day), 'month': month_key(day)}
+
+
+def default_rollups():
+    return {'hour': {}, 'week': {}, 'month': {}}
+
+
+def backfill_rollups(daily_visits):
+    """Week and month rollups rebuilt from daily counts (hours can't be recovered)"""
+    rollups = default_rollups()
+    for day, count in sorted(daily_visits.items()):
+        for granularity, key in (('week', week_key(day)), ('month', month_key(day))):
+            rollups[granularity][key] = rollups[granularity].get(key, 0) + count
+    return rollups
+
+
+def hourly_cutoff(now=None):
+    """Oldest hourly bucket key still kept"""
+    now = time.time() if now is None else now
+    return hour_key(now - HOURLY_RETENTION_DAYS * 86400)
+
+
+def prune_hours(hours, now=None):
+    """Drop hourly buckets older than HOURLY_RETENTION_DAYS, in whatever order the keys are"""
+    cutoff = hourly_cutoff(now)
+    for key in [key for key in hours if key < cutoff]:
+        del hours[key]
+
+
+def _key_of(granularity, day, end=False):
+    if granularity == 'hour':
+        return f"{day}T{'23' if end else '00'}"
+    if granularity == 'week':
+        return week_key(day)
+    if granularity == 'month':
+        return month_key(day)
+    return day
+
+
+def _next_key(granularity, key):
+    if granularity == 'hour':
+        return (datetime.strptime(key, '%Y-%m-%dT%H') + timedelta(hours=1)).strftime('%Y-%m-%dT%H')
+    if granularity == 'month':
+        year, month = int(key[:4]), int(key[5:7])
+        return f'{year + month // 12:04d}-{month % 12 + 1:02d}'
+    step = 7 if granularity == 'week' else 1
+    return (date.fromisoformat(key) + timedelta(days=step)).isoformat()
+
+
+def _last_day(granularity, key):
+    """Last YYYY-MM-DD day covered by a bucket"""
+    if granularity == 'hour':
+        return key[:10]
+    if granularity == 'day':
+        return key
+    if granularity == 'week':
+        return (date.fromisoformat(key) + timedelta(days=6)).isoformat()
+    return (date.fromisoformat(_next_key('month', key) + '-01') - timedelta(days=1)).isoformat()
+
+
+def _first_day(granularity, key):
+    return f'{key}-01' if granularity == 'month' else key[:10]
+
+
+class _DailyUniques:
+    """Unique visitor estimates for day ranges, from the daily sketches"""
+
+    def __init__(self, visitors):
+        self.sketches = visitors['daily_unique_sketches']
+        self.counts = visitors['daily_unique_visitors']
+        self.days = sorted(self.sketches)
+
+    def count(self, first_day, last_day):
+        if first_day == last_day and first_day in self.counts:
+            return self.counts[first_day]
+        merged = None
+        start = bisect.bisect_left(self.days, first_day)
+        end = bisect.bisect_right(self.days, last_day)
+        for day in self.days[start:end]:
+            sketch = HyperLogLog.deserialize(self.sketches[day])
+            if merged is None:
+                merged = sketch
+            else:
+                merged.merge(sketch)
+        return merged.count() if merged is not None else 0
+
+
+def series(visitors, granularity='day', start_day=None, end_day=None, max_points=MAX_POINTS):
+    """Visits (and unique visitors, except hourly) per bucket for a day range.
+
+    Empty buckets inside the range are reported as zero. When there are more
+    than max_points buckets, runs of consecutive buckets are merged so the
+    result never exceeds max_points; visits add up and unique visitors are
+    re-estimated over the merged span.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity: {granularity}")
+    if granularity == 'day':
+        counts = visitors['daily_visits']
+    else:
+        counts = visitors.get('visit_rollups', {}).get(granularity, {})
+
+    if not counts:
+        return {'granularity': granularity, 'bucket_size': 1, 'points': []}
+    first = _key_of(granularity, start_day) if start_day else min(counts)
+    last = _key_of(granularity, end_day, end=True) if end_day else max(counts)
+    # Never walk past the data that exists, whatever range was asked for
+    first, last = max(first, min(counts)), min(last, max(counts))
+
+    keys = []
+    key = first
+    while key <= last:
+        keys.append(key)
+        key = _next_key(granularity, key)
+
+    bucket_size = max(1, -(-len(keys) // max(1, max_points)))
+    uniques = _DailyUniques(visitors) if granularity != 'hour' else None
+    points = []
+    for index in range(0, len(keys), bucket_size):
+        chunk = keys[index:index + bucket_size]
+        point = {
+            'bucket': chunk[0],
+            'end': chunk[-1],
+            'visits': sum(counts.get(key, 0) for key in chunk),
+            'unique_visitors': None
+        }
+        if uniques is not None:
+            point['unique_visitors'] = uniques.count(_first_day(granularity, chunk[0]),
+                                                     _last_day(granularity, chunk[-1]))
+        points.append(point)
+    return {'granularity': granularity, 'bucket_size': bucket_size, 'points': points}
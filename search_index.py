@@ -0,0 +1,264 @@
+import hashlib
+import heapq
+import math
+import re
+import threading
+from collections import OrderedDict
+from operator import itemgetter
+
+from markupsafe import Markup, escape
+
+TOKEN_RE = re.compile(r'[a-z0-9_]+')
+FENCED_CODE_RE = re.compile(r'```[^\n]*\n(.*?)(?:```|$)', re.S)
+INLINE_CODE_RE = re.compile(r'`([^`\n]+)`')
+MARKDOWN_RE = re.compile(r'[#*_>\[\]()!|~-]+')
+
+# Title terms count more than body text when ranking
+TITLE_WEIGHT = 3
+
+# Posting weights use the average document length from when they were computed;
+# all are recomputed once the real average has moved this far (a fraction) from it
+REWEIGHT_DRIFT = 0.1
+
+# Terms whose postings are also kept ordered by weight, most recently searched first
+ORDERED_TERMS = 1024
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+def split_markdown(text):
+    """Return (prose, code) for a Markdown document"""
+    code = FENCED_CODE_RE.findall(text)
+    prose = FENCED_CODE_RE.sub(' ', text)
+    code += INLINE_CODE_RE.findall(prose)
+    prose = INLINE_CODE_RE.sub(r' \1 ', prose)
+    prose = MARKDOWN_RE.sub(' ', prose)
+    return ' '.join(prose.split()), '\n'.join(code)
+
+
+def blog_fingerprint(blog):
+    h = hashlib.sha1()
+    for part in [blog.get('title', ''), blog.get('content', '')]:
+        h.update(part.encode())
+        h.update(b'\0')
+    for subsection in blog.get('subsections', []):
+        h.update(subsection.get('title', '').encode())
+        h.update(b'\0')
+        h.update(subsection.get('content', '').encode())
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+class SearchIndex:
+    """BM25-ranked inverted index over posts and their subsections.
+
+    Every post contributes one document for its main content and one per
+    subsection, so results can deep link to ``#subsection-N``. index_blog()
+    and remove_blog() update the postings for a single post; sync() brings
+    the index in line with a blogs dict by re-indexing only the posts whose
+    content fingerprint changed (e.g. after another worker edited them).
+
+    Postings hold each document's BM25 term weight, computed when it is
+    indexed, so a query only adds up idf * weight. Queries walk the postings
+    of their terms from the highest weight down and stop once no document
+    not seen yet can beat the current top results (Fagin's threshold
+    algorithm), so common terms never cost a scan of every match.
+    """
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}  # term -> {doc_key: BM25 term weight}
+        self.docs = {}  # doc_key -> {'length', 'counts', 'title', 'text'}
+        self.blog_docs = {}  # blog_id -> [doc_key, ...]
+        self.fingerprints = {}  # blog_id -> content fingerprint
+        self.total_length = 0
+        self.weighted_length = None  # average document length the weights use
+        self._ordered = OrderedDict()  # term -> [(doc_key, weight), ...] highest first
+        self._synced = None
+        self._lock = threading.RLock()
+
+    def _weights(self, counts, length):
+        """BM25 weight of every term in a document, with its length normalization computed once"""
+        k1 = self.k1
+        norm = k1 * (1 - self.b + self.b * length / self.weighted_length) if self.weighted_length else k1
+        return {term: count * (k1 + 1) / (count + norm) for term, count in counts.items()}
+
+    def _add_doc(self, doc_key, title, body):
+        prose, code = split_markdown(body)
+        counts = {}
+        for term in tokenize(title):
+            counts[term] = counts.get(term, 0) + TITLE_WEIGHT
+        for term in tokenize(prose) + tokenize(code):
+            counts[term] = counts.get(term, 0) + 1
+        length = sum(counts.values())
+        for term, weight in self._weights(counts, length).items():
+            self.postings.setdefault(term, {})[doc_key] = weight
+            self._ordered.pop(term, None)
+        self.docs[doc_key] = {'length': length, 'counts': counts, 'title': title,
+                              'text': f'{prose}\n{code}'.strip()}
+        self.total_length += length
+
+    def _remove_docs(self, blog_id):
+        for doc_key in self.blog_docs.pop(blog_id, []):
+            doc = self.docs.pop(doc_key)
+            self.total_length -= doc['length']
+            for term in doc['counts']:
+                self._ordered.pop(term, None)
+                postings = self.postings.get(term)
+                if postings is not None:
+                    postings.pop(doc_key, None)
+                    if not postings:
+                        del self.postings[term]
+
+    def _reweight(self):
+        """Recompute every weight if the average document length moved too far from theirs"""
+        if not self.docs:
+            return
+        average = self.total_length / len(self.docs)
+        if self.weighted_length and abs(average - self.weighted_length) <= REWEIGHT_DRIFT * self.weighted_length:
+            return
+        self.weighted_length = average
+        for doc_key, doc in self.docs.items():
+            for term, weight in self._weights(doc['counts'], doc['length']).items():
+                self.postings[term][doc_key] = weight
+        self._ordered.clear()
+
+    def _ordered_postings(self, term):
+        ordered = self._ordered.get(term)
+        if ordered is None:
+            ordered = self._ordered[term] = sorted(self.postings[term].items(), key=itemgetter(1), reverse=True)
+            if len(self._ordered) > ORDERED_TERMS:
+                self._ordered.popitem(last=False)
+        else:
+            self._ordered.move_to_end(term)
+        return ordered
+
+    def index_blog(self, blog_id, blog):
+        """Add or replace one post's documents"""
+        with self._lock:
+            fingerprint = blog_fingerprint(blog)
+            if self.fingerprints.get(blog_id) == fingerprint:
+                return
+            self._remove_docs(blog_id)
+            keys = [(blog_id, None)]
+            self._add_doc((blog_id, None), blog.get('title', ''), blog.get('content', ''))
+            for index, subsection in enumerate(blog.get('subsections', [])):
+                keys.append((blog_id, index))
+                self._add_doc((blog_id, index), subsection.get('title', ''), subsection.get('content', ''))
+            self.blog_docs[blog_id] = keys
+            self.fingerprints[blog_id] = fingerprint
+
+    def remove_blog(self, blog_id):
+        with self._lock:
+            self._remove_docs(blog_id)
+            self.fingerprints.pop(blog_id, None)
+
+    def invalidate(self):
+        """Make the next sync() compare every post again"""
+        self._synced = None
+
+    def sync(self, blogs):
+        """Re-index only posts that differ from the given blogs dict"""
+        if blogs is self._synced:
+            return
+        with self._lock:
+            for blog_id in list(self.fingerprints):
+                if blog_id not in blogs:
+                    self.remove_blog(blog_id)
+            for blog_id, blog in blogs.items():
+                self.index_blog(blog_id, blog)
+            self._synced = blogs
+
+    def search(self, query, blogs, limit=20, visible=None):
+        """Return the best matching documents for query, best first"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        self.sync(blogs)
+
+        with self._lock:
+            self._reweight()
+            n = len(self.docs)
+            lists = []
+            for term in terms:
+                postings = self.postings.get(term)
+                if postings:
+                    idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                    lists.append((idf, postings, self._ordered_postings(term)))
+
+            def shown(doc_key):
+                blog = blogs.get(doc_key[0])
+                return blog is not None and (not visible or visible(blog))
+
+            results = []
+            for score, doc_key in self._top(lists, limit, shown):
+                blog_id, section = doc_key
+                blog = blogs[blog_id]
+                doc = self.docs[doc_key]
+                results.append({
+                    'blog_id': blog_id,
+                    'section': section,
+                    'blog_title': blog.get('title', ''),
+                    'title': doc['title'],
+                    'anchor': f'subsection-{section}' if section is not None else '',
+                    'snippet': highlight(doc['text'], terms),
+                    'score': score
+                })
+            return results
+
+    @staticmethod
+    def _top(lists, limit, shown):
+        """[(score, doc_key), ...] of the limit best documents shown() accepts, best first.
+
+        lists holds (idf, {doc_key: weight}, postings ordered by weight) per
+        term. Each round takes the next posting of every term; a document
+        seen for the first time is scored in full. Once limit documents
+        score at least the sum of the weights at the current depth, nothing
+        further down can beat them.
+        """
+        heap = []  # (score, -first seen, doc_key), the worst result on top
+        seen = set()
+        depth = 0
+        longest = max((len(ordered) for _, _, ordered in lists), default=0) if limit > 0 else 0
+        while depth < longest:
+            threshold = 0.0
+            for idf, _, ordered in lists:
+                if depth >= len(ordered):
+                    continue
+                doc_key, weight = ordered[depth]
+                threshold += idf * weight
+                if doc_key in seen:
+                    continue
+                seen.add(doc_key)
+                if not shown(doc_key):
+                    continue
+                entry = (sum(i * postings.get(doc_key, 0.0) for i, postings, _ in lists), -len(seen), doc_key)
+                if len(heap) < limit:
+                    heapq.heappush(heap, entry)
+                elif entry > heap[0]:
+                    heapq.heapreplace(heap, entry)
+            depth += 1
+            if len(heap) >= limit and heap[0][0] >= threshold:
+                break
+        return [(score, doc_key) for score, _, doc_key in sorted(heap, reverse=True)]
+
+
+def highlight(text, terms, width=160):
+    """Escaped snippet around the first matching term with matches in <mark>"""
+    pattern = re.compile(r'\b(' + '|'.join(re.escape(term) for term in terms) + r')', re.I)
+    match = pattern.search(text)
+    start = max(0, match.start() - width // 3) if match else 0
+    snippet = text[start:start + width]
+    parts = []
+    last = 0
+    for m in pattern.finditer(snippet):
+        parts.append(escape(snippet[last:m.start()]))
+        parts.append(Markup('<mark>%s</mark>') % m.group(0))
+        last = m.end()
+    parts.append(escape(snippet[last:]))
+    prefix = '…' if start > 0 else ''
+    suffix = '…' if start + width < len(text) else ''
+    return Markup(prefix) + Markup('').join(parts) + Markup(suffix)
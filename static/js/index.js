@@ -1,44 +1,175 @@
-function toggleGroup(groupId) {
-    console.log('Toggling group:', groupId); // Debug log
-    const content = document.getElementById('group-content-' + groupId);
-    const icon = document.getElementById('group-icon-' + groupId);
-    
-    if (!content || !icon) {
-        console.error('Element not found for group:', groupId);
+// Group and subsection lists are fetched from the JSON API on first expand,
+// so the index page stays small however many posts there are.
+function loadList(container, render) {
+    if (!container.dataset.src || container.dataset.loaded) {
         return;
     }
-    
-    if (content.style.display === 'block' || content.style.display === '') {
+    container.dataset.loaded = 'true';
+    const target = container.querySelector('.blog-list') || container;
+    target.innerHTML = '<p class="loading-message">Loading...</p>';
+
+    fetch(container.dataset.src, { credentials: 'same-origin' })
+        .then(response => {
+            if (!response.ok) {
+                throw new Error('HTTP ' + response.status);
+            }
+            return response.json();
+        })
+        .then(data => {
+            target.innerHTML = '';
+            render(target, data);
+        })
+        .catch(error => {
+            console.error('Error loading', container.dataset.src, error);
+            delete container.dataset.loaded;
+            target.innerHTML = '<p class="loading-message">Could not load. Try again.</p>';
+        });
+}
+
+function renderSubsections(target, data) {
+    data.subsections.forEach(subsection => {
+        const link = document.createElement('a');
+        link.href = subsection.url;
+        link.className = 'subsection-link';
+        link.textContent = subsection.title;
+        target.appendChild(link);
+    });
+}
+
+function renderGroupBlogs(target, data) {
+    if (!data.blogs.length) {
+        target.innerHTML = '<p class="no-blogs-message">No blogs in this group yet.</p>';
+        return;
+    }
+    data.blogs.forEach(blog => {
+        const item = document.createElement('div');
+        item.className = 'blog-item';
+
+        const title = document.createElement('a');
+        title.href = blog.url;
+        title.className = 'blog-title';
+        title.textContent = blog.title;
+        item.appendChild(title);
+
+        if (blog.subsection_count) {
+            const subsections = document.createElement('div');
+            subsections.className = 'subsections';
+            subsections.style.display = 'none';
+            subsections.dataset.src = blog.subsections_url;
+
+            const button = document.createElement('button');
+            button.className = 'toggle-btn';
+            const icon = document.createElement('i');
+            icon.className = 'fas fa-chevron-down';
+            button.appendChild(icon);
+            button.addEventListener('click', () => toggleList(subsections, icon, renderSubsections));
+
+            item.appendChild(button);
+            item.appendChild(subsections);
+        }
+        target.appendChild(item);
+    });
+}
+
+function toggleList(content, icon, render) {
+    if (content.style.display === 'block') {
         content.style.display = 'none';
         icon.className = 'fas fa-chevron-down';
     } else {
+        loadList(content, render);
         content.style.display = 'block';
         icon.className = 'fas fa-chevron-up';
     }
 }
 
+function toggleGroup(groupId) {
+    const content = document.getElementById('group-content-' + groupId);
+    const icon = document.getElementById('group-icon-' + groupId);
+    if (!content || !icon) {
+        console.error('Element not found for group:', groupId);
+        return;
+    }
+    toggleList(content, icon, renderGroupBlogs);
+}
+
 function toggleSubsections(blogId) {
-    console.log('Toggling subsections for blog:', blogId); // Debug log
     const content = document.getElementById('subsections-' + blogId);
     const icon = document.getElementById('icon-' + blogId);
-    
     if (!content || !icon) {
         console.error('Element not found for blog:', blogId);
         return;
     }
-    
-    if (content.style.display === 'block' || content.style.display === '') {
-        content.style.display = 'none';
-        icon.className = 'fas fa-chevron-down';
-    } else {
-        content.style.display = 'block';
-        icon.className = 'fas fa-chevron-up';
+    toggleList(content, icon, renderSubsections);
+}
+
+// Popular/Trending widget: rankings come from the API so the page itself
+// can be cached while the counts keep moving.
+function renderRankingList(list, posts, unit) {
+    list.innerHTML = '';
+    if (!posts.length) {
+        list.innerHTML = '<li class="loading-message">No visits yet.</li>';
+        return;
     }
+    posts.forEach(post => {
+        const item = document.createElement('li');
+        const link = document.createElement('a');
+        link.href = post.url;
+        link.textContent = post.title;
+        const score = document.createElement('span');
+        score.className = 'ranking-score';
+        score.textContent = (unit === 'visits' ? post.score : post.score.toFixed(1)) + ' ' + unit;
+        item.appendChild(link);
+        item.appendChild(score);
+        list.appendChild(item);
+    });
+}
+
+function loadRankings() {
+    const section = document.getElementById('rankings');
+    if (!section || !section.dataset.src) {
+        return;
+    }
+    fetch(section.dataset.src, { credentials: 'same-origin' })
+        .then(response => {
+            if (!response.ok) {
+                throw new Error('HTTP ' + response.status);
+            }
+            return response.json();
+        })
+        .then(data => {
+            const tabs = section.querySelector('.rankings-tabs');
+            const list = section.querySelector('.rankings-list');
+            const views = [{ label: 'Popular', posts: data.popular, unit: 'visits' }];
+            Object.keys(data.trending).forEach(name => {
+                views.push({ label: 'Trending ' + name, posts: data.trending[name], unit: 'recent' });
+            });
+            if (!views.some(view => view.posts.length)) {
+                return;
+            }
+
+            views.forEach((view, index) => {
+                const tab = document.createElement('button');
+                tab.className = 'rankings-tab';
+                tab.textContent = view.label;
+                tab.addEventListener('click', () => {
+                    tabs.querySelectorAll('.rankings-tab').forEach(other => other.classList.remove('active'));
+                    tab.classList.add('active');
+                    renderRankingList(list, view.posts, view.unit);
+                });
+                tabs.appendChild(tab);
+                if (index === 0) {
+                    tab.click();
+                }
+            });
+            section.style.display = 'block';
+        })
+        .catch(error => console.error('Error loading rankings', error));
 }
 
 // Add click event to group headers for better UX
 document.addEventListener('DOMContentLoaded', function() {
-    // Add click event to all group headers
+    loadRankings();
+
     const groupHeaders = document.querySelectorAll('.group-header');
     groupHeaders.forEach(header => {
         header.addEventListener('click', function(e) {
@@ -52,28 +183,3 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
 });
-
-function toggleGroup(groupId) {
-    const content = document.getElementById('group-content-' + groupId);
-    const icon = document.getElementById('group-icon-' + groupId);
-    if (content.style.display === 'block') {
-        content.style.display = 'none';
-        icon.className = 'fas fa-chevron-down';
-    } else {
-        content.style.display = 'block';
-        icon.className = 'fas fa-chevron-up';
-    }
-}
-
-// Keep the existing toggleSubsections function
-function toggleSubsections(blogId) {
-    const content = document.getElementById('subsections-' + blogId);
-    const icon = document.getElementById('icon-' + blogId);
-    if (content.style.display === 'block') {
-        content.style.display = 'none';
-        icon.className = 'fas fa-chevron-down';
-    } else {
-        content.style.display = 'block';
-        icon.className = 'fas fa-chevron-up';
-    }
-}
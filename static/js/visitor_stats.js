@@ -6,17 +6,30 @@ document.addEventListener('DOMContentLoaded', function() {
     initVisitorMetricsChart();
     initVisitTrendsChart();
     
+    // Time series come from the rollup endpoint, already downsampled
+    initGranularityButtons();
+    loadSeries('day');
+    
     // Add refresh functionality
     initRefreshButton();
 });
 
+const timeSeriesCharts = {};
+
+const GRANULARITY_TITLES = {
+    hour: 'Hourly Visits Overview',
+    day: 'Daily Visits Overview',
+    week: 'Weekly Visits Overview',
+    month: 'Monthly Visits Overview'
+};
+
 function initDailyVisitsChart() {
     const ctx = document.getElementById('dailyVisitsChart');
     if (!ctx) return;
 
-    const chartData = parseDailyVisitsData();
+    const chartData = { labels: [], visits: [] };
     
-    new Chart(ctx, {
+    timeSeriesCharts.visits = new Chart(ctx, {
         type: 'bar',
         data: {
             labels: chartData.labels,
@@ -234,9 +247,9 @@ function initVisitTrendsChart() {
     const ctx = document.getElementById('visitTrendsChart');
     if (!ctx) return;
 
-    const trendData = parseVisitTrendsData();
+    const trendData = { labels: [], totalVisits: [], uniqueVisitors: [] };
     
-    new Chart(ctx, {
+    timeSeriesCharts.trends = new Chart(ctx, {
         type: 'line',
         data: {
             labels: trendData.labels,
@@ -307,23 +320,65 @@ function initVisitTrendsChart() {
     });
 }
 
-// Data parsing functions
-function parseDailyVisitsData() {
-    const dailyItems = document.querySelectorAll('.daily-stat-item');
-    const labels = [];
-    const visits = [];
+// Time series loading
+function seriesLabel(point, granularity) {
+    const label = granularity === 'hour' ? point.bucket.replace('T', ' ') + ':00' : point.bucket;
+    return point.end !== point.bucket ? label + ' …' : label;
+}
 
-    dailyItems.forEach(item => {
-        const date = item.querySelector('.date').textContent;
-        const visitCount = parseInt(item.querySelector('.visit-count').textContent);
-        
-        labels.push(date);
-        visits.push(visitCount);
-    });
+function loadSeries(granularity) {
+    const grid = document.getElementById('chartsGrid');
+    if (!grid || !grid.dataset.src) return;
+
+    const params = new URLSearchParams({ granularity: granularity });
+    if (grid.dataset.from) params.set('from', grid.dataset.from);
+    if (grid.dataset.to) params.set('to', grid.dataset.to);
+
+    fetch(grid.dataset.src + '?' + params.toString(), { credentials: 'same-origin' })
+        .then(response => {
+            if (!response.ok) {
+                throw new Error('HTTP ' + response.status);
+            }
+            return response.json();
+        })
+        .then(data => {
+            const labels = data.points.map(point => seriesLabel(point, granularity));
+            const visits = data.points.map(point => point.visits);
+
+            const visitsChart = timeSeriesCharts.visits;
+            if (visitsChart) {
+                visitsChart.data.labels = labels;
+                visitsChart.data.datasets[0].data = visits;
+                visitsChart.options.plugins.title.text = GRANULARITY_TITLES[granularity];
+                visitsChart.update();
+            }
+
+            const trendsChart = timeSeriesCharts.trends;
+            if (trendsChart) {
+                trendsChart.data.labels = labels;
+                trendsChart.data.datasets[0].data = visits;
+                // Hourly buckets have no unique visitor estimate
+                trendsChart.data.datasets[1].data = data.points.map(point => point.unique_visitors);
+                trendsChart.data.datasets[1].hidden = granularity === 'hour';
+                trendsChart.update();
+            }
+        })
+        .catch(error => console.error('Error loading visit series', error));
+}
 
-    return { labels: labels.reverse(), visits: visits.reverse() };
+function initGranularityButtons() {
+    const buttons = document.querySelectorAll('.granularity-btn');
+    buttons.forEach(button => {
+        button.addEventListener('click', function() {
+            buttons.forEach(other => other.classList.remove('active'));
+            this.classList.add('active');
+            loadSeries(this.dataset.granularity);
+        });
+    });
 }
 
+// Data parsing functions
+
 function parseBlogPopularityData() {
     const blogItems = document.querySelectorAll('.popular-blog-item');
     const labels = [];
@@ -358,29 +413,6 @@ function parseVisitorMetricsData() {
     return metrics;
 }
 
-function parseVisitTrendsData() {
-    const dailyItems = document.querySelectorAll('.daily-stat-item');
-    const labels = [];
-    const totalVisits = [];
-    const uniqueVisitors = [];
-
-    dailyItems.forEach(item => {
-        const date = item.querySelector('.date').textContent;
-        const visitCount = parseInt(item.querySelector('.visit-count').textContent);
-        
-        labels.push(date);
-        totalVisits.push(visitCount);
-        // For demo purposes, unique visitors is estimated
-        uniqueVisitors.push(Math.max(1, Math.round(visitCount * 0.7)));
-    });
-
-    return {
-        labels: labels.reverse(),
-        totalVisits: totalVisits.reverse(),
-        uniqueVisitors: uniqueVisitors.reverse()
-    };
-}
-
 function initRefreshButton() {
     const refreshBtn = document.getElementById('refreshStats');
     if (refreshBtn) {
@@ -401,6 +433,7 @@ if (typeof module !== 'undefined' && module.exports) {
         initDailyVisitsChart,
         initBlogPopularityChart,
         initVisitorMetricsChart,
-        initVisitTrendsChart
+        initVisitTrendsChart,
+        loadSeries
     };
 }
\ No newline at end of file
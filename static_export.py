@@ -0,0 +1,212 @@
+import hashlib
+import importlib
+import json
+import multiprocessing
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qs
+
+from persistence import read_json, write_atomic, write_json_atomic
+
+# Set in the WSGI environ of export requests so they are not counted as visits
+EXPORT_ENVIRON_KEY = 'blog.static_export'
+
+# Output path -> fingerprint of the data the page was rendered from
+MANIFEST_FILE = '.export-manifest.json'
+
+# Pages each export worker renders per task
+BATCH_SIZE = 25
+
+
+def output_path(url):
+    """File an exported URL is written to, relative to the output directory.
+
+    '/' is index.html and '/?page=N' indexN.html, JSON API URLs get a .json
+    suffix and every other page becomes <path>/index.html, which is what
+    the nginx configuration in the README serves.
+    """
+    path, _, query = url.partition('?')
+    if path == '/':
+        return 'index%s.html' % parse_qs(query).get('page', [''])[0]
+    path = path.strip('/')
+    if path.startswith('api/'):
+        return f'{path}.json'
+    return f'{path}/index.html'
+
+
+def fingerprint(*parts):
+    """Stable hash of JSON-serializable data"""
+    text = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def tree_fingerprint(*paths):
+    """Hash of the names and contents of every file under paths (files or directories)"""
+    digest = hashlib.sha1()
+    for root in paths:
+        files = [root] if os.path.isfile(root) else sorted(
+            os.path.join(directory, name)
+            for directory, _, names in os.walk(root) for name in names)
+        for path in files:
+            digest.update(os.path.relpath(path, os.path.dirname(root)).encode())
+            with open(path, 'rb') as f:
+                digest.update(hashlib.sha1(f.read()).digest())
+    return digest.hexdigest()
+
+
+def sync_tree(source, target):
+    """Mirror source into target, copying only new or changed files; returns the number copied"""
+    copied = 0
+    wanted = set()
+    for directory, _, names in os.walk(source):
+        for name in names:
+            src = os.path.join(directory, name)
+            relative = os.path.relpath(src, source)
+            dst = os.path.join(target, relative)
+            wanted.add(relative)
+            src_stat = os.stat(src)
+            try:
+                dst_stat = os.stat(dst)
+                if dst_stat.st_size == src_stat.st_size and dst_stat.st_mtime_ns == src_stat.st_mtime_ns:
+                    continue
+            except FileNotFoundError:
+                pass
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            shutil.copy2(src, dst)
+            copied += 1
+    for directory, _, names in os.walk(target):
+        for name in names:
+            path = os.path.join(directory, name)
+            if os.path.relpath(path, target) not in wanted:
+                os.remove(path)
+    return copied
+
+
+def _remove(out_dir, relative):
+    """Delete an exported file and the directories it leaves empty"""
+    path = os.path.join(out_dir, relative)
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    directory = os.path.dirname(path)
+    while os.path.abspath(directory) != os.path.abspath(out_dir):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            break
+        directory = os.path.dirname(directory)
+
+
+# The exporting app's test client, one per worker process
+_client = None
+
+
+def _init_worker(import_name, cwd):
+    """Import the app in a fresh worker process, in the site's directory"""
+    global _client
+    os.chdir(cwd)
+    _client = importlib.import_module(import_name).app.test_client()
+
+
+def _render_batch(out_dir, urls):
+    """Render URLs anonymously and write them to out_dir; returns [(url, error or None)]"""
+    results = []
+    for url in urls:
+        response = _client.get(url, environ_base={EXPORT_ENVIRON_KEY: True})
+        if response.status_code != 200:
+            results.append((url, f'status {response.status_code}'))
+            continue
+        path = os.path.join(out_dir, output_path(url))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_atomic(path, response.get_data(as_text=True))
+        results.append((url, None))
+    return results
+
+
+class StaticExporter:
+    """Writes the public pages of the site to a directory a web server can serve.
+
+    pages is a list of (url, fingerprint) for every page that should exist,
+    where the fingerprint covers everything the page is rendered from. A
+    page is rendered again only when its fingerprint or the site
+    fingerprint (templates, static files, code) changed since the last
+    export, or its file is missing; pages that no longer exist (deleted or
+    hidden posts, renamed slugs) are removed. Rendering runs in a pool of
+    jobs processes, each importing the app by import_name.
+    """
+
+    def __init__(self, app, out_dir, jobs=None):
+        self.app = app
+        self.out_dir = out_dir
+        self.jobs = jobs or os.cpu_count() or 1
+        self.manifest_path = os.path.join(out_dir, MANIFEST_FILE)
+
+    def _load_manifest(self):
+        try:
+            return read_json(self.manifest_path)
+        except (FileNotFoundError, ValueError):
+            return {'site': None, 'pages': {}}
+
+    def export(self, pages, site, force=False, trees=None):
+        """Bring out_dir up to date; returns counts of rendered, unchanged, removed, failed and copied files.
+
+        trees maps further output subdirectories to directories mirrored
+        into them next to the static files, e.g. built assets.
+        """
+        os.makedirs(self.out_dir, exist_ok=True)
+        manifest = self._load_manifest()
+        old_pages = {} if force or manifest.get('site') != site else manifest.get('pages', {})
+
+        wanted = {output_path(url): (url, page_fingerprint) for url, page_fingerprint in pages}
+        stale = [url for relative, (url, page_fingerprint) in wanted.items()
+                 if old_pages.get(relative) != page_fingerprint
+                 or not os.path.exists(os.path.join(self.out_dir, relative))]
+
+        errors = {url: error for url, error in self._render(stale) if error}
+        for url, error in errors.items():
+            print(f"Error exporting {url}: {error}")
+            # Leave the URL to the app rather than serve an outdated copy
+            _remove(self.out_dir, output_path(url))
+
+        removed = 0
+        for relative in manifest.get('pages', {}):
+            if relative not in wanted:
+                _remove(self.out_dir, relative)
+                removed += 1
+
+        static_prefix = (self.app.static_url_path or '/static').strip('/')
+        trees = dict(trees or {}, **{static_prefix: self.app.static_folder})
+        copied = sum(sync_tree(source, os.path.join(self.out_dir, prefix)) for prefix, source in trees.items())
+
+        write_json_atomic(self.manifest_path, {
+            'site': site,
+            'pages': {relative: page_fingerprint for relative, (url, page_fingerprint) in wanted.items()
+                      if url not in errors}
+        })
+        return {
+            'rendered': len(stale) - len(errors),
+            'unchanged': len(wanted) - len(stale),
+            'removed': removed,
+            'failed': len(errors),
+            'static_files_copied': copied
+        }
+
+    def _render(self, urls):
+        if not urls:
+            return []
+        batches = [urls[start:start + BATCH_SIZE] for start in range(0, len(urls), BATCH_SIZE)]
+        out_dir = os.path.abspath(self.out_dir)
+        if self.jobs == 1 or len(batches) == 1:
+            global _client
+            _client = self.app.test_client()
+            return [result for batch in batches for result in _render_batch(out_dir, batch)]
+
+        # Fresh interpreters rather than forks: the app runs background threads
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(min(self.jobs, len(batches)), mp_context=context,
+                                 initializer=_init_worker,
+                                 initargs=(self.app.import_name, os.getcwd())) as pool:
+            results = pool.map(_render_batch, [out_dir] * len(batches), batches)
+            return [result for batch in results for result in batch]
@@ -0,0 +1,480 @@
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from content_store import ContentStore
+from id_allocator import highest_id
+from hyperloglog import HyperLogLog
+from ranking import DEFAULT_WINDOWS, prune_cutoff
+from rollups import default_rollups, hourly_cutoff
+from visit_tracking import GLOBAL_PRECISION, VisitBuffer, normalize_visitors
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS blogs (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    content TEXT NOT NULL DEFAULT '',
+    hidden INTEGER NOT NULL DEFAULT 0,
+    extra TEXT
+);
+CREATE TABLE IF NOT EXISTS subsections (
+    blog_id TEXT NOT NULL REFERENCES blogs(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    content TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (blog_id, position)
+);
+CREATE TABLE IF NOT EXISTS groups (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    description TEXT NOT NULL DEFAULT '',
+    hidden INTEGER NOT NULL DEFAULT 0,
+    extra TEXT
+);
+CREATE TABLE IF NOT EXISTS group_blogs (
+    group_id TEXT NOT NULL REFERENCES groups(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    blog_id TEXT NOT NULL,
+    PRIMARY KEY (group_id, blog_id)
+);
+CREATE INDEX IF NOT EXISTS group_blogs_by_blog ON group_blogs (blog_id);
+CREATE TABLE IF NOT EXISTS temp_users (
+    username TEXT PRIMARY KEY,
+    code TEXT NOT NULL,
+    created_at TEXT,
+    expiration TEXT NOT NULL,
+    can_see_all_hidden INTEGER NOT NULL DEFAULT 0,
+    duration_days INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS visit_totals (
+    name TEXT PRIMARY KEY,
+    visits INTEGER NOT NULL DEFAULT 0,
+    unique_visitors INTEGER NOT NULL DEFAULT 0,
+    sketch TEXT
+);
+CREATE TABLE IF NOT EXISTS daily_visits (
+    day TEXT PRIMARY KEY,
+    visits INTEGER NOT NULL DEFAULT 0,
+    unique_visitors INTEGER NOT NULL DEFAULT 0,
+    sketch TEXT
+);
+CREATE TABLE IF NOT EXISTS blog_visits (
+    blog_id TEXT PRIMARY KEY,
+    visits INTEGER NOT NULL DEFAULT 0,
+    unique_visitors INTEGER NOT NULL DEFAULT 0,
+    sketch TEXT
+);
+CREATE TABLE IF NOT EXISTS visit_rollups (
+    granularity TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    visits INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (granularity, bucket)
+);
+CREATE TABLE IF NOT EXISTS blog_trending (
+    window TEXT NOT NULL,
+    blog_id TEXT NOT NULL,
+    score REAL NOT NULL,
+    PRIMARY KEY (window, blog_id)
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('blogs', 0), ('groups', 0), ('temp_users', 0), ('visits', 0);
+'''
+
+BLOG_FIELDS = ('title', 'content', 'subsections', 'hidden')
+GROUP_FIELDS = ('name', 'description', 'blogs', 'hidden')
+
+
+class SQLiteDatabase:
+    """One SQLite file in WAL mode, with a connection per thread and process"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        # executescript() manages its own transaction; every statement is idempotent
+        self.connection().executescript(SCHEMA)
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            # Connections must not be shared across a fork (gunicorn workers)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Run statements in a write transaction, serialized across workers"""
+        conn = self.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def version(self, name):
+        row = self.connection().execute('SELECT value FROM meta WHERE key = ?', (name,)).fetchone()
+        return row[0] if row else 0
+
+    @staticmethod
+    def bump(conn, name):
+        conn.execute('UPDATE meta SET value = value + 1 WHERE key = ?', (name,))
+
+
+def _extra(item, known_fields):
+    extra = {key: value for key, value in item.items() if key not in known_fields}
+    return json.dumps(extra) if extra else None
+
+
+class SQLiteBlogSource:
+    """Blogs and their subsections as rows; single-post saves touch only that post"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __str__(self):
+        return f'{self.db.path} (blogs)'
+
+    def stamp(self):
+        return self.db.version('blogs')
+
+    def read(self):
+        conn = self.db.connection()
+        blogs = {}
+        for blog_id, title, content, hidden, extra in conn.execute(
+                'SELECT id, title, content, hidden, extra FROM blogs ORDER BY rowid'):
+            blog = json.loads(extra) if extra else {}
+            blog.update({'title': title, 'content': content, 'subsections': [], 'hidden': bool(hidden)})
+            blogs[blog_id] = blog
+        for blog_id, title, content in conn.execute(
+                'SELECT blog_id, title, content FROM subsections ORDER BY blog_id, position'):
+            if blog_id in blogs:
+                blogs[blog_id]['subsections'].append({'title': title, 'content': content})
+        return blogs
+
+    def _upsert(self, conn, blog_id, blog):
+        conn.execute(
+            'INSERT INTO blogs (id, title, content, hidden, extra) VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT(id) DO UPDATE SET title = excluded.title, content = excluded.content, '
+            'hidden = excluded.hidden, extra = excluded.extra',
+            (blog_id, blog['title'], blog.get('content', ''), int(bool(blog.get('hidden', False))),
+             _extra(blog, BLOG_FIELDS)))
+
+        # Only rewrite the subsection rows that actually changed
+        existing = {position: (title, content) for position, title, content in conn.execute(
+            'SELECT position, title, content FROM subsections WHERE blog_id = ?', (blog_id,))}
+        subsections = blog.get('subsections', [])
+        for position, subsection in enumerate(subsections):
+            row = (subsection.get('title', ''), subsection.get('content', ''))
+            if existing.get(position) != row:
+                conn.execute(
+                    'INSERT OR REPLACE INTO subsections (blog_id, position, title, content) VALUES (?, ?, ?, ?)',
+                    (blog_id, position) + row)
+        conn.execute('DELETE FROM subsections WHERE blog_id = ? AND position >= ?', (blog_id, len(subsections)))
+
+    def write(self, data):
+        with self.db.transaction() as conn:
+            conn.execute('DELETE FROM blogs')
+            for blog_id, blog in data.items():
+                self._upsert(conn, blog_id, blog)
+            self.db.bump(conn, 'blogs')
+
+    def write_item(self, key, value, data):
+        with self.db.transaction() as conn:
+            self._upsert(conn, key, value)
+            self.db.bump(conn, 'blogs')
+
+    def delete_item(self, key, data):
+        with self.db.transaction() as conn:
+            conn.execute('DELETE FROM blogs WHERE id = ?', (key,))
+            self.db.bump(conn, 'blogs')
+
+
+class SQLiteGroupSource:
+    """Groups and their ordered blog membership as rows"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __str__(self):
+        return f'{self.db.path} (groups)'
+
+    def stamp(self):
+        return self.db.version('groups')
+
+    def read(self):
+        conn = self.db.connection()
+        groups = {}
+        for group_id, name, description, hidden, extra in conn.execute(
+                'SELECT id, name, description, hidden, extra FROM groups ORDER BY rowid'):
+            group = json.loads(extra) if extra else {}
+            group.update({'name': name, 'description': description, 'blogs': [], 'hidden': bool(hidden)})
+            groups[group_id] = group
+        for group_id, blog_id in conn.execute(
+                'SELECT group_id, blog_id FROM group_blogs ORDER BY group_id, position'):
+            if group_id in groups:
+                groups[group_id]['blogs'].append(blog_id)
+        return groups
+
+    def _upsert(self, conn, group_id, group):
+        conn.execute(
+            'INSERT INTO groups (id, name, description, hidden, extra) VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT(id) DO UPDATE SET name = excluded.name, description = excluded.description, '
+            'hidden = excluded.hidden, extra = excluded.extra',
+            (group_id, group['name'], group.get('description', ''), int(bool(group.get('hidden', False))),
+             _extra(group, GROUP_FIELDS)))
+        conn.execute('DELETE FROM group_blogs WHERE group_id = ?', (group_id,))
+        conn.executemany(
+            'INSERT OR IGNORE INTO group_blogs (group_id, position, blog_id) VALUES (?, ?, ?)',
+            [(group_id, position, blog_id) for position, blog_id in enumerate(group.get('blogs', []))])
+
+    def write(self, data):
+        with self.db.transaction() as conn:
+            conn.execute('DELETE FROM groups')
+            for group_id, group in data.items():
+                self._upsert(conn, group_id, group)
+            self.db.bump(conn, 'groups')
+
+    def write_item(self, key, value, data):
+        with self.db.transaction() as conn:
+            self._upsert(conn, key, value)
+            self.db.bump(conn, 'groups')
+
+    def delete_item(self, key, data):
+        with self.db.transaction() as conn:
+            conn.execute('DELETE FROM groups WHERE id = ?', (key,))
+            self.db.bump(conn, 'groups')
+
+
+class SQLiteTempUserSource:
+    """Temporary users as rows of the temp_users table"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __str__(self):
+        return f'{self.db.path} (temp users)'
+
+    def stamp(self):
+        return self.db.version('temp_users')
+
+    def read(self):
+        temp_users = {}
+        for username, code, created_at, expiration, can_see_all_hidden, duration_days in self.db.connection().execute(
+                'SELECT username, code, created_at, expiration, can_see_all_hidden, duration_days '
+                'FROM temp_users ORDER BY rowid'):
+            temp_users[username] = {
+                'code': code,
+                'created_at': created_at,
+                'expiration': expiration,
+                'can_see_all_hidden': bool(can_see_all_hidden),
+                'duration_days': duration_days
+            }
+        return temp_users
+
+    def write(self, data):
+        with self.db.transaction() as conn:
+            conn.execute('DELETE FROM temp_users')
+            conn.executemany(
+                'INSERT INTO temp_users (username, code, created_at, expiration, can_see_all_hidden, duration_days) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                [(username, user['code'], user.get('created_at'), user['expiration'],
+                  int(bool(user.get('can_see_all_hidden', False))), user.get('duration_days', 0))
+                 for username, user in data.items()])
+            self.db.bump(conn, 'temp_users')
+
+    def write_item(self, key, value, data):
+        self.write(data)
+
+    def delete_item(self, key, data):
+        self.write(data)
+
+
+class SQLiteVisitorSource:
+    """Visit counters and unique-visitor sketches in the visit tables"""
+
+    def __init__(self, db, trending_windows=None):
+        self.db = db
+        self.trending_windows = trending_windows
+
+    def __str__(self):
+        return f'{self.db.path} (visits)'
+
+    def stamp(self):
+        return self.db.version('visits')
+
+    def read(self, conn=None, days=None, blog_ids=None, buckets=None):
+        """Visitors data in the visitors.json layout, optionally only some rows.
+
+        buckets maps a rollup granularity to the bucket keys to read.
+        """
+        conn = conn or self.db.connection()
+        visitors = {
+            'total_visits': 0,
+            'unique_visitors': 0,
+            'unique_sketch': HyperLogLog(GLOBAL_PRECISION).serialize(),
+            'blog_visits': {},
+            'blog_unique_visitors': {},
+            'blog_unique_sketches': {},
+            'daily_visits': {},
+            'daily_unique_visitors': {},
+            'daily_unique_sketches': {},
+            'blog_trending': {},
+            'visit_rollups': default_rollups()
+        }
+        row = conn.execute("SELECT visits, unique_visitors, sketch FROM visit_totals WHERE name = 'all'").fetchone()
+        if row:
+            visitors['total_visits'], visitors['unique_visitors'] = row[0], row[1]
+            if row[2]:
+                visitors['unique_sketch'] = row[2]
+
+        for table, key_column, prefix, keys in (('daily_visits', 'day', 'daily', days),
+                                                ('blog_visits', 'blog_id', 'blog', blog_ids)):
+            query = f'SELECT {key_column}, visits, unique_visitors, sketch FROM {table}'
+            params = ()
+            if keys is not None:
+                if not keys:
+                    continue
+                query += f' WHERE {key_column} IN ({",".join("?" * len(keys))})'
+                params = tuple(keys)
+            for key, visits, unique_visitors, sketch in conn.execute(query + ' ORDER BY rowid', params):
+                visitors[f'{prefix}_visits'][key] = visits
+                visitors[f'{prefix}_unique_visitors'][key] = unique_visitors
+                if sketch:
+                    visitors[f'{prefix}_unique_sketches'][key] = sketch
+
+        query = 'SELECT window, blog_id, score FROM blog_trending'
+        params = ()
+        if blog_ids is not None:
+            query += f' WHERE blog_id IN ({",".join("?" * len(blog_ids))})'
+            params = tuple(blog_ids)
+        if blog_ids is None or blog_ids:
+            for window, blog_id, score in conn.execute(query, params):
+                visitors['blog_trending'].setdefault(window, {})[blog_id] = score
+
+        if buckets is None:
+            rows = conn.execute('SELECT granularity, bucket, visits FROM visit_rollups ORDER BY granularity, bucket')
+        else:
+            rows = []
+            for granularity, keys in buckets.items():
+                if keys:
+                    rows += conn.execute(
+                        f'SELECT granularity, bucket, visits FROM visit_rollups '
+                        f'WHERE granularity = ? AND bucket IN ({",".join("?" * len(keys))})',
+                        (granularity,) + tuple(keys)).fetchall()
+        for granularity, bucket, visits in rows:
+            visitors['visit_rollups'].setdefault(granularity, {})[bucket] = visits
+        return visitors
+
+    def write_rows(self, conn, visitors):
+        """Upsert every counter present in a (possibly partial) visitors dict"""
+        conn.execute(
+            "INSERT INTO visit_totals (name, visits, unique_visitors, sketch) VALUES ('all', ?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET visits = excluded.visits, "
+            "unique_visitors = excluded.unique_visitors, sketch = excluded.sketch",
+            (visitors['total_visits'], visitors['unique_visitors'], visitors['unique_sketch']))
+        for table, key_column, prefix in (('daily_visits', 'day', 'daily'), ('blog_visits', 'blog_id', 'blog')):
+            conn.executemany(
+                f'INSERT INTO {table} ({key_column}, visits, unique_visitors, sketch) VALUES (?, ?, ?, ?) '
+                f'ON CONFLICT({key_column}) DO UPDATE SET visits = excluded.visits, '
+                f'unique_visitors = excluded.unique_visitors, sketch = excluded.sketch',
+                [(key, visits, visitors[f'{prefix}_unique_visitors'].get(key, 0),
+                  visitors[f'{prefix}_unique_sketches'].get(key))
+                 for key, visits in visitors[f'{prefix}_visits'].items()])
+
+        trending = visitors.get('blog_trending', {})
+        conn.executemany(
+            'INSERT INTO blog_trending (window, blog_id, score) VALUES (?, ?, ?) '
+            'ON CONFLICT(window, blog_id) DO UPDATE SET score = excluded.score',
+            [(window, blog_id, score) for window, scores in trending.items() for blog_id, score in scores.items()])
+        if self.trending_windows:
+            # Drop posts that stopped trending and windows no longer configured
+            for window, seconds in self.trending_windows.items():
+                conn.execute('DELETE FROM blog_trending WHERE window = ? AND score < ?',
+                             (window, prune_cutoff(seconds)))
+            conn.execute(f'DELETE FROM blog_trending WHERE window NOT IN ({",".join("?" * len(self.trending_windows))})',
+                         tuple(self.trending_windows))
+        conn.executemany(
+            'INSERT INTO visit_rollups (granularity, bucket, visits) VALUES (?, ?, ?) '
+            'ON CONFLICT(granularity, bucket) DO UPDATE SET visits = excluded.visits',
+            [(granularity, bucket, visits)
+             for granularity, counts in visitors.get('visit_rollups', {}).items()
+             for bucket, visits in counts.items()])
+        conn.execute("DELETE FROM visit_rollups WHERE granularity = 'hour' AND bucket < ?",
+                     (hourly_cutoff(),))
+        self.db.bump(conn, 'visits')
+
+    def write(self, data):
+        with self.db.transaction() as conn:
+            conn.execute('DELETE FROM daily_visits')
+            conn.execute('DELETE FROM blog_visits')
+            conn.execute('DELETE FROM blog_trending')
+            conn.execute('DELETE FROM visit_rollups')
+            self.write_rows(conn, data)
+
+
+class SQLiteVisitBuffer(VisitBuffer):
+    """Buffered visit tracking that merges into the SQLite visit tables.
+
+    A flush reads and updates only the day and blog rows it touches inside
+    one write transaction, so concurrent workers never lose increments.
+    """
+
+    def __init__(self, db, flush_interval=5.0, batch_size=50, trending_windows=None):
+        self.source = SQLiteVisitorSource(db, trending_windows or DEFAULT_WINDOWS)
+        super().__init__(db.path, flush_interval=flush_interval, batch_size=batch_size,
+                         store=ContentStore(self.source, normalize=normalize_visitors),
+                         trending_windows=trending_windows)
+
+    def _merge_pending(self, pending):
+        with self.source.db.transaction() as conn:
+            visitors = self.source.read(conn, days=list(pending.daily), blog_ids=list(pending.blogs),
+                                        buckets={granularity: list(counts)
+                                                 for granularity, counts in pending.rollups.items()})
+            pending.merge_into(visitors)
+            self.source.write_rows(conn, visitors)
+        self.store.invalidate()
+
+
+class SQLiteIdAllocator:
+    """Increasing, never reused IDs kept as a 'last_<kind>_id' row in meta"""
+
+    TABLES = {'blogs': 'blogs', 'groups': 'groups'}
+
+    def __init__(self, db):
+        self.db = db
+
+    def allocate(self, kind, existing=()):
+        table = self.TABLES[kind]
+        key = f'last_{kind}_id'
+        with self.db.transaction() as conn:
+            row = conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+            if row:
+                last = row[0]
+            else:
+                last = highest_id(item_id for (item_id,) in conn.execute(f'SELECT id FROM {table}'))
+            new_id = last + 1
+            while conn.execute(f'SELECT 1 FROM {table} WHERE id = ?', (str(new_id),)).fetchone():
+                new_id += 1
+            conn.execute('INSERT INTO meta (key, value) VALUES (?, ?) '
+                         'ON CONFLICT(key) DO UPDATE SET value = excluded.value', (key, new_id))
+        return str(new_id)
+
+
+def migrate_json_to_sqlite(db, blogs, groups, temp_users, visitors):
+    """Copy already loaded JSON data into the SQLite tables"""
+    SQLiteBlogSource(db).write(blogs)
+    SQLiteGroupSource(db).write(groups)
+    SQLiteTempUserSource(db).write(temp_users)
+    visitors, _ = normalize_visitors(visitors)
+    SQLiteVisitorSource(db).write(visitors)
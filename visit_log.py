@@ -0,0 +1,239 @@
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from content_store import ContentStore
+from hyperloglog import HyperLogLog
+from persistence import file_lock, write_json_atomic
+from visit_tracking import (DETAIL_PRECISION, StatsSnapshot, VisitCounts,
+                            copy_visitors, normalize_visitors)
+
+
+class VisitLogBackend:
+    """Records visits as lines in an append-only log, one file per day.
+
+    Each visit is a single O_APPEND write of one short JSON line, so workers
+    never contend on a shared file rewrite. A background compaction step
+    rolls finished days into the aggregate visitors file (same structure the
+    buffered backend writes) and renames the log to ``.done``. Finished logs
+    are kept so range_stats() can answer arbitrary date ranges by streaming
+    only the days asked for.
+
+    A visit written after its day was compacted (queued before midnight,
+    written after) starts a new log for that day, which the next compaction
+    merges as one more batch; every compacted log keeps a name of its own.
+    """
+
+    def __init__(self, visitors_file, log_dir='visit_logs', compact_interval=300, trending_windows=None):
+        self.visitors_file = visitors_file
+        self.log_dir = log_dir
+        self.compact_interval = compact_interval
+        self.store = ContentStore(visitors_file, normalize=normalize_visitors)
+        self.trending_windows = trending_windows
+        self._offsets = {}  # path -> bytes already counted
+        self._paths = set()  # logs not compacted yet, as of the last listing
+        self._dir_stamp = None
+        self._tail = VisitCounts(trending_windows)
+        self._view = None
+        self._lock = threading.Lock()
+        self._timer = None
+        os.makedirs(log_dir, exist_ok=True)
+        atexit.register(self.close)
+
+    def _log_path(self, day):
+        return os.path.join(self.log_dir, f'visits-{day}.log')
+
+    @staticmethod
+    def _day_of(path):
+        name = os.path.basename(path)
+        return name[len('visits-'):len('visits-') + 10]
+
+    def record(self, ip_hash, day, blog_id=None, timestamp=None):
+        """Append a single visit to today's log"""
+        timestamp = time.time() if timestamp is None else timestamp
+        line = json.dumps({'t': int(timestamp), 'v': ip_hash, 'b': blog_id},
+                          separators=(',', ':')) + '\n'
+        fd = os.open(self._log_path(day), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line.encode())
+        finally:
+            os.close(fd)
+        self._start_timer()
+
+    def flush(self):
+        """Appends are written immediately; nothing is buffered"""
+
+    @staticmethod
+    def _read_events(path, offset=0):
+        """Yield (event, end offset) for every complete line after offset"""
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            for raw in f:
+                if not raw.endswith(b'\n'):
+                    # Partially written line; pick it up next time
+                    break
+                offset += len(raw)
+                try:
+                    yield json.loads(raw), offset
+                except json.JSONDecodeError:
+                    continue
+
+    def _pending_logs(self):
+        """Logs not compacted yet, listed again only when the directory changed.
+
+        Creating or renaming a log changes the directory's mtime; appending
+        does not. A listing made in the same clock tick as a change may miss
+        it without the mtime moving on, so a recently changed directory is
+        listed every time.
+        """
+        try:
+            st = os.stat(self.log_dir)
+        except OSError:
+            return set()
+        if st.st_mtime_ns != self._dir_stamp or time.time() - st.st_mtime < 2:
+            self._paths = set(glob.glob(os.path.join(self.log_dir, 'visits-*.log')))
+            self._dir_stamp = st.st_mtime_ns
+        return self._paths
+
+    def _tail_counts(self, visitors):
+        """Counts from logs that are not compacted yet, reading only bytes added since the last call"""
+        paths = self._pending_logs()
+        reloaded = self._view is not None and self._view.visitors is not visitors
+        if reloaded or not set(self._offsets) <= paths:
+            # Some log was compacted into the aggregate file, possibly with a
+            # late log of the same name started since; count the rest again
+            self._offsets = {}
+            self._tail = VisitCounts(self.trending_windows)
+            self._view = None
+
+        if self._view is None:
+            self._view = StatsSnapshot(visitors, self._tail)
+
+        for path in sorted(paths):
+            day = self._day_of(path)
+            try:
+                if os.path.getsize(path) <= self._offsets.get(path, 0):
+                    continue
+                for event, offset in self._read_events(path, self._offsets.get(path, 0)):
+                    self._tail.add(event['v'], day, event.get('b'), event.get('t'))
+                    self._view.add(event['v'], day, event.get('b'))
+                    self._offsets[path] = offset
+            except OSError:
+                # Compacted since the listing; list again next time
+                self._dir_stamp = None
+                continue
+        return self._view
+
+    def stats(self, day, blog_id=None):
+        visitors = self.store.get()
+        with self._lock:
+            return self._tail_counts(visitors).stats(day, blog_id)
+
+    def summary(self, day):
+        visitors = self.store.get()
+        with self._lock:
+            return self._tail_counts(visitors).summary(day)
+
+    def rankings(self):
+        visitors = self.store.get()
+        with self._lock:
+            return self._tail_counts(visitors).rankings()
+
+    def visitors(self):
+        visitors = self.store.get()
+        merged = copy_visitors(visitors)
+        with self._lock:
+            self._tail_counts(visitors).extra.merge_into(merged)
+        return merged
+
+    def compact(self):
+        """Roll every finished day's log into the aggregate visitors file"""
+        today = datetime.now().strftime('%Y-%m-%d')
+        with file_lock(self.visitors_file):
+            # Move finished logs aside under a unique name first, so visits
+            # arriving late for the same day start a new log instead of being
+            # appended to one that is being merged
+            batch = f'{int(time.time() * 1000)}-{os.getpid()}'
+            for path in sorted(glob.glob(os.path.join(self.log_dir, 'visits-*.log'))):
+                if self._day_of(path) < today:
+                    os.replace(path, f'{path}.{batch}')
+            pending = sorted(path for path in glob.glob(os.path.join(self.log_dir, 'visits-*.log.*'))
+                             if not path.endswith('.done'))
+            if not pending:
+                return 0
+
+            self.store.invalidate()
+            visitors = self.store.get()
+            # A crash after writing the aggregate but before the rename to
+            # .done leaves a log behind; its name says it was counted already
+            merged = visitors.get('compacted_logs', [])
+            names = [os.path.basename(path) for path in pending]
+            for path, name in zip(pending, names):
+                if name not in merged:
+                    day = self._day_of(path)
+                    counts = VisitCounts(self.trending_windows)
+                    for event, _ in self._read_events(path):
+                        counts.add(event['v'], day, event.get('b'), event.get('t'))
+                    counts.merge_into(visitors)
+            visitors['compacted_logs'] = names
+
+            write_json_atomic(self.visitors_file, visitors)
+            self.store.invalidate()
+            for path in pending:
+                os.replace(path, path + '.done')
+            return len(pending)
+
+    def range_stats(self, start_day, end_day):
+        """Visits between two YYYY-MM-DD days (inclusive), streamed from the logs"""
+        daily = {}
+        blogs = {}
+        uniques = HyperLogLog(DETAIL_PRECISION)
+        for path in sorted(glob.glob(os.path.join(self.log_dir, 'visits-*.log*'))):
+            day = self._day_of(path)
+            if not start_day <= day <= end_day:
+                continue
+            for event, _ in self._read_events(path):
+                daily[day] = daily.get(day, 0) + 1
+                uniques.add(event['v'])
+                if event.get('b'):
+                    blogs[event['b']] = blogs.get(event['b'], 0) + 1
+
+        # Days from before the event log existed only have aggregate counts
+        visitors = self.store.get()
+        for day, count in visitors['daily_visits'].items():
+            if start_day <= day <= end_day and day not in daily:
+                daily[day] = count
+
+        return {
+            'total_visits': sum(daily.values()),
+            'unique_visitors': uniques.count(),
+            'daily_visits': daily,
+            'blog_visits': blogs
+        }
+
+    def _start_timer(self):
+        if self._timer is None and self.compact_interval > 0:
+            with self._lock:
+                if self._timer is None:
+                    self._timer = threading.Timer(self.compact_interval, self._on_timer)
+                    self._timer.daemon = True
+                    self._timer.start()
+
+    def _on_timer(self):
+        with self._lock:
+            self._timer = None
+        try:
+            self.compact()
+        except Exception as e:
+            print(f"Error compacting visit logs: {e}")
+        self._start_timer()
+
+    def close(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
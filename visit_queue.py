@@ -0,0 +1,117 @@
+import atexit
+import os
+import queue
+import threading
+import time
+
+# Queued when the process exits so the worker stops after draining
+_STOP = object()
+
+
+class AsyncVisitRecorder:
+    """Hands visits to the analytics backend from a background thread.
+
+    Requests only put (client, day, blog_id, timestamp) on a bounded queue;
+    hashing the client address and the backend's record() (buffer update,
+    log append, flush) run on the worker thread. When the queue is full a
+    request waits at most put_timeout seconds and then drops the visit,
+    counting it in dropped, so a slow disk can never stall page rendering.
+    At exit the worker drains what is queued, for up to drain_timeout
+    seconds, before the backend's own flush runs.
+
+    With max_size 0 visits are recorded inline on the request thread.
+    """
+
+    def __init__(self, backend, hasher, max_size=10000, put_timeout=0.0, drain_timeout=5.0):
+        self.backend = backend
+        self.hasher = hasher
+        self.max_size = max_size
+        self.put_timeout = put_timeout
+        self.drain_timeout = drain_timeout
+        self.recorded = 0
+        self.dropped = 0
+        self.failed = 0
+        self._queue = queue.Queue(max_size)
+        self._worker = None
+        self._pid = None
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def submit(self, client, day, blog_id=None):
+        """Record a visit without waiting for the backend"""
+        timestamp = time.time()
+        if not self.max_size:
+            self._record(client, day, blog_id, timestamp)
+            return True
+
+        self._start_worker()
+        try:
+            if self.put_timeout > 0:
+                self._queue.put((client, day, blog_id, timestamp), timeout=self.put_timeout)
+            else:
+                self._queue.put_nowait((client, day, blog_id, timestamp))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        return True
+
+    def _record(self, client, day, blog_id, timestamp):
+        try:
+            self.backend.record(self.hasher(client), day, blog_id, timestamp)
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+            print(f"Error recording visit: {e}")
+            return
+        with self._lock:
+            self.recorded += 1
+
+    def _start_worker(self):
+        # Threads don't survive a fork, so every worker process starts its own
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._queue = queue.Queue(self.max_size)
+                    self._worker = threading.Thread(target=self._run, name='visit-recorder', daemon=True)
+                    self._worker.start()
+                    self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                self._record(*item)
+            finally:
+                self._queue.task_done()
+
+    def wait(self):
+        """Block until every queued visit has been handed to the backend"""
+        if self._worker is not None and self._pid == os.getpid():
+            self._queue.join()
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize(),
+            'max_size': self.max_size,
+            'recorded': self.recorded,
+            'dropped': self.dropped,
+            'failed': self.failed
+        }
+
+    def close(self):
+        """Drain the queue and stop the worker"""
+        worker = self._worker
+        if worker is None or self._pid != os.getpid() or not worker.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=self.drain_timeout)
+        except queue.Full:
+            print("Visit queue did not drain in time; some visits were not recorded")
+            return
+        worker.join(self.drain_timeout)
+        if worker.is_alive():
+            print(f"Visit queue did not drain in time; {self._queue.qsize()} visits were not recorded")
+        self._worker = None
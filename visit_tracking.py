@@ -0,0 +1,411 @@
+import atexit
+import threading
+import time
+
+from content_store import ContentStore
+from hyperloglog import HyperLogLog
+from persistence import file_lock, write_json_atomic
+from ranking import DEFAULT_WINDOWS, TopK, decayed, log_add, merge_scores, visit_score
+from rollups import backfill_rollups, bucket_keys, default_rollups, prune_hours
+
+
+# Sketch precision: ~1.6% error overall, ~3.3% for the per-day and per-blog counts
+GLOBAL_PRECISION = 12
+DETAIL_PRECISION = 10
+
+# Length of the most visited and trending posts lists kept by StatsSnapshot
+TOP_POSTS = 10
+
+
+def default_visitors():
+    return {
+        'total_visits': 0,
+        'unique_visitors': 0,
+        'unique_sketch': HyperLogLog(GLOBAL_PRECISION).serialize(),
+        'blog_visits': {},
+        'blog_unique_visitors': {},
+        'blog_unique_sketches': {},
+        'daily_visits': {},
+        'daily_unique_visitors': {},
+        'daily_unique_sketches': {},
+        # Window name -> blog_id -> forward-decayed log-score (see ranking.py)
+        'blog_trending': {},
+        # 'hour'/'week'/'month' -> bucket key -> visits (days are daily_visits)
+        'visit_rollups': default_rollups()
+    }
+
+
+def normalize_visitors(data):
+    """Ensure all required keys exist with proper defaults"""
+    if not isinstance(data, dict):
+        return default_visitors(), False
+    changed = False
+    if isinstance(data.get('unique_visitors'), dict):
+        # Older files kept every visitor hash; fold them into the sketch
+        sketch = HyperLogLog(GLOBAL_PRECISION)
+        for ip_hash in data['unique_visitors']:
+            sketch.add(ip_hash)
+        data['unique_visitors'] = sketch.count()
+        data['unique_sketch'] = sketch.serialize()
+        changed = True
+    if 'visit_rollups' not in data and data.get('daily_visits'):
+        data['visit_rollups'] = backfill_rollups(data['daily_visits'])
+        changed = True
+    for key, default_value in default_visitors().items():
+        if key not in data:
+            data[key] = default_value
+    return data, changed
+
+
+def copy_visitors(visitors):
+    copied = {key: value.copy() if isinstance(value, dict) else value
+              for key, value in visitors.items()}
+    for key in ('blog_trending', 'visit_rollups'):
+        copied[key] = {name: inner.copy() for name, inner in visitors.get(key, {}).items()}
+    return copied
+
+
+class VisitCounts:
+    """Visit increments not yet merged into the aggregate visitors data"""
+
+    def __init__(self, trending_windows=None):
+        self.total = 0
+        self.daily = {}
+        self.blogs = {}
+        self.uniques = HyperLogLog(GLOBAL_PRECISION)
+        self.daily_uniques = {}
+        self.blog_uniques = {}
+        self.trending_windows = trending_windows or DEFAULT_WINDOWS
+        self.trending = {name: {} for name in self.trending_windows}
+        self.rollups = default_rollups()
+
+    def __bool__(self):
+        return self.total > 0
+
+    def add(self, ip_hash, day, blog_id=None, timestamp=None):
+        self.total += 1
+        self.daily[day] = self.daily.get(day, 0) + 1
+        self.uniques.add(ip_hash)
+        _sketch_for(self.daily_uniques, day).add(ip_hash)
+        timestamp = time.time() if timestamp is None else timestamp
+        for granularity, key in bucket_keys(day, timestamp).items():
+            counts = self.rollups[granularity]
+            counts[key] = counts.get(key, 0) + 1
+        if blog_id:
+            self.blogs[blog_id] = self.blogs.get(blog_id, 0) + 1
+            _sketch_for(self.blog_uniques, blog_id).add(ip_hash)
+            for name, window in self.trending_windows.items():
+                scores = self.trending[name]
+                scores[blog_id] = log_add(scores.get(blog_id), visit_score(timestamp, window))
+
+    def update(self, other):
+        self.total += other.total
+        for day, count in other.daily.items():
+            self.daily[day] = self.daily.get(day, 0) + count
+        for blog_id, count in other.blogs.items():
+            self.blogs[blog_id] = self.blogs.get(blog_id, 0) + count
+        self.uniques.merge(other.uniques)
+        for day, sketch in other.daily_uniques.items():
+            _sketch_for(self.daily_uniques, day).merge(sketch)
+        for blog_id, sketch in other.blog_uniques.items():
+            _sketch_for(self.blog_uniques, blog_id).merge(sketch)
+        for name, scores in other.trending.items():
+            merge_scores(self.trending.setdefault(name, {}), scores)
+        for granularity, counts in other.rollups.items():
+            mine = self.rollups[granularity]
+            for key, count in counts.items():
+                mine[key] = mine.get(key, 0) + count
+
+    def merge_into(self, visitors):
+        """Add these increments to an aggregate visitors dict in place"""
+        visitors['total_visits'] += self.total
+        for day, count in self.daily.items():
+            visitors['daily_visits'][day] = visitors['daily_visits'].get(day, 0) + count
+        for blog_id, count in self.blogs.items():
+            visitors['blog_visits'][blog_id] = visitors['blog_visits'].get(blog_id, 0) + count
+
+        sketch = HyperLogLog.deserialize(visitors['unique_sketch'])
+        sketch.merge(self.uniques)
+        visitors['unique_sketch'] = sketch.serialize()
+        visitors['unique_visitors'] = sketch.count()
+        _merge_sketches(visitors, 'daily_unique', self.daily_uniques)
+        _merge_sketches(visitors, 'blog_unique', self.blog_uniques)
+
+        trending = visitors.setdefault('blog_trending', {})
+        for name in [name for name in trending if name not in self.trending_windows]:
+            del trending[name]
+        for name, window in self.trending_windows.items():
+            merge_scores(trending.setdefault(name, {}), self.trending.get(name, {}), window)
+
+        rollups = visitors.setdefault('visit_rollups', default_rollups())
+        for granularity, counts in self.rollups.items():
+            stored = rollups.setdefault(granularity, {})
+            for key, count in counts.items():
+                stored[key] = stored.get(key, 0) + count
+        prune_hours(rollups['hour'])
+
+
+def _sketch_for(sketches, key):
+    if key not in sketches:
+        sketches[key] = HyperLogLog(DETAIL_PRECISION)
+    return sketches[key]
+
+
+def _merge_sketches(visitors, prefix, sketches):
+    stored = visitors[f'{prefix}_sketches']
+    counts = visitors[f'{prefix}_visitors']
+    for key, sketch in sketches.items():
+        if key in stored:
+            merged = HyperLogLog.deserialize(stored[key])
+            merged.merge(sketch)
+        else:
+            merged = sketch
+        stored[key] = merged.serialize()
+        counts[key] = merged.count()
+
+
+class StatsSnapshot:
+    """Display statistics for an aggregate plus not yet merged increments.
+
+    Built once per aggregate reload and then kept up to date with add(), so
+    every read is O(1): sketches are decoded on first use instead of once
+    per request, and the most visited and trending posts are kept in small
+    TopK heaps that a visit updates in O(log k).
+    """
+
+    def __init__(self, visitors, extra, top_n=TOP_POSTS):
+        self.visitors = visitors
+        self.extra = extra
+        self.top_n = top_n
+        self._sketches = {}
+        self._top = None  # TopK of all-time visits, built on first use
+        self._trending = {}  # window name -> TopK of decayed log-scores
+
+    def _sketch(self, kind, key=None):
+        cache_key = (kind, key)
+        if cache_key not in self._sketches:
+            if kind == 'global':
+                sketch = HyperLogLog.deserialize(self.visitors['unique_sketch'])
+                sketch.merge(self.extra.uniques)
+            else:
+                stored = self.visitors[f'{kind}_unique_sketches'].get(key)
+                sketch = HyperLogLog.deserialize(stored) if stored else HyperLogLog(DETAIL_PRECISION)
+                extra = self.extra.daily_uniques if kind == 'daily' else self.extra.blog_uniques
+                if key in extra:
+                    sketch.merge(extra[key])
+            self._sketches[cache_key] = sketch
+        return self._sketches[cache_key]
+
+    def add(self, ip_hash, day, blog_id=None):
+        """Mirror a visit that was just added to the extra counts"""
+        for (kind, key), sketch in self._sketches.items():
+            if kind == 'global' or (kind == 'daily' and key == day) or (kind == 'blog' and key == blog_id):
+                sketch.add(ip_hash)
+        if blog_id:
+            if self._top is not None:
+                self._top.update(blog_id, self.blog_visits(blog_id))
+            for name, top in self._trending.items():
+                top.update(blog_id, self._trending_score(name, blog_id))
+
+    def blog_visits(self, blog_id):
+        return self.visitors['blog_visits'].get(blog_id, 0) + self.extra.blogs.get(blog_id, 0)
+
+    def _trending_score(self, name, blog_id):
+        stored = self.visitors.get('blog_trending', {}).get(name, {})
+        return log_add(stored.get(blog_id), self.extra.trending.get(name, {}).get(blog_id))
+
+    def top_posts(self):
+        """[(blog_id, visits)] for the most visited posts, most visited first"""
+        if self._top is None:
+            blog_ids = set(self.visitors['blog_visits']) | set(self.extra.blogs)
+            self._top = TopK(self.top_n, {blog_id: self.blog_visits(blog_id) for blog_id in blog_ids})
+        return self._top.items()
+
+    def trending(self, now=None):
+        """{window name: [(blog_id, decayed visits)]}, hottest first"""
+        result = {}
+        for name, window in self.extra.trending_windows.items():
+            if name not in self._trending:
+                stored = self.visitors.get('blog_trending', {}).get(name, {})
+                blog_ids = set(stored) | set(self.extra.trending.get(name, {}))
+                self._trending[name] = TopK(self.top_n, {blog_id: self._trending_score(name, blog_id)
+                                                         for blog_id in blog_ids})
+            result[name] = [(blog_id, decayed(score, window, now)) for blog_id, score in self._trending[name].items()]
+        return result
+
+    def rankings(self, now=None):
+        """Most visited and trending posts, O(top_n) once built"""
+        return {'popular': self.top_posts(), 'trending': self.trending(now)}
+
+    def stats(self, day, blog_id=None):
+        """Display counts for the aggregate plus the extra increments"""
+        visitors, extra = self.visitors, self.extra
+        return {
+            'total_visits': visitors['total_visits'] + extra.total,
+            'unique_visitors': self._sketch('global').count(),
+            'today_visits': visitors['daily_visits'].get(day, 0) + extra.daily.get(day, 0),
+            'today_unique_visitors': self._sketch('daily', day).count(),
+            'blog_visits': self.blog_visits(blog_id) if blog_id else 0
+        }
+
+    def summary(self, day):
+        """Site-wide numbers shown on every page and the admin dashboard"""
+        stats = self.stats(day)
+        del stats['blog_visits']
+        top_posts = self.top_posts()
+        stats['most_popular_blog'] = top_posts[0] if top_posts else None
+        stats['top_posts'] = top_posts
+        return stats
+
+
+def range_stats(visitors, start_day, end_day):
+    """Visits between two YYYY-MM-DD days (inclusive) from daily aggregates"""
+    daily = {day: count for day, count in visitors['daily_visits'].items()
+             if start_day <= day <= end_day}
+    uniques = HyperLogLog(DETAIL_PRECISION)
+    for day, sketch in visitors['daily_unique_sketches'].items():
+        if start_day <= day <= end_day:
+            uniques.merge(HyperLogLog.deserialize(sketch))
+    return {
+        'total_visits': sum(daily.values()),
+        'unique_visitors': uniques.count(),
+        'daily_visits': daily,
+        # Per-blog visits are only kept as all-time totals in the aggregate file
+        'blog_visits': None
+    }
+
+
+class VisitBuffer:
+    """Collects visit increments in memory and merges them into the visitors file.
+
+    Increments are flushed every flush_interval seconds, as soon as
+    batch_size visits are pending, and at interpreter exit. Each flush is a
+    read-merge-write of the file under an exclusive file lock, written via a
+    temp file and rename, so counts from concurrent workers add up exactly
+    and readers never see a half-written file.
+    """
+
+    def __init__(self, path, flush_interval=5.0, batch_size=50, store=None, trending_windows=None):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.store = store or ContentStore(path, normalize=normalize_visitors)
+        self.trending_windows = trending_windows or DEFAULT_WINDOWS
+        self.pending = VisitCounts(self.trending_windows)
+        self._view = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer = None
+        atexit.register(self.close)
+
+    def record(self, ip_hash, day, blog_id=None, timestamp=None):
+        """Buffer a single visit"""
+        with self._lock:
+            self.pending.add(ip_hash, day, blog_id, timestamp)
+            if self._view is not None and self._view.extra is self.pending:
+                self._view.add(ip_hash, day, blog_id)
+            should_flush = self.pending.total >= self.batch_size
+            self._start_timer()
+
+        if should_flush:
+            self.flush()
+
+    def _start_timer(self):
+        if self._timer is None and self.flush_interval > 0:
+            self._timer = threading.Timer(self.flush_interval, self._on_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _on_timer(self):
+        with self._lock:
+            self._timer = None
+        self.flush()
+
+    def flush(self):
+        """Merge all pending increments into the visitors file"""
+        with self._flush_lock:
+            with self._lock:
+                if not self.pending:
+                    return
+                pending, self.pending = self.pending, VisitCounts(self.trending_windows)
+
+            try:
+                self._merge_pending(pending)
+            except Exception as e:
+                print(f"Error saving visitors file: {e}")
+                # Put the increments back so they are retried on the next flush
+                with self._lock:
+                    self.pending.update(pending)
+            finally:
+                self.store.invalidate()
+
+    def _merge_pending(self, pending):
+        with file_lock(self.path):
+            self.store.invalidate()
+            visitors = self.store.get()
+            pending.merge_into(visitors)
+            write_json_atomic(self.path, visitors)
+
+    def _snapshot(self, visitors):
+        view = self._view
+        if view is None or view.visitors is not visitors or view.extra is not self.pending:
+            view = self._view = StatsSnapshot(visitors, self.pending)
+        return view
+
+    def stats(self, day, blog_id=None):
+        """Counts from the last merged file plus this worker's pending visits"""
+        visitors = self.store.get()
+        with self._lock:
+            return self._snapshot(visitors).stats(day, blog_id)
+
+    def summary(self, day):
+        """Site-wide StatsSnapshot numbers, including the most visited posts"""
+        visitors = self.store.get()
+        with self._lock:
+            return self._snapshot(visitors).summary(day)
+
+    def rankings(self):
+        """Most visited and trending posts including this worker's pending visits"""
+        visitors = self.store.get()
+        with self._lock:
+            return self._snapshot(visitors).rankings()
+
+    def visitors(self):
+        """Full visitors data with this worker's pending visits merged in"""
+        merged = copy_visitors(self.store.get())
+        with self._lock:
+            self.pending.merge_into(merged)
+        return merged
+
+    def range_stats(self, start_day, end_day):
+        return range_stats(self.visitors(), start_day, end_day)
+
+    def close(self):
+        """Cancel the timer and flush whatever is still pending"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        self.flush()
+
+
+def create_visit_backend(kind, visitors_file, **options):
+    """Build the visit tracking backend selected by the VISITOR_BACKEND setting"""
+    if kind == 'eventlog':
+        from visit_log import VisitLogBackend
+        return VisitLogBackend(visitors_file,
+                               log_dir=options.get('log_dir', 'visit_logs'),
+                               compact_interval=options.get('compact_interval', 300),
+                               trending_windows=options.get('trending_windows'))
+    if kind == 'sqlite':
+        from storage import SQLiteVisitBuffer
+        return SQLiteVisitBuffer(options['database'],
+                                 flush_interval=options.get('flush_interval', 5.0),
+                                 batch_size=options.get('batch_size', 50),
+                                 trending_windows=options.get('trending_windows'))
+    if kind == 'buffer':
+        return VisitBuffer(visitors_file,
+                           flush_interval=options.get('flush_interval', 5.0),
+                           batch_size=options.get('batch_size', 50),
+                           trending_windows=options.get('trending_windows'))
+    raise ValueError(f"Unknown visitor backend: {kind}")